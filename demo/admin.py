@@ -4,4 +4,4 @@ from django.contrib.admin import register, ModelAdmin
 
 @register(DataSource)
 class DataSourceAdmin(ModelAdmin):
-    readonly_fields = "last_successful_update", "poll_count"
+    readonly_fields = "last_successful_update", "poll_count", "bytes_received", "bytes_decoded"
@@ -0,0 +1,137 @@
+import logging
+from asyncio import Semaphore, TimeoutError, gather, sleep
+from collections import Counter, defaultdict, namedtuple
+from typing import Optional, Tuple
+
+from aiohttp import ClientError, ClientResponse, ClientSession, TCPConnector
+from yarl import URL
+
+from demo.aggregator.compression import ACCEPT_ENCODING, BodyTooLarge, get_decoder
+from demo.models import DataSource
+
+logger = logging.getLogger(__name__)
+
+# `body` is a list of (decoded) bytes chunks, None if the source was not modified (status 304),
+# `wire_size` and `size` the number of bytes received and decoded
+FetchResult = namedtuple('FetchResult', 'status body etag last_modified wire_size size')
+
+
+class FetchClient:
+    """
+    A long-lived HTTP client fetching data sources.
+
+    The session and its connection pool are kept between polls, so keep-alive connections are reused.
+        At most `limit` requests are in flight, and at most `limit_per_host` of them to a single host.
+        Requests waiting for a slot don't count towards the connect (`conn_timeout`) or read (`read_timeout`)
+        timeouts. Connection errors, timeouts and 5xx responses are retried up to `retries` times,
+        after `retry_delay` seconds doubled on each attempt.
+
+    Response bodies are read in chunks of `chunk_size` bytes and kept as bytes, to be parsed incrementally.
+        Fetching is aborted as soon as a body exceeds the `max_body_size` of the source, or of the client.
+        Compressed responses (see `compression.ACCEPT_ENCODING`) are decoded chunk by chunk as they arrive,
+        `max_body_size` applies both to the compressed and the decoded size.
+    """
+
+    def __init__(self, loop, limit: int = 100, limit_per_host: int = 4, conn_timeout: float = 10,
+                 read_timeout: float = 30, keepalive_timeout: float = 60, retries: int = 2, retry_delay: float = 1,
+                 max_body_size: int = 10 * 1024 * 1024, chunk_size: int = 65536):
+        self.loop = loop
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.conn_timeout = conn_timeout
+        self.read_timeout = read_timeout
+        self.keepalive_timeout = keepalive_timeout
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.max_body_size = max_body_size
+        self.chunk_size = chunk_size
+        self._session = None
+        self._semaphore = None
+        self._host_semaphores = None
+        self._host_requests = None
+
+    @property
+    def session(self) -> ClientSession:
+        # created on first use, from within the event loop
+        if self._session is None:
+            connector = TCPConnector(loop=self.loop, limit=self.limit, limit_per_host=self.limit_per_host,
+                                     keepalive_timeout=self.keepalive_timeout, ttl_dns_cache=300)
+            self._session = ClientSession(loop=self.loop, connector=connector,
+                                          conn_timeout=self.conn_timeout, read_timeout=self.read_timeout,
+                                          headers={'Accept-Encoding': ACCEPT_ENCODING}, auto_decompress=False)
+            self._semaphore = Semaphore(self.limit)
+            self._host_semaphores = defaultdict(lambda: Semaphore(self.limit_per_host))
+            self._host_requests = Counter()
+        return self._session
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def fetch(self, source: DataSource) -> Optional[FetchResult]:
+        """Fetch a source, returning None if it failed"""
+        url = source.url
+        session = self.session
+        host = URL(url).host
+        # per-host slots exist while the host has requests in flight, so the hosts of removed sources are dropped
+        self._host_requests[host] += 1
+        try:
+            async with self._semaphore, self._host_semaphores[host]:
+                return await self._fetch(session, source)
+        finally:
+            self._host_requests[host] -= 1
+            if not self._host_requests[host]:
+                del self._host_requests[host]
+                del self._host_semaphores[host]
+
+    async def _fetch(self, session: ClientSession, source: DataSource) -> Optional[FetchResult]:
+        url = source.url
+        for attempt in range(self.retries + 1):
+            if attempt:
+                await sleep(self.retry_delay * 2 ** (attempt - 1))
+            logger.debug("Fetching %s", url)
+            try:
+                async with session.get(url, headers=source.conditional_headers()) as resp:
+                    if resp.status == 304:
+                        return FetchResult(resp.status, None, source.etag, source.last_modified, 0, 0)
+                    if resp.status == 200:
+                        body, wire_size = await self.read_body(source, resp)
+                        if body is None:
+                            return None
+                        return FetchResult(resp.status, body,
+                                           resp.headers.get('ETag', ''), resp.headers.get('Last-Modified', ''),
+                                           wire_size, sum(len(chunk) for chunk in body))
+                    logger.error("Failed to fetch url %s: status %s", url, resp.status)
+                    if resp.status < 500:
+                        return None
+            except (ClientError, TimeoutError) as e:
+                logger.error("Failed to fetch url %s: %r", url, e)
+            except:
+                logger.exception("Failed to fetch url %s", url)
+                return None
+
+    async def read_body(self, source: DataSource, resp: ClientResponse) -> Tuple[Optional[list], int]:
+        """Read and decode the response body as a list of chunks (None if it is larger than allowed),
+        return it with the number of bytes received"""
+        max_body_size = source.max_body_size or self.max_body_size
+        if resp.content_length is not None and resp.content_length > max_body_size:
+            logger.error("Response of %s is too large: %s bytes", source.url, resp.content_length)
+            return None, 0
+        decoder = get_decoder(resp.headers.get('Content-Encoding', ''), max_body_size)
+        body = []
+        wire_size = 0
+        try:
+            async for chunk in resp.content.iter_chunked(self.chunk_size):
+                wire_size += len(chunk)
+                if wire_size > max_body_size:
+                    raise BodyTooLarge()
+                body.append(decoder.decode(chunk))
+            body.append(decoder.flush())
+        except BodyTooLarge:
+            logger.error("Response of %s is too large: over %s bytes", source.url, max_body_size)
+            return None, wire_size
+        return [chunk for chunk in body if chunk], wire_size
+
+    async def fetch_all(self, sources: list) -> list:
+        return await gather(*[self.fetch(source) for source in sources])
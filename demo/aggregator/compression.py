@@ -0,0 +1,99 @@
+import zlib
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+else:
+    if not hasattr(brotli.Decompressor, 'can_accept_more_data'):
+        # brotli < 1.2 can't limit the output of a chunk, which may be a decompression bomb
+        brotli = None
+
+# Content codings advertised in Accept-Encoding, br only if the brotli package (1.2+) is installed
+ENCODINGS = ('gzip', 'deflate', 'br') if brotli is not None else ('gzip', 'deflate')
+ACCEPT_ENCODING = ', '.join(ENCODINGS)
+
+
+class BodyTooLarge(Exception):
+    pass
+
+
+class Decoder:
+    """
+    Decodes a response body chunk by chunk, at most `max_size` bytes in total.
+
+    Chunks are decoded as they arrive, so a compressed body is never held in memory as a whole,
+        and decoding stops as soon as the output exceeds `max_size` (e.g. a decompression bomb).
+    """
+
+    def __init__(self, max_size: int):
+        self.remaining = max_size
+
+    def _check(self, data: bytes) -> bytes:
+        self.remaining -= len(data)
+        if self.remaining < 0:
+            raise BodyTooLarge()
+        return data
+
+    def decode(self, chunk: bytes) -> bytes:
+        return self._check(chunk)
+
+    def flush(self) -> bytes:
+        return b''
+
+
+class ZlibDecoder(Decoder):
+    """gzip, or deflate: zlib stream or raw deflate data, as sent by some servers"""
+
+    def __init__(self, max_size: int, gzip: bool = False):
+        super().__init__(max_size)
+        # deflate: the first 2 bytes tell a zlib header from raw deflate data, and may arrive in separate chunks
+        self._head = None if gzip else b''
+        self._decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS if gzip else zlib.MAX_WBITS)
+
+    def decode(self, chunk: bytes) -> bytes:
+        if self._head is not None:
+            chunk = self._head + chunk
+            if len(chunk) < 2:
+                self._head = chunk
+                return b''
+            self._head = None
+            try:
+                data = self._decompressor.decompress(chunk, self.remaining + 1)
+            except zlib.error:
+                self._decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+                data = self._decompressor.decompress(chunk, self.remaining + 1)
+        else:
+            data = self._decompressor.decompress(chunk, self.remaining + 1)
+        if self._decompressor.unconsumed_tail:
+            raise BodyTooLarge()
+        return self._check(data)
+
+    def flush(self) -> bytes:
+        data = self._decompressor.decompress(self._head) if self._head else b''
+        return self._check(data + self._decompressor.flush())
+
+
+class BrotliDecoder(Decoder):
+
+    def __init__(self, max_size: int):
+        super().__init__(max_size)
+        self._decompressor = brotli.Decompressor()
+
+    def decode(self, chunk: bytes) -> bytes:
+        # stops at the limit, keeping the rest of the input: the output is too large if it reaches the limit
+        return self._check(self._decompressor.process(chunk, output_buffer_limit=self.remaining + 1))
+
+
+def get_decoder(encoding: str, max_size: int) -> Decoder:
+    """A decoder for the Content-Encoding of a response, raises ValueError if not supported"""
+    encoding = encoding.strip().lower()
+    if encoding in ('', 'identity'):
+        return Decoder(max_size)
+    if encoding in ('gzip', 'x-gzip'):
+        return ZlibDecoder(max_size, gzip=True)
+    if encoding == 'deflate':
+        return ZlibDecoder(max_size)
+    if encoding == 'br' and brotli is not None:
+        return BrotliDecoder(max_size)
+    raise ValueError(f"Unsupported content encoding '{encoding}'")
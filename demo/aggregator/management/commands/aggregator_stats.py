@@ -0,0 +1,94 @@
+import json
+from collections import defaultdict
+from urllib.error import URLError
+from urllib.request import urlopen
+
+from django.core.management import BaseCommand, CommandError
+
+from demo.aggregator.metrics import parse_samples
+
+STAGES = 'fetch', 'parse', 'map', 'write', 'm2m'
+
+
+def quantile(buckets: list, q: float) -> float:
+    """Upper bound of the bucket holding the q-quantile, from (upper bound, cumulative count) pairs"""
+    total = buckets[-1][1] if buckets else 0
+    for bound, count in buckets:
+        if total and count >= q * total:
+            return bound
+    return float('nan')
+
+
+class Command(BaseCommand):
+    help = "Show the metrics of a running aggregator_worker started with --metrics-port"
+
+    def add_arguments(self, parser):
+        parser.add_argument('-p', '--port', type=int, default=9108, dest='port',
+                            help="Metrics port of the worker")
+        parser.add_argument('--host', default='127.0.0.1', dest='host',
+                            help="Address of the worker")
+        parser.add_argument('-s', '--source', dest='source',
+                            help="Show the metrics of a single source (primary key)")
+        parser.add_argument('--raw', action='store_true', dest='raw',
+                            help="Print the metrics in the Prometheus text format")
+        parser.add_argument('--json', action='store_true', dest='json',
+                            help="Print the summary as JSON")
+
+    def handle(self, *args, **options):
+        url = f"http://{options['host']}:{options['port']}/metrics"
+        try:
+            with urlopen(url, timeout=10) as response:
+                text = response.read().decode()
+        except (URLError, OSError) as e:
+            raise CommandError(f"Failed to read metrics from {url}: {e}")
+        if options['raw']:
+            self.stdout.write(text, ending='')
+            return
+
+        source = options['source']
+        counters = {}
+        gauges = {}
+        histograms = defaultdict(lambda: {'buckets': [], 'sum': 0.0, 'count': 0})
+        for name, labels, value in parse_samples(text):
+            if labels.get('source') != source:
+                continue
+            if name.endswith('_seconds_bucket'):
+                bound = labels['le']
+                histograms[name[:-len('_bucket')]]['buckets'].append(
+                    (float('inf') if bound == '+Inf' else float(bound), value))
+            elif name.endswith('_seconds_sum'):
+                histograms[name[:-len('_sum')]]['sum'] = value
+            elif name.endswith('_seconds_count'):
+                histograms[name[:-len('_count')]]['count'] = int(value)
+            elif name.endswith('_total'):
+                counters[name] = value
+            elif 'queue' in labels:
+                gauges[f"{name}{{queue={labels['queue']}}}"] = value
+            else:
+                gauges[name] = value
+
+        stages = {}
+        for stage in STAGES:
+            histogram = histograms.get(f'aggregator_{stage}_seconds')
+            if histogram is None:
+                continue
+            count = histogram['count']
+            stages[stage] = {
+                'count': count,
+                'total': histogram['sum'],
+                'mean': histogram['sum'] / count if count else 0.0,
+                'p50': quantile(histogram['buckets'], .5),
+                'p95': quantile(histogram['buckets'], .95),
+            }
+
+        if options['json']:
+            self.stdout.write(json.dumps({'stages': stages, 'counters': counters, 'gauges': gauges}, indent=2))
+            return
+
+        self.stdout.write(f"{'stage':<8}{'count':>10}{'total, s':>12}{'mean, ms':>12}"
+                          f"{'p50 <=, s':>12}{'p95 <=, s':>12}")
+        for stage, values in stages.items():
+            self.stdout.write(f"{stage:<8}{values['count']:>10}{values['total']:>12.3f}{values['mean'] * 1000:>12.2f}"
+                              f"{values['p50']:>12g}{values['p95']:>12g}")
+        for name, value in sorted(counters.items()) + sorted(gauges.items()):
+            self.stdout.write(f"{name:<48}{value:>14g}")
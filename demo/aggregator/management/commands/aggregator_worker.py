@@ -1,36 +1,29 @@
 import logging
-from datetime import datetime, timedelta
+import os
+import socket
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
 
 from django.core.management import BaseCommand
-from django.db import models
-from aiohttp import ClientSession
-from asyncio import get_event_loop, gather, sleep
-
+from asyncio import get_event_loop, sleep
+
+from demo.aggregator.client import FetchClient
+from demo.aggregator.metrics import Metrics, start_server
+from demo.aggregator.pipeline import Pipeline
+from demo.aggregator.profiling import CycleProfiler
+from demo.aggregator.scheduler import Scheduler
+from demo.aggregator.watcher import SourceWatcher
 from demo.models import DataSource
 from demo.rssnews.models import Author, Category, Item
+from mapper.cache import RelatedObjectCache
 from mapper.rss import RSSMapper
 
 
 logger = logging.getLogger(__name__)
 
 
-async def fetch_source(session: ClientSession, url: str):
-    logger.debug("Fetching %s", url)
-    try:
-        async with session.get(url) as resp:
-            if resp.status == 200:
-                return await resp.text()
-            logger.error("Failed to fetch url %s", url)
-    except:
-        logger.exception("Failed to fetch url %s", url)
-
-
-async def fetch_all(loop, sources: list):
-    async with ClientSession(loop=loop) as session:
-        return await gather(*[
-            fetch_source(session, source.url)
-            for source in sources
-        ])
+class ItemMapper(RSSMapper):
+    fingerprint_field = 'fingerprint'
 
 
 class Command(BaseCommand):
@@ -39,52 +32,155 @@ class Command(BaseCommand):
         parser.add_argument('-i', '--infinite', dest='infinite', action='store_true',
                             help="Run in a loop until Ctrl-C is pressed")
         parser.add_argument('-t', '--timeout', type=int, default=10, dest='timeout',
-                            help="If --infinite, specify a timeout between polling sources")
+                            help="Polling interval of sources without a poll frequency")
+        parser.add_argument('--jitter', type=float, default=0.1, dest='jitter',
+                            help="Max. random delay added to polling intervals, as a fraction of the interval")
+        parser.add_argument('--retry-delay', type=int, default=10, dest='retry_delay',
+                            help="Delay before retrying a failed source, doubled on each consecutive failure")
+        parser.add_argument('--max-backoff', type=int, default=3600, dest='max_backoff',
+                            help="Max. delay before retrying a failed source")
+        parser.add_argument('--max-connections', type=int, default=100, dest='max_connections',
+                            help="Max. number of concurrent requests")
+        parser.add_argument('--max-connections-per-host', type=int, default=4, dest='max_connections_per_host',
+                            help="Max. number of concurrent requests to a single host")
+        parser.add_argument('--connect-timeout', type=float, default=10, dest='connect_timeout',
+                            help="Timeout for establishing a connection, in seconds")
+        parser.add_argument('--read-timeout', type=float, default=30, dest='read_timeout',
+                            help="Timeout for reading a response, in seconds")
+        parser.add_argument('--keepalive-timeout', type=float, default=60, dest='keepalive_timeout',
+                            help="Time an idle connection is kept open for reuse, in seconds")
+        parser.add_argument('--fetch-retries', type=int, default=2, dest='fetch_retries',
+                            help="Number of retries of failed requests within a poll")
+        parser.add_argument('--fetch-retry-delay', type=float, default=1, dest='fetch_retry_delay',
+                            help="Delay before retrying a failed request, doubled on each retry")
+        parser.add_argument('--max-body-size', type=int, default=10 * 1024 * 1024, dest='max_body_size',
+                            help="Max. size of a response in bytes, for sources without their own limit")
+        parser.add_argument('--cache-size', type=int, default=1024, dest='cache_size',
+                            help="Max. number of authors and categories kept in memory between polls")
+        parser.add_argument('--chunk-size', type=int, default=500, dest='chunk_size',
+                            help="Number of entries committed in one transaction (0 to use autocommit)")
+        parser.add_argument('--graph-import', action='store_true', dest='graph_import',
+                            help="Bulk-resolve authors and categories per batch instead of using the cache")
+        parser.add_argument('--parse-workers', type=int, default=0, dest='parse_workers',
+                            help="Number of processes parsing feeds in parallel (0 to parse in the main process)")
+        parser.add_argument('--queue-size', type=int, default=16, dest='queue_size',
+                            help="Max. number of feeds waiting to be parsed, and to be written")
+        parser.add_argument('--reload-interval', type=float, default=10, dest='reload_interval',
+                            help="If --infinite, max. time before added, edited or removed sources are picked up")
+        parser.add_argument('--metrics-port', type=int, default=0, dest='metrics_port',
+                            help="Serve metrics in the Prometheus text format on this port (0 to disable)")
+        parser.add_argument('--metrics-host', default='127.0.0.1', dest='metrics_host',
+                            help="Address to serve metrics on")
+        parser.add_argument('--profile', metavar='DIR', dest='profile',
+                            help="Write cProfile stats, sampled stacks and SQL query counts of every cycle to DIR")
+        parser.add_argument('--profile-interval', type=float, default=5, dest='profile_interval',
+                            help="Sampling interval of --profile, in milliseconds")
+        parser.add_argument('--worker-id', default=f'{socket.gethostname()}:{os.getpid()}', dest='worker_id',
+                            help="Name of this worker in source leases (default: host:pid)")
+        parser.add_argument('--lease-duration', type=int, default=300, dest='lease_duration',
+                            help="Time a worker holds a source it polls, in seconds, renewed until the poll is written")
 
     def handle(self, *args, **options):
         print(options)
         infinite = options['infinite']
-        timeout = options['timeout']
         logger.debug("Starting aggregation %s", 'until Ctrl-C is pressed' if infinite else 'once')
 
-        mapper = RSSMapper(model=Item, author_model=Author, category_model=Category)
+        mapper = ItemMapper(model=Item, author_model=Author, category_model=Category,
+                            cache=RelatedObjectCache(maxsize=options['cache_size']))
+        mapper.atomic_chunk_size = options['chunk_size'] or None
+        mapper.graph_import = options['graph_import']
 
-        sources = list(DataSource.objects.all())
+        watcher = SourceWatcher()
+        sources = watcher.load()
 
-        if not sources:
+        if not sources and not infinite:
             logger.error("No sources configured. Exiting")
             return
 
-        loop = get_event_loop()
+        scheduler = Scheduler(default_interval=options['timeout'], jitter=options['jitter'],
+                              retry_delay=options['retry_delay'], max_backoff=options['max_backoff'])
+        for source in sources:
+            scheduler.schedule(source)
 
-        while 1:
-
-            results = loop.run_until_complete(fetch_all(loop, sources))
-
-            now = datetime.now().astimezone(None)
-            sources_to_fetch = [
-                source for source in sources
-                if (source.last_successful_update and
-                    source.last_successful_update + timedelta(seconds=source.poll_frequency) < now)
-            ]
-
-            for i, source in enumerate(sources_to_fetch):  # type source: DataSource
-                source.poll_count = models.F('poll_count') + 1
-                fetched = results[i]
-                if fetched is not None:
-                    try:
-                        mapper.process_string(fetched, if_modified_since=source.last_successful_update)
-                    except:
-                        logger.exception("Failed to process source %s [%s]", source.title, source.url)
-                    else:
-                        source.last_successful_update = datetime.now().astimezone(None)
-                source.save()
-
-            if infinite:
-                logger.debug("Sleeping for %ss", timeout)
-                loop.run_until_complete(sleep(timeout))
-                # TODO add option to re-read sources if necessary
+        loop = get_event_loop()
+        client = FetchClient(loop, limit=options['max_connections'], limit_per_host=options['max_connections_per_host'],
+                             conn_timeout=options['connect_timeout'], read_timeout=options['read_timeout'],
+                             keepalive_timeout=options['keepalive_timeout'],
+                             retries=options['fetch_retries'], retry_delay=options['fetch_retry_delay'],
+                             max_body_size=options['max_body_size'])
+        # Parsing is CPU-bound and holds the GIL: run it in worker processes, keeping all DB writes in this one
+        executor = ProcessPoolExecutor(options['parse_workers']) if options['parse_workers'] else None
+        worker_id = options['worker_id']
+        lease_duration = timedelta(seconds=options['lease_duration'])
+        logger.debug("Worker %s leasing sources for %s", worker_id, lease_duration)
+        pipeline = Pipeline(loop, client, mapper, scheduler, executor=executor,
+                            fetchers=options['max_connections'], parsers=max(options['parse_workers'], 1),
+                            queue_size=options['queue_size'], metrics=Metrics(),
+                            owner=worker_id, lease_duration=lease_duration)
+        if options['profile']:
+            pipeline.profiler = CycleProfiler(options['profile'], pipeline.db_executor,
+                                              interval=options['profile_interval'] / 1000)
+        metrics_server = None
+        if options['metrics_port']:
+            metrics_server = loop.run_until_complete(start_server(
+                pipeline.metrics, options['metrics_host'], options['metrics_port'], collect=pipeline.collect))
+
+        try:
+            while 1:
+                due_sources = scheduler.pop_due()
+                if due_sources:
+                    claimed = self.claim(scheduler, due_sources, worker_id, lease_duration)
+                    if claimed:
+                        if pipeline.profiler is not None:
+                            pipeline.profiler.start()
+                        try:
+                            loop.run_until_complete(pipeline.run(claimed))
+                        finally:
+                            if pipeline.profiler is not None:
+                                pipeline.profiler.stop()
+                        logger.debug("Mapper stats: %s", dict(mapper.stats))
+
+                if infinite:
+                    # the pipeline releases the lease of every source it has written: other workers may poll it
+                    # once due, so that the sources are shared. Wake up in time to pick up changed sources
+                    delay = options['reload_interval']
+                    if scheduler.delay() is not None:
+                        delay = min(scheduler.delay(), delay)
+                    logger.debug("Sleeping for %.3fs", delay)
+                    loop.run_until_complete(sleep(delay))
+                    self.reload(watcher, scheduler)
+                else:
+                    break
+        finally:
+            DataSource.objects.release(worker_id)
+            if metrics_server is not None:
+                loop.run_until_complete(metrics_server.cleanup())
+            loop.run_until_complete(client.close())
+            pipeline.close()
+            if executor is not None:
+                executor.shutdown()
+            loop.close()
+
+    def claim(self, scheduler: Scheduler, sources: list, worker_id: str, lease_duration: timedelta) -> list:
+        """Claim the due sources, as re-read, and reschedule the ones leased or polled by other workers meanwhile"""
+        pks = [source.pk for source in sources]
+        claimed = DataSource.objects.filter(pk__in=pks).claim(worker_id, lease_duration)
+        claimed_pks = {source.pk for source in claimed}
+        for source in DataSource.objects.filter(pk__in=set(pks) - claimed_pks):
+            logger.debug("Source %s is polled by another worker", source.url)
+            scheduler.reschedule(source)
+        return claimed
+
+    def reload(self, watcher: SourceWatcher, scheduler: Scheduler):
+        """Apply the sources added, edited or removed meanwhile to the scheduler"""
+        changed, removed = watcher.changes()
+        for source in changed:
+            if source.pk in scheduler:
+                logger.debug("Source updated: %s", source)
+                scheduler.update(source)
             else:
-                break
-
-        loop.close()
+                logger.debug("Source added: %s", source)
+                scheduler.schedule(source)
+        for pk in removed:
+            logger.debug("Source removed: #%s", pk)
+            scheduler.remove(pk)
@@ -0,0 +1,147 @@
+import logging
+import re
+import threading
+from bisect import bisect_left
+from collections import defaultdict
+from typing import Dict, Iterator, Tuple
+
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds of the latency histogram buckets, in seconds
+BUCKETS = (.001, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10, 30, 60)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4'
+
+LABEL_RE = re.compile(r'(\w+)="((?:[^"\\]|\\.)*)"')
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    __slots__ = ('counts', 'sum')
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)  # the last one is +Inf
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(BUCKETS, value)] += 1
+        self.sum += value
+
+
+class Metrics:
+    """
+    Counters, gauges and latency histograms, rendered in the Prometheus text format.
+
+    Counters and histograms updated with a `source` are recorded both for that source (with a `source` label)
+        and aggregated over all sources (without it). An update is a few dict operations under a lock,
+        as the DB writer runs in its own thread.
+    """
+
+    def __init__(self):
+        self.help = {}
+        self.counters = defaultdict(float)  # (name, labels) -> value
+        self.gauges = {}  # (name, labels) -> value
+        self.histograms = {}  # (name, labels) -> Histogram
+        self._lock = threading.Lock()
+
+    def describe(self, name: str, help_text: str):
+        self.help[name] = help_text
+
+    @staticmethod
+    def _keys(name: str, source) -> Iterator[Tuple[str, Labels]]:
+        yield name, ()
+        if source is not None:
+            yield name, (('source', str(source)),)
+
+    def inc(self, name: str, value: float = 1, source=None):
+        with self._lock:
+            for key in self._keys(name, source):
+                self.counters[key] += value
+
+    def observe(self, name: str, value: float, source=None):
+        with self._lock:
+            for key in self._keys(name, source):
+                try:
+                    histogram = self.histograms[key]
+                except KeyError:
+                    histogram = self.histograms[key] = Histogram()
+                histogram.observe(value)
+
+    def set(self, name: str, value: float, **labels):
+        with self._lock:
+            self.gauges[name, tuple(sorted(labels.items()))] = value
+
+    def render(self) -> str:
+        with self._lock:
+            counters = sorted(self.counters.items())
+            gauges = sorted(self.gauges.items())
+            histograms = sorted((key, list(h.counts), h.sum) for key, h in self.histograms.items())
+        lines = []
+        described = set()
+
+        def header(name, kind):
+            if name not in described:
+                described.add(name)
+                if name in self.help:
+                    lines.append(f'# HELP {name} {self.help[name]}')
+                lines.append(f'# TYPE {name} {kind}')
+
+        for (name, labels), value in counters:
+            header(name, 'counter')
+            lines.append(f'{name}{format_labels(labels)} {value:g}')
+        for (name, labels), value in gauges:
+            header(name, 'gauge')
+            lines.append(f'{name}{format_labels(labels)} {value:g}')
+        for (name, labels), counts, total in histograms:
+            header(name, 'histogram')
+            cumulative = 0
+            for bound, count in zip(BUCKETS + ('+Inf',), counts):
+                cumulative += count
+                lines.append(f'{name}_bucket{format_labels(labels + (("le", str(bound)),))} {cumulative}')
+            lines.append(f'{name}_sum{format_labels(labels)} {total:g}')
+            lines.append(f'{name}_count{format_labels(labels)} {cumulative}')
+        return '\n'.join(lines) + '\n'
+
+
+def format_labels(labels: Labels) -> str:
+    if not labels:
+        return ''
+    escaped = (
+        (name, value.replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n'))
+        for name, value in labels
+    )
+    return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}'
+
+
+def parse_samples(text: str) -> Iterator[Tuple[str, Dict[str, str], float]]:
+    """Parse the samples of the Prometheus text format, as rendered by `Metrics.render`"""
+    for line in text.splitlines():
+        if not line or line.startswith('#'):
+            continue
+        series, value = line.rsplit(' ', 1)
+        name, _, labels = series.partition('{')
+        parsed = {
+            label: re.sub(r'\\(.)', lambda match: '\n' if match.group(1) == 'n' else match.group(1), label_value)
+            for label, label_value in LABEL_RE.findall(labels)
+        }
+        yield name, parsed, float(value)
+
+
+async def start_server(metrics: Metrics, host: str, port: int, collect=None) -> web.AppRunner:
+    """Serve the metrics on http://host:port/metrics, calling `collect` (e.g. to set gauges) before rendering"""
+
+    async def handler(request: web.Request):
+        if collect is not None:
+            collect()
+        return web.Response(text=metrics.render(), headers={'Content-Type': CONTENT_TYPE})
+
+    app = web.Application()
+    app.router.add_get('/metrics', handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.debug("Serving metrics on http://%s:%s/metrics", host, port)
+    return runner
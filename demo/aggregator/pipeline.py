@@ -0,0 +1,251 @@
+import logging
+from asyncio import Queue, ensure_future, gather, sleep
+from concurrent.futures import Executor, ThreadPoolExecutor
+from datetime import datetime, timedelta
+from time import perf_counter
+from typing import Optional
+
+from django.db import connections, models
+
+from demo.aggregator.client import FetchClient, FetchResult
+from demo.aggregator.metrics import Metrics
+from demo.aggregator.profiling import CycleProfiler
+from demo.aggregator.scheduler import Scheduler
+from demo.models import DataSource
+from mapper.parsers import parse_feed
+from mapper.profiling import QueryCounter
+from mapper.rss import RSSMapper
+
+logger = logging.getLogger(__name__)
+
+METRICS = {
+    'aggregator_fetch_seconds': "Time to fetch a source, including the wait for a per-host slot",
+    'aggregator_parse_seconds': "Time to parse a feed, including the transfer to and from a worker process",
+    'aggregator_map_seconds': "Time to map the entries of a feed, including related object lookups",
+    'aggregator_write_seconds': "Time to save the entries of a feed, excluding M2M relations",
+    'aggregator_m2m_seconds': "Time to synchronise the M2M relations of the entries of a feed",
+    'aggregator_polls_total': "Number of polls",
+    'aggregator_poll_failures_total': "Number of failed polls",
+    'aggregator_not_modified_total': "Number of polls answered with 304 Not Modified",
+    'aggregator_entries_total': "Number of entries processed",
+    'aggregator_sql_queries_total': "Number of SQL queries run by the mapper",
+    'aggregator_sql_seconds_total': "Time spent in SQL queries run by the mapper",
+    'aggregator_bytes_received_total': "Number of response bytes received",
+    'aggregator_bytes_decoded_total': "Number of response bytes after decompression",
+    'aggregator_queue_depth': "Number of feeds waiting in a queue of the pipeline",
+    'aggregator_scheduled_sources': "Number of sources in the scheduler",
+}
+
+
+class Pipeline:
+    """
+    Polls data sources in three overlapping stages connected by bounded queues:
+
+        * `fetchers` coroutines fetch sources through the `client` and put the responses in the parse queue;
+        * `parsers` coroutines parse the responses in the `executor` (a process pool,
+            or threads of the main process if None) and put the feeds in the write queue;
+        * a single writer processes the feeds with the `mapper` in a dedicated DB thread.
+
+    A full queue blocks the previous stage, so at most `fetchers + parsers + 2 * queue_size + 1` responses
+        are held in memory at a time. `max_depths` has the max. size each queue reached in the last `run`,
+        `timings` the time each stage finished at, and the total time spent writing (`write_busy`).
+
+    Latencies of every stage and counters, per source and overall, are recorded in `metrics`
+        (see `METRICS`). The `profiler`, if any, is told which source the DB thread processes.
+
+    If `owner` is set, the sources are expected to be leased by it (see `DataSourceQuerySet.claim`):
+        the leases of the sources not written yet are renewed every half of `lease_duration` during `run`,
+        and the lease of each source is released as soon as it is written, along with the time it is due next,
+        so that any worker may poll it next time.
+    """
+
+    def __init__(self, loop, client: FetchClient, mapper: RSSMapper, scheduler: Scheduler,
+                 executor: Optional[Executor] = None, fetchers: int = 100, parsers: int = 1, queue_size: int = 16,
+                 metrics: Metrics = None, profiler: CycleProfiler = None, owner: str = None,
+                 lease_duration: timedelta = timedelta(minutes=5)):
+        self.loop = loop
+        self.client = client
+        self.mapper = mapper
+        self.scheduler = scheduler
+        self.executor = executor
+        self.fetchers = fetchers
+        self.parsers = parsers
+        self.queue_size = queue_size
+        # Django connections are per-thread: keep every query of the mapper in one thread
+        self.db_executor = ThreadPoolExecutor(max_workers=1)
+        self.parse_queue = None
+        self.write_queue = None
+        self.max_depths = {}
+        self.timings = {}
+        self.metrics = metrics if metrics is not None else Metrics()
+        self.profiler = profiler
+        self.owner = owner
+        self.lease_duration = lease_duration
+        for name, help_text in METRICS.items():
+            self.metrics.describe(name, help_text)
+
+    def queue_depths(self) -> dict:
+        return {
+            'parse': self.parse_queue.qsize() if self.parse_queue else 0,
+            'write': self.write_queue.qsize() if self.write_queue else 0,
+        }
+
+    def collect(self):
+        """Update the gauges of `metrics`"""
+        for name, depth in self.queue_depths().items():
+            self.metrics.set('aggregator_queue_depth', depth, queue=name)
+        self.metrics.set('aggregator_scheduled_sources', len(self.scheduler))
+
+    async def _put(self, name: str, queue: Queue, item):
+        await queue.put(item)
+        self.max_depths[name] = max(self.max_depths.get(name, 0), queue.qsize())
+
+    async def run(self, sources: list):
+        """Fetch, parse and process the sources, then schedule their next poll"""
+        self.parse_queue = Queue(self.queue_size)
+        self.write_queue = Queue(self.queue_size)
+        self.max_depths = {'parse': 0, 'write': 0}
+        self.timings = {'write_busy': 0.0}
+        started = perf_counter()
+        pending = iter(sources)
+        unwritten = {source.pk for source in sources}
+
+        async def fetch():
+            for source in pending:
+                fetch_started = perf_counter()
+                result = await self.client.fetch(source)
+                self.metrics.observe('aggregator_fetch_seconds', perf_counter() - fetch_started, source=source.pk)
+                await self._put('parse', self.parse_queue, (source, result))
+
+        async def parse():
+            while True:
+                item = await self.parse_queue.get()
+                if item is None:
+                    break
+                source, result = item
+                parsed = None
+                if result is not None and result.body is not None:
+                    parse_started = perf_counter()
+                    try:
+                        parsed = await self.loop.run_in_executor(self.executor, parse_feed,
+                                                                 result.body, self.mapper.parser)
+                    except Exception as e:
+                        parsed = e
+                    self.metrics.observe('aggregator_parse_seconds', perf_counter() - parse_started,
+                                         source=source.pk)
+                await self._put('write', self.write_queue, (source, result, parsed))
+
+        async def write():
+            while True:
+                item = await self.write_queue.get()
+                if item is None:
+                    break
+                source = item[0]
+                write_started = perf_counter()
+                try:
+                    succeeded = await self.loop.run_in_executor(self.db_executor, self.write, *item)
+                except:
+                    logger.exception("Failed to save source %s [%s]", source.title, source.url)
+                    succeeded = False
+                self.timings['write_busy'] += perf_counter() - write_started
+                unwritten.discard(source.pk)
+                self.metrics.inc('aggregator_polls_total', source=source.pk)
+                if succeeded:
+                    self.scheduler.succeeded(source)
+                else:
+                    self.metrics.inc('aggregator_poll_failures_total', source=source.pk)
+                    self.scheduler.failed(source)
+                if self.owner is not None:
+                    await self.loop.run_in_executor(self.db_executor, self.release, source,
+                                                    self.scheduler.due_at(source.pk))
+
+        async def fetch_stage():
+            await gather(*[fetch() for _ in range(min(self.fetchers, len(sources)) or 1)])
+            self.timings['fetch'] = perf_counter() - started
+            for _ in range(self.parsers):
+                await self.parse_queue.put(None)
+
+        async def parse_stage():
+            await gather(*[parse() for _ in range(self.parsers)])
+            self.timings['parse'] = perf_counter() - started
+            await self.write_queue.put(None)
+
+        async def renew():
+            while True:
+                await sleep(self.lease_duration.total_seconds() / 2)
+                if unwritten:
+                    await self.loop.run_in_executor(self.db_executor, self.renew_leases, list(unwritten))
+
+        renewer = ensure_future(renew(), loop=self.loop) if self.owner is not None else None
+        try:
+            await gather(fetch_stage(), parse_stage(), write())
+        finally:
+            if renewer is not None:
+                renewer.cancel()
+        self.timings['write'] = perf_counter() - started
+        logger.debug("Polled %s sources: stages finished at %s, max. queue depths %s",
+                     len(sources), {name: round(value, 3) for name, value in self.timings.items()}, self.max_depths)
+
+    def write(self, source: DataSource, result: Optional[FetchResult], parsed) -> bool:
+        """Process a parsed feed and save the source, in the DB thread. Return whether the poll succeeded"""
+        mapper = self.mapper
+        metrics = self.metrics
+        source.poll_count = models.F('poll_count') + 1
+        if result is not None:
+            source.bytes_received = models.F('bytes_received') + result.wire_size
+            source.bytes_decoded = models.F('bytes_decoded') + result.size
+            metrics.inc('aggregator_bytes_received_total', result.wire_size, source=source.pk)
+            metrics.inc('aggregator_bytes_decoded_total', result.size, source=source.pk)
+        succeeded = False
+        if result is not None and result.status == 304:
+            logger.debug("Source not modified: %s [%s]", source.title, source.url)
+            source.last_successful_update = datetime.now().astimezone(None)
+            metrics.inc('aggregator_not_modified_total', source=source.pk)
+            succeeded = True
+        elif isinstance(parsed, Exception):
+            logger.error("Failed to parse source %s [%s]: %r", source.title, source.url, parsed)
+        elif parsed is not None:
+            timings = dict(mapper.timings)
+            queries = QueryCounter()
+            if self.profiler is not None:
+                self.profiler.enter(source)
+            try:
+                with queries:
+                    entries = mapper.process_feed(parsed, if_modified_since=source.last_successful_update,
+                                                  entries_since=source.entries_since())
+            except:
+                logger.exception("Failed to process source %s [%s]", source.title, source.url)
+            else:
+                metrics.inc('aggregator_entries_total', len(entries), source=source.pk)
+                metrics.inc('aggregator_sql_queries_total', queries.count, source=source.pk)
+                metrics.inc('aggregator_sql_seconds_total', queries.duration, source=source.pk)
+                for phase in ('map', 'write', 'm2m'):
+                    metrics.observe(f'aggregator_{phase}_seconds', mapper.timings[phase] - timings.get(phase, 0),
+                                    source=source.pk)
+                source.last_successful_update = datetime.now().astimezone(None)
+                source.etag, source.last_modified = result.etag, result.last_modified
+                succeeded = True
+                if mapper.errors:
+                    logger.warning("Skipped %s entries of source %s [%s]",
+                                   len(mapper.errors), source.title, source.url)
+            finally:
+                if self.profiler is not None:
+                    self.profiler.exit(source, queries)
+        # don't overwrite the lease, which may have been taken over by another worker meanwhile
+        source.save(update_fields=['poll_count', 'last_successful_update', 'etag', 'last_modified',
+                                   'bytes_received', 'bytes_decoded'])
+        return succeeded
+
+    def release(self, source: DataSource, next_poll_at: Optional[datetime]):
+        """Give up the lease of a written source, telling the other workers when it is due, in the DB thread"""
+        DataSource.objects.filter(pk=source.pk).release(self.owner, next_poll_at)
+
+    def renew_leases(self, pks: list):
+        """Extend the leases of the sources being polled, in the DB thread"""
+        renewed = DataSource.objects.filter(pk__in=pks).renew(self.owner, self.lease_duration)
+        if renewed < len(pks):
+            logger.warning("Lost the leases of %s sources being polled", len(pks) - renewed)
+
+    def close(self):
+        self.db_executor.submit(connections.close_all).result()
+        self.db_executor.shutdown()
@@ -0,0 +1,87 @@
+import cProfile
+import logging
+import os
+import threading
+from collections import Counter
+from concurrent.futures import Executor
+
+from demo.models import DataSource
+from mapper.profiling import QueryCounter, StackSampler
+
+logger = logging.getLogger(__name__)
+
+
+class CycleProfiler:
+    """
+    Profiles every poll cycle of the worker, writing to `directory`:
+
+        * `cycle-NNNN-main.prof`, `cycle-NNNN-db.prof`: cProfile stats of the event loop thread and of the DB thread
+            (`python -m pstats`, snakeviz);
+        * `cycle-NNNN.collapsed`: stacks of the DB thread sampled every `interval` seconds, rooted at the source
+            being processed (flamegraph.pl, speedscope);
+        * `cycle-NNNN-hotpaths.tsv`: samples by source and innermost mapper function (`map_entry`, `transform_*`,
+            `get_value`...);
+        * `cycle-NNNN-queries.tsv`: SQL queries by source and statement, with their number and duration.
+
+    Parsing in worker processes (`--parse-workers`) is not profiled.
+    """
+
+    def __init__(self, directory: str, db_executor: Executor, interval: float = 0.005):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.db_executor = db_executor
+        self.cycle = 0
+        self.sampler = StackSampler(db_executor.submit(threading.get_ident).result(), interval)
+        self.queries = Counter()  # (source pk, sql) -> number of queries
+        self.query_durations = Counter()  # (source pk, sql) -> seconds
+        self._main = None
+        self._db = None
+
+    def start(self):
+        self.cycle += 1
+        self.sampler.start()
+        self._main = cProfile.Profile()
+        self._main.enable()
+        self._db = cProfile.Profile()
+        try:
+            self.db_executor.submit(self._db.enable).result()
+        except ValueError:
+            # a single profiler per interpreter (Python 3.12+): the main one profiles every thread
+            self._db = None
+
+    def enter(self, source: DataSource):
+        """Attribute the samples of the DB thread to a source, until `exit`"""
+        self.sampler.label = f'source {source.pk}'
+
+    def exit(self, source: DataSource, queries: QueryCounter):
+        self.sampler.label = None
+        for sql, count, duration in queries.most_common():
+            self.queries[source.pk, sql] += count
+            self.query_durations[source.pk, sql] += duration
+
+    def stop(self):
+        self._main.disable()
+        if self._db is not None:
+            self.db_executor.submit(self._db.disable).result()
+        self.sampler.stop()
+        prefix = os.path.join(self.directory, f'cycle-{self.cycle:04d}')
+
+        self._main.dump_stats(f'{prefix}-main.prof')
+        if self._db is not None:
+            self._db.dump_stats(f'{prefix}-db.prof')
+        stacks, hot_paths = self.sampler.flush()
+        with open(f'{prefix}.collapsed', 'w') as f:
+            for line in StackSampler.collapsed(stacks):
+                f.write(line + '\n')
+        interval = self.sampler.interval
+        with open(f'{prefix}-hotpaths.tsv', 'w') as f:
+            f.write('source\tfunction\tsamples\tseconds\n')
+            for (label, function), samples in hot_paths.most_common():
+                f.write(f'{label}\t{function}\t{samples}\t{samples * interval:.3f}\n')
+        with open(f'{prefix}-queries.tsv', 'w') as f:
+            f.write('source\tqueries\tseconds\tsql\n')
+            for (pk, sql), count in self.queries.most_common():
+                f.write(f'{pk}\t{count}\t{self.query_durations[pk, sql]:.6f}\t{sql}\n')
+        self.queries.clear()
+        self.query_durations.clear()
+        logger.debug("Wrote profile of cycle %s to %s-*", self.cycle, prefix)
@@ -0,0 +1,146 @@
+import heapq
+import logging
+import random
+from datetime import datetime, timedelta
+from itertools import count
+from time import monotonic
+from typing import List, Optional
+
+from demo.models import DataSource
+
+logger = logging.getLogger(__name__)
+
+
+class Scheduler:
+    """
+    A priority queue of data sources, keyed by the (monotonic) time each source is due to be polled.
+
+    A successfully polled source is due again after its `poll_frequency` (or `default_interval` if not set),
+        plus a random `jitter` fraction of that interval to spread the load.
+        A failed source is retried after `retry_delay` seconds, doubled on each consecutive failure
+        up to `max_backoff`.
+
+    Sources can be updated or removed at any time, even while being polled: the heap is keyed by primary key,
+        and entries superseded by a later `add` or `remove` are skipped when they come up.
+    """
+
+    def __init__(self, default_interval: float = 10, jitter: float = 0.1, retry_delay: float = 10,
+                 max_backoff: float = 3600, clock=monotonic, rng: random.Random = None):
+        self.default_interval = default_interval
+        self.jitter = jitter
+        self.retry_delay = retry_delay
+        self.max_backoff = max_backoff
+        self.clock = clock
+        self.rng = rng if rng is not None else random.Random()
+        self.failures = {}
+        self.sources = {}  # pk -> source
+        self._entries = {}  # pk -> (due time, sequence number) of the current heap entry
+        self._heap = []
+        self._counter = count()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, pk):
+        return pk in self.sources
+
+    def add(self, source: DataSource, delay: float = 0):
+        """Schedule a source to be polled in `delay` seconds"""
+        self.sources[source.pk] = source
+        self._push(source.pk, delay)
+
+    def _push(self, pk, delay: float):
+        entry = self._entries[pk] = (self.clock() + max(delay, 0), next(self._counter))
+        heapq.heappush(self._heap, entry + (pk,))
+
+    def schedule(self, source: DataSource):
+        """Add a source, due at its `next_poll_at` as set by the worker which polled it last if any,
+        else after its interval since the last successful update
+        """
+        if source.next_poll_at is not None:
+            self.add(source, (source.next_poll_at - datetime.now().astimezone(None)).total_seconds())
+        elif source.last_successful_update is None:
+            self.add(source)
+        else:
+            elapsed = (datetime.now().astimezone(None) - source.last_successful_update).total_seconds()
+            self.add(source, self.interval(source) - elapsed)
+
+    def update(self, source: DataSource):
+        """Replace a source with its edited version, keeping its due time unless a changed interval makes it due earlier
+
+        A source being polled is due after its new interval once polled.
+        """
+        old = self.sources.get(source.pk)
+        self.sources[source.pk] = source
+        if old is None or source.pk not in self._entries or self.interval(old) == self.interval(source):
+            return
+        interval = self.interval(source)
+        if self.clock() + interval < self._entries[source.pk][0]:
+            self._push(source.pk, interval)
+
+    def reschedule(self, source: DataSource):
+        """Schedule a source which could not be claimed, as re-read: due at its `next_poll_at` if it was polled
+        by another worker meanwhile, else (being polled) checked again after its interval
+        """
+        if source.next_poll_at is not None and source.next_poll_at > datetime.now().astimezone(None):
+            self.schedule(source)
+        else:
+            self.sources[source.pk] = source
+            self.postpone(source)
+
+    def remove(self, pk):
+        self.sources.pop(pk, None)
+        self._entries.pop(pk, None)
+        self.failures.pop(pk, None)
+
+    def interval(self, source: DataSource) -> float:
+        return source.poll_frequency or self.default_interval
+
+    def _skip_stale(self):
+        heap = self._heap
+        while heap and self._entries.get(heap[0][2]) != heap[0][:2]:
+            heapq.heappop(heap)
+
+    def pop_due(self) -> List[DataSource]:
+        """Remove and return the sources due by now"""
+        now = self.clock()
+        due = []
+        self._skip_stale()
+        while self._heap and self._heap[0][0] <= now:
+            pk = heapq.heappop(self._heap)[2]
+            del self._entries[pk]
+            due.append(self.sources[pk])
+            self._skip_stale()
+        return due
+
+    def due_at(self, pk) -> Optional[datetime]:
+        """Time a source is due, None if not scheduled"""
+        if pk not in self._entries:
+            return None
+        return datetime.now().astimezone(None) + timedelta(seconds=max(self._entries[pk][0] - self.clock(), 0))
+
+    def delay(self) -> Optional[float]:
+        """Number of seconds until the next source is due, None if nothing is scheduled"""
+        self._skip_stale()
+        if not self._heap:
+            return None
+        return max(self._heap[0][0] - self.clock(), 0)
+
+    def succeeded(self, source: DataSource):
+        self.failures.pop(source.pk, None)
+        self.postpone(source)
+
+    def postpone(self, source: DataSource):
+        """Check the source again after its interval, e.g. if it is leased by another worker"""
+        source = self.sources.get(source.pk)
+        if source is not None:
+            interval = self.interval(source)
+            self._push(source.pk, interval + self.rng.uniform(0, self.jitter * interval))
+
+    def failed(self, source: DataSource):
+        if source.pk not in self.sources:
+            return
+        failures = self.failures[source.pk] = self.failures.get(source.pk, 0) + 1
+        delay = min(self.retry_delay * 2 ** (failures - 1), self.max_backoff)
+        logger.debug("Retrying %s in %ss after %s failures", source.url, delay, failures)
+        self._push(source.pk, delay + self.rng.uniform(0, self.jitter * delay))
@@ -0,0 +1,46 @@
+import logging
+from typing import List, Set, Tuple
+
+from demo.models import DataSource
+
+logger = logging.getLogger(__name__)
+
+
+class SourceWatcher:
+    """
+    Detects the data sources added, edited or removed since the last check.
+
+    `changes` costs a single query (see `DataSourceQuerySet.change_marker`) while nothing changed.
+        Otherwise the sources updated since the last check are read, and the primary keys only if
+        the number of sources shows that some were removed.
+    """
+
+    def __init__(self, queryset=None):
+        self.queryset = queryset if queryset is not None else DataSource.objects.all()
+        self.marker = None
+        self.known = set()
+
+    def load(self) -> List[DataSource]:
+        """Read all the sources"""
+        self.marker = self.queryset.change_marker()
+        sources = list(self.queryset)
+        self.known = {source.pk for source in sources}
+        return sources
+
+    def changes(self) -> Tuple[List[DataSource], Set]:
+        """Return the sources added or edited, and the primary keys of the ones removed since the last check"""
+        marker = self.queryset.change_marker()
+        if marker == self.marker:
+            return [], set()
+        count, updated_at = marker
+        since = self.marker[1] if self.marker else None
+        self.marker = marker
+        # rows changed within the same clock tick as the last check are read again, which is harmless
+        changed = list(self.queryset.filter(updated_at__gte=since) if since else self.queryset)
+        self.known.update(source.pk for source in changed)
+        removed = set()
+        if count != len(self.known):
+            removed = self.known - set(self.queryset.values_list('pk', flat=True))
+            self.known -= removed
+        logger.debug("Sources changed: %s, removed: %s", [source.pk for source in changed], sorted(removed))
+        return changed, removed
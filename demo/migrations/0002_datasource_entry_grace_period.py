@@ -0,0 +1,18 @@
+# Generated by Django 2.2.28 on 2026-10-18 10:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('demo', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='datasource',
+            name='entry_grace_period',
+            field=models.PositiveIntegerField(blank=True, help_text='If set, skip entries published more than this number of seconds before the last successful update', null=True, verbose_name='entry grace period'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 2.2.28 on 2026-10-18 10:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('demo', '0002_datasource_entry_grace_period'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='datasource',
+            name='etag',
+            field=models.CharField(blank=True, editable=False, max_length=200, verbose_name='ETag'),
+        ),
+        migrations.AddField(
+            model_name='datasource',
+            name='last_modified',
+            field=models.CharField(blank=True, editable=False, max_length=100, verbose_name='Last-Modified'),
+        ),
+    ]
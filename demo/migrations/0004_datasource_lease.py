@@ -0,0 +1,23 @@
+# Generated by Django 2.2.28 on 2026-10-18 10:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('demo', '0003_datasource_etag_last_modified'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='datasource',
+            name='lease_owner',
+            field=models.CharField(blank=True, editable=False, max_length=100, verbose_name='lease owner'),
+        ),
+        migrations.AddField(
+            model_name='datasource',
+            name='leased_until',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='leased until'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 2.2.28 on 2026-10-18 10:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('demo', '0004_datasource_lease'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='datasource',
+            name='max_body_size',
+            field=models.PositiveIntegerField(blank=True, help_text='Max. size of a response in bytes, above which fetching is aborted. If not set, the limit of the worker is used', null=True, verbose_name='max. body size'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 2.2.28 on 2026-10-18 10:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('demo', '0005_datasource_max_body_size'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='datasource',
+            name='bytes_decoded',
+            field=models.BigIntegerField(default=0, editable=False, help_text='Size of the received responses after decompression', verbose_name='bytes decoded'),
+        ),
+        migrations.AddField(
+            model_name='datasource',
+            name='bytes_received',
+            field=models.BigIntegerField(default=0, editable=False, verbose_name='bytes received'),
+        ),
+    ]
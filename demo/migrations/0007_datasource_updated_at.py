@@ -0,0 +1,20 @@
+# Generated by Django 2.2.28 on 2026-10-18 10:24
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('demo', '0006_datasource_bytes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='datasource',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True, default=django.utils.timezone.now, verbose_name='updated at'),
+            preserve_default=False,
+        ),
+    ]
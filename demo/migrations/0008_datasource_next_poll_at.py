@@ -0,0 +1,18 @@
+# Generated by Django 2.2.28 on 2026-10-18 16:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('demo', '0007_datasource_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='datasource',
+            name='next_poll_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='next poll at'),
+        ),
+    ]
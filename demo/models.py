@@ -1,7 +1,46 @@
+from datetime import datetime, timedelta
+
 from django.db import models
+from django.db.models import Q
 from django.utils.translation import ugettext_lazy as _
 
 
+class DataSourceQuerySet(models.QuerySet):
+    """
+    Leases distribute the sources between workers: a worker only polls the sources it has claimed,
+        and releases each of them once polled, recording when it is due next (`next_poll_at`),
+        so that the next poll goes to whichever worker claims it first once due.
+        A lease expires unless renewed, so the sources of a crashed worker are picked up by the others.
+    """
+
+    def claim(self, owner: str, duration: timedelta) -> list:
+        """Atomically lease the due sources not leased by another owner, and return the claimed ones (re-read)"""
+        now = datetime.now().astimezone(None)
+        leased_until = now + duration
+        self.filter(
+            Q(lease_owner=owner) | Q(leased_until__isnull=True) | Q(leased_until__lt=now),
+            Q(next_poll_at__isnull=True) | Q(next_poll_at__lte=now),
+        ).update(lease_owner=owner, leased_until=leased_until)
+        return list(self.filter(lease_owner=owner, leased_until=leased_until))
+
+    def renew(self, owner: str, duration: timedelta) -> int:
+        """Extend the leases held by the owner, return their number"""
+        return self.filter(lease_owner=owner).update(leased_until=datetime.now().astimezone(None) + duration)
+
+    def release(self, owner: str, next_poll_at: datetime = None) -> int:
+        """Give up the leases held by the owner, setting the time the sources are due if given, return their number"""
+        fields = {'next_poll_at': next_poll_at} if next_poll_at is not None else {}
+        return self.filter(lease_owner=owner).update(lease_owner='', leased_until=None, **fields)
+
+    def change_marker(self) -> tuple:
+        """(number of sources, time of the last change), changed by any addition, edition or removal
+
+        Note that bookkeeping updates made with `update` or `save(update_fields=...)` don't count as changes.
+        """
+        marker = self.aggregate(count=models.Count('pk'), updated_at=models.Max('updated_at'))
+        return marker['count'], marker['updated_at']
+
+
 class DataSource(models.Model):
     """
     A data source representation
@@ -11,10 +50,44 @@ class DataSource(models.Model):
     poll_frequency = models.PositiveSmallIntegerField(_("poll frequency"), default=0)
     poll_count = models.PositiveIntegerField(_("number of polls"), default=0)
     last_successful_update = models.DateTimeField(_("last successful update"), blank=True, null=True)
+    entry_grace_period = models.PositiveIntegerField(
+        _("entry grace period"), blank=True, null=True,
+        help_text=_("If set, skip entries published more than this number of seconds "
+                    "before the last successful update"))
+    max_body_size = models.PositiveIntegerField(
+        _("max. body size"), blank=True, null=True,
+        help_text=_("Max. size of a response in bytes, above which fetching is aborted. "
+                    "If not set, the limit of the worker is used"))
+    etag = models.CharField(_("ETag"), max_length=200, blank=True, editable=False)
+    last_modified = models.CharField(_("Last-Modified"), max_length=100, blank=True, editable=False)
+    bytes_received = models.BigIntegerField(_("bytes received"), default=0, editable=False)
+    bytes_decoded = models.BigIntegerField(_("bytes decoded"), default=0, editable=False,
+                                           help_text=_("Size of the received responses after decompression"))
+    updated_at = models.DateTimeField(_("updated at"), auto_now=True, db_index=True)
+    lease_owner = models.CharField(_("lease owner"), max_length=100, blank=True, editable=False)
+    leased_until = models.DateTimeField(_("leased until"), blank=True, null=True, editable=False)
+    next_poll_at = models.DateTimeField(_("next poll at"), blank=True, null=True, editable=False)
+
+    objects = DataSourceQuerySet.as_manager()
 
     class Meta:
         verbose_name = _("data source")
         ordering = 'title',
 
+    def entries_since(self):
+        """Publication time of the oldest entry worth processing, None to process all entries"""
+        if self.entry_grace_period is None or self.last_successful_update is None:
+            return None
+        return self.last_successful_update - timedelta(seconds=self.entry_grace_period)
+
+    def conditional_headers(self):
+        """Request headers asking the server to respond with 304 if the source didn't change since the last update"""
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
     def __str__(self):
         return f'{self.title}[{self.url}]'
@@ -0,0 +1,22 @@
+# Generated by Django 2.2.28 on 2026-10-18 10:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rssnews', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='category',
+            options={'ordering': ('title',), 'verbose_name_plural': 'categories'},
+        ),
+        migrations.AddField(
+            model_name='item',
+            name='fingerprint',
+            field=models.CharField(blank=True, editable=False, max_length=40, verbose_name='fingerprint'),
+        ),
+    ]
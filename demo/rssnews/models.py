@@ -36,6 +36,7 @@ class Item(models.Model):
     guid = models.CharField(_("GUID"), max_length=255, unique=True, null=True, blank=True)
     author = models.ForeignKey(Author, null=True, blank=True, on_delete=models.SET_NULL)
     categories = models.ManyToManyField(Category, related_name="items")
+    fingerprint = models.CharField(_("fingerprint"), max_length=40, blank=True, editable=False)
 
     class Meta:
         ordering = 'date_published',
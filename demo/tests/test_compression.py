@@ -0,0 +1,74 @@
+import gzip
+import unittest
+import zlib
+
+from django.test import SimpleTestCase
+
+from demo.aggregator.compression import BodyTooLarge, brotli, get_decoder
+
+PAYLOAD = b'<item>' + b'0' * 1024 * 1024 + b'</item>'
+
+
+def compress_raw_deflate(data: bytes) -> bytes:
+    compressor = zlib.compressobj(wbits=-zlib.MAX_WBITS)
+    return compressor.compress(data) + compressor.flush()
+
+
+def decode(decoder, body: bytes, chunk_size: int = 1024) -> bytes:
+    output = [decoder.decode(body[start:start + chunk_size]) for start in range(0, len(body), chunk_size)]
+    return b''.join(output) + decoder.flush()
+
+
+class DecoderTest(SimpleTestCase):
+    encodings = {
+        'gzip': gzip.compress,
+        'deflate': zlib.compress,
+    }
+
+    def assert_decodes(self, encoding, compress):
+        self.assertEqual(decode(get_decoder(encoding, len(PAYLOAD)), compress(PAYLOAD)), PAYLOAD)
+
+    def assert_limited(self, encoding, compress):
+        body = compress(PAYLOAD)
+        decoder = get_decoder(encoding, 64 * 1024)
+        with self.assertRaises(BodyTooLarge):
+            decode(decoder, body, chunk_size=len(body))
+        # a decompression bomb is stopped before it is decoded as a whole
+        self.assertGreater(decoder.remaining, -len(PAYLOAD) // 2)
+
+    def test_decode(self):
+        for encoding, compress in self.encodings.items():
+            with self.subTest(encoding=encoding):
+                self.assert_decodes(encoding, compress)
+
+    def test_decode_raw_deflate(self):
+        self.assert_decodes('deflate', compress_raw_deflate)
+
+    def test_decode_byte_by_byte(self):
+        payload = PAYLOAD[:4096]
+        for encoding, compress in dict(self.encodings, raw_deflate=compress_raw_deflate).items():
+            with self.subTest(encoding=encoding):
+                decoder = get_decoder('gzip' if encoding == 'gzip' else 'deflate', len(payload))
+                self.assertEqual(decode(decoder, compress(payload), chunk_size=1), payload)
+
+    def test_identity(self):
+        self.assert_decodes('identity', lambda data: data)
+        with self.assertRaises(BodyTooLarge):
+            decode(get_decoder('identity', 64 * 1024), PAYLOAD)
+
+    def test_too_large(self):
+        for encoding, compress in self.encodings.items():
+            with self.subTest(encoding=encoding):
+                self.assert_limited(encoding, compress)
+
+    def test_too_large_raw_deflate(self):
+        self.assert_limited('deflate', compress_raw_deflate)
+
+    def test_unsupported(self):
+        with self.assertRaises(ValueError):
+            get_decoder('compress', 1024)
+
+    @unittest.skipIf(brotli is None, "brotli 1.2+ is not installed")
+    def test_brotli(self):
+        self.assert_decodes('br', brotli.compress)
+        self.assert_limited('br', brotli.compress)
@@ -0,0 +1,69 @@
+import math
+
+from django.test import SimpleTestCase
+
+from demo.aggregator.management.commands.aggregator_stats import quantile
+from demo.aggregator.metrics import BUCKETS, Metrics, format_labels, parse_samples
+
+
+class MetricsTest(SimpleTestCase):
+
+    def setUp(self):
+        self.metrics = Metrics()
+        self.metrics.describe('aggregator_fetch_seconds', "Time to fetch a source")
+        for source, value in ((1, 0.003), (1, 0.2), (2, 0.2), (2, 100)):
+            self.metrics.observe('aggregator_fetch_seconds', value, source=source)
+        self.metrics.inc('aggregator_polls_total', source=1)
+        self.metrics.inc('aggregator_polls_total', 2, source=2)
+        self.metrics.set('aggregator_queue_depth', 3, queue='parse')
+
+    def samples(self) -> dict:
+        return {
+            (name, tuple(sorted(labels.items()))): value
+            for name, labels, value in parse_samples(self.metrics.render())
+        }
+
+    def test_render(self):
+        text = self.metrics.render()
+        self.assertIn('# HELP aggregator_fetch_seconds Time to fetch a source\n', text)
+        self.assertIn('# TYPE aggregator_fetch_seconds histogram\n', text)
+        self.assertEqual(text.count('# TYPE aggregator_polls_total counter\n'), 1)
+        self.assertTrue(text.endswith('\n'))
+
+    def test_round_trip(self):
+        samples = self.samples()
+        self.assertEqual(samples['aggregator_polls_total', ()], 3)
+        self.assertEqual(samples['aggregator_polls_total', (('source', '2'),)], 2)
+        self.assertEqual(samples['aggregator_queue_depth', (('queue', 'parse'),)], 3)
+
+        # the aggregate histogram counts the observations of every source
+        self.assertEqual(samples['aggregator_fetch_seconds_count', ()], 4)
+        self.assertAlmostEqual(samples['aggregator_fetch_seconds_sum', ()], 100.403)
+        self.assertEqual(samples['aggregator_fetch_seconds_bucket', (('le', '0.005'),)], 1)
+        self.assertEqual(samples['aggregator_fetch_seconds_bucket', (('le', '0.25'),)], 3)
+        self.assertEqual(samples['aggregator_fetch_seconds_bucket', (('le', '+Inf'),)], 4)
+
+        self.assertEqual(samples['aggregator_fetch_seconds_count', (('source', '1'),)], 2)
+        self.assertEqual(samples['aggregator_fetch_seconds_bucket', (('le', '60'), ('source', '2'))], 1)
+        self.assertEqual(samples['aggregator_fetch_seconds_bucket', (('le', '+Inf'), ('source', '2'))], 2)
+
+    def test_buckets_cumulative(self):
+        buckets = [value for (name, labels), value in sorted(self.samples().items())
+                   if name == 'aggregator_fetch_seconds_bucket' and len(labels) == 1]
+        self.assertEqual(len(buckets), len(BUCKETS) + 1)
+        self.assertEqual(max(buckets), 4)
+
+    def test_label_escaping(self):
+        labels = (('source', 'a "quoted"\\path\nnext line, {x="y"}'),)
+        self.assertEqual(format_labels(labels), r'{source="a \"quoted\"\\path\nnext line, {x=\"y\"}"}')
+        self.metrics.set('aggregator_test', 1.5, source=labels[0][1])
+        samples = self.samples()
+        self.assertEqual(samples['aggregator_test', labels], 1.5)
+
+    def test_quantile(self):
+        buckets = [(0.1, 0), (0.5, 50), (1.0, 95), (float('inf'), 100)]
+        self.assertEqual(quantile(buckets, .5), 0.5)
+        self.assertEqual(quantile(buckets, .95), 1.0)
+        self.assertEqual(quantile(buckets, .99), float('inf'))
+        self.assertTrue(math.isnan(quantile([], .5)))
+        self.assertTrue(math.isnan(quantile([(0.1, 0), (float('inf'), 0)], .5)))
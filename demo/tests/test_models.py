@@ -0,0 +1,58 @@
+from datetime import datetime, timedelta
+
+from django.test import TestCase
+
+from demo.models import DataSource
+
+
+class DataSourceLeaseTest(TestCase):
+
+    def setUp(self):
+        self.sources = [
+            DataSource.objects.create(title=f"feed #{i}", url=f"http://127.0.0.1:18000/feed/{i}/")
+            for i in range(3)
+        ]
+        self.duration = timedelta(minutes=5)
+
+    def test_claim(self):
+        claimed = DataSource.objects.filter(pk__in=[self.sources[0].pk, self.sources[1].pk]).claim(
+            'worker-1', self.duration)
+        self.assertEqual({source.pk for source in claimed}, {self.sources[0].pk, self.sources[1].pk})
+        self.assertTrue(all(source.lease_owner == 'worker-1' for source in claimed))
+
+        claimed = DataSource.objects.claim('worker-2', self.duration)
+        self.assertEqual([source.pk for source in claimed], [self.sources[2].pk])
+        # the owner may claim its sources again
+        claimed = DataSource.objects.filter(pk=self.sources[0].pk).claim('worker-1', self.duration)
+        self.assertEqual(len(claimed), 1)
+
+    def test_claim_expired(self):
+        DataSource.objects.claim('worker-1', self.duration)
+        DataSource.objects.filter(pk=self.sources[0].pk).update(
+            leased_until=datetime.now().astimezone(None) - timedelta(seconds=1))
+        claimed = DataSource.objects.claim('worker-2', self.duration)
+        self.assertEqual([source.pk for source in claimed], [self.sources[0].pk])
+
+    def test_claim_due(self):
+        now = datetime.now().astimezone(None)
+        DataSource.objects.filter(pk=self.sources[0].pk).update(next_poll_at=now + timedelta(seconds=10))
+        DataSource.objects.filter(pk=self.sources[1].pk).update(next_poll_at=now - timedelta(seconds=1))
+        claimed = DataSource.objects.claim('worker-1', self.duration)
+        self.assertEqual({source.pk for source in claimed}, {self.sources[1].pk, self.sources[2].pk})
+
+    def test_renew(self):
+        DataSource.objects.filter(pk=self.sources[0].pk).claim('worker-1', self.duration)
+        DataSource.objects.filter(pk=self.sources[1].pk).claim('worker-2', self.duration)
+        renewed = DataSource.objects.all().renew('worker-1', timedelta(hours=1))
+        self.assertEqual(renewed, 1)
+        source = DataSource.objects.get(pk=self.sources[0].pk)
+        self.assertGreater(source.leased_until, datetime.now().astimezone(None) + self.duration)
+
+    def test_release(self):
+        DataSource.objects.claim('worker-1', self.duration)
+        self.assertEqual(DataSource.objects.filter(pk=self.sources[0].pk).release('worker-1'), 1)
+        self.assertEqual(DataSource.objects.release('worker-2'), 0)
+        claimed = DataSource.objects.claim('worker-2', self.duration)
+        self.assertEqual([source.pk for source in claimed], [self.sources[0].pk])
+        self.assertEqual(DataSource.objects.release('worker-1'), 2)
+        self.assertEqual(DataSource.objects.filter(lease_owner='').count(), 2)
@@ -0,0 +1,81 @@
+from datetime import datetime, timedelta
+
+from django.test import TestCase
+
+from demo.aggregator.client import FetchResult
+from demo.aggregator.management.commands.aggregator_worker import ItemMapper
+from demo.aggregator.pipeline import Pipeline
+from demo.aggregator.scheduler import Scheduler
+from demo.models import DataSource
+from demo.rssnews.models import Author, Category, Item
+from mapper.cache import RelatedObjectCache
+from mapper.parsers import parse_feed
+
+FEED = b"""<?xml version="1.0"?>
+<rss version="2.0"><channel><title>feed #1</title>
+<item><title>Item #1</title><guid>guid-1</guid><pubDate>Mon, 21 May 2018 18:58:52 GMT</pubDate>
+  <author>Marvin</author><category>Solar System</category></item>
+<item><title>Item #2</title><guid>guid-2</guid><pubDate>Mon, 21 May 2018 19:58:52 GMT</pubDate>
+  <author>Ford Prefect</author></item>
+</channel></rss>
+"""
+
+
+class PipelineLeaseTest(TestCase):
+
+    def setUp(self):
+        self.source = DataSource.objects.create(title="feed #1", url="http://127.0.0.1:18000/feed/1/")
+        self.pipeline = Pipeline(None, None, None, Scheduler(), owner='worker-1', lease_duration=timedelta(minutes=5))
+
+    def tearDown(self):
+        self.pipeline.db_executor.shutdown()
+
+    def test_release(self):
+        source, = DataSource.objects.filter(pk=self.source.pk).claim('worker-1', timedelta(minutes=5))
+        self.assertFalse(self.pipeline.write(source, None, None))
+        next_poll_at = datetime.now().astimezone(None) + timedelta(seconds=10)
+        self.pipeline.release(source, next_poll_at)
+        source.refresh_from_db()
+        self.assertEqual((source.lease_owner, source.leased_until), ('', None))
+        self.assertEqual(source.next_poll_at, next_poll_at)
+        self.assertEqual(source.poll_count, 1)
+        # not due yet
+        self.assertEqual(DataSource.objects.claim('worker-2', timedelta(minutes=5)), [])
+
+    def test_release_keeps_lease_of_another_worker(self):
+        source, = DataSource.objects.filter(pk=self.source.pk).claim('worker-2', timedelta(minutes=5))
+        self.pipeline.write(source, None, None)
+        self.pipeline.release(source, datetime.now().astimezone(None))
+        source.refresh_from_db()
+        self.assertEqual(source.lease_owner, 'worker-2')
+        self.assertIsNone(source.next_poll_at)
+
+    def test_renew_leases(self):
+        source, = DataSource.objects.filter(pk=self.source.pk).claim('worker-1', timedelta(seconds=10))
+        self.pipeline.renew_leases([source.pk])
+        renewed = DataSource.objects.get(pk=source.pk)
+        self.assertGreater(renewed.leased_until, source.leased_until + timedelta(minutes=4))
+
+
+class PipelineMetricsTest(TestCase):
+
+    def setUp(self):
+        self.source = DataSource.objects.create(title="feed #1", url="http://127.0.0.1:18000/feed/1/")
+
+    def write(self, graph_import: bool) -> Pipeline:
+        mapper = ItemMapper(model=Item, author_model=Author, category_model=Category, cache=RelatedObjectCache())
+        mapper.graph_import = graph_import
+        pipeline = Pipeline(None, None, mapper, Scheduler())
+        self.addCleanup(pipeline.db_executor.shutdown)
+        result = FetchResult(200, FEED, '', '', len(FEED), len(FEED))
+        self.assertTrue(pipeline.write(self.source, result, parse_feed(FEED, mapper.parser)))
+        self.assertEqual(Item.objects.count(), 2)
+        return pipeline
+
+    def test_map_seconds(self):
+        for graph_import in (False, True):
+            with self.subTest(graph_import=graph_import):
+                pipeline = self.write(graph_import)
+                histogram = pipeline.metrics.histograms['aggregator_map_seconds', ()]
+                self.assertEqual(sum(histogram.counts), 1)
+                self.assertGreater(histogram.sum, 0)
@@ -0,0 +1,169 @@
+import random
+from datetime import datetime, timedelta, timezone
+from unittest import mock
+
+from django.test import SimpleTestCase, TestCase
+
+from demo.aggregator.management.commands.aggregator_worker import Command
+from demo.aggregator.scheduler import Scheduler
+from demo.aggregator.watcher import SourceWatcher
+from demo.models import DataSource
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class SchedulerTest(SimpleTestCase):
+
+    def setUp(self):
+        self.clock = Clock()
+        self.scheduler = Scheduler(default_interval=10, jitter=0.1, retry_delay=10, max_backoff=100,
+                                   clock=self.clock, rng=random.Random(0))
+        self.sources = [DataSource(pk=pk, title=f"feed #{pk}", url=f"http://127.0.0.1:18000/feed/{pk}/")
+                        for pk in range(1, 5)]
+
+    def test_pop_due_order(self):
+        for source, delay in zip(self.sources, (30, 10, 20, 40)):
+            self.scheduler.add(source, delay)
+        self.assertEqual(self.scheduler.pop_due(), [])
+        self.assertEqual(self.scheduler.delay(), 10)
+        self.clock.now = 30
+        self.assertEqual([source.pk for source in self.scheduler.pop_due()], [2, 3, 1])
+        self.assertEqual(self.scheduler.delay(), 10)
+        self.assertEqual(len(self.scheduler), 1)
+
+    def test_pop_due_skips_superseded(self):
+        self.scheduler.add(self.sources[0], 10)
+        self.scheduler.add(self.sources[1], 20)
+        self.scheduler.add(self.sources[0], 30)
+        self.scheduler.remove(self.sources[1].pk)
+        self.clock.now = 25
+        self.assertEqual(self.scheduler.pop_due(), [])
+        self.clock.now = 30
+        self.assertEqual(self.scheduler.pop_due(), [self.sources[0]])
+        self.assertIsNone(self.scheduler.delay())
+
+    def test_failure_backoff(self):
+        self.scheduler.jitter = 0
+        source = self.sources[0]
+        self.scheduler.add(source)
+        delays = []
+        for _ in range(6):
+            self.scheduler.pop_due()
+            self.scheduler.failed(source)
+            delays.append(self.scheduler.delay())
+        self.assertEqual(delays, [10, 20, 40, 80, 100, 100])
+        self.scheduler.pop_due()
+        self.scheduler.succeeded(source)
+        self.assertEqual(self.scheduler.delay(), 10)
+        self.assertNotIn(source.pk, self.scheduler.failures)
+
+    def test_jitter_bounds(self):
+        source = self.sources[0]
+        self.scheduler.add(source)
+        delays = []
+        for _ in range(200):
+            self.scheduler.pop_due()
+            self.scheduler.succeeded(source)
+            delays.append(self.scheduler.delay())
+        self.assertTrue(all(10 <= delay <= 11 for delay in delays))
+        self.assertGreater(max(delays) - min(delays), 0.5)
+
+        delays = []
+        for _ in range(200):
+            self.scheduler.failures.clear()
+            self.scheduler.failed(source)
+            delays.append(self.scheduler.delay())
+        self.assertTrue(all(10 <= delay <= 11 for delay in delays))
+
+
+class SchedulerUpdateTest(TestCase):
+
+    def setUp(self):
+        self.clock = Clock()
+        self.scheduler = Scheduler(jitter=0, clock=self.clock)
+        self.source = DataSource.objects.create(title="feed #1", url="http://127.0.0.1:18000/feed/1/",
+                                                poll_frequency=3600,
+                                                last_successful_update=datetime.now().astimezone(None))
+        self.watcher = SourceWatcher()
+        for source in self.watcher.load():
+            self.scheduler.schedule(source)
+
+    def test_update_keeps_due_time(self):
+        self.source.title = "feed #1, renamed"
+        self.scheduler.update(self.source)
+        self.assertGreater(self.scheduler.delay(), 3500)
+        self.assertEqual(self.scheduler.sources[self.source.pk].title, "feed #1, renamed")
+
+    def test_update_shorter_interval(self):
+        self.source.poll_frequency = 60
+        self.scheduler.update(self.source)
+        self.assertEqual(self.scheduler.delay(), 60)
+        self.clock.now = 60
+        self.assertEqual([source.pk for source in self.scheduler.pop_due()], [self.source.pk])
+        self.assertIsNone(self.scheduler.delay())
+
+    def test_update_longer_interval(self):
+        self.source.poll_frequency = 7200
+        self.scheduler.update(self.source)
+        self.assertLessEqual(self.scheduler.delay(), 3600)
+
+    def test_update_while_polled(self):
+        self.clock.now = 3600
+        source, = self.scheduler.pop_due()
+        source.poll_frequency = 60
+        self.scheduler.update(source)
+        self.assertIsNone(self.scheduler.delay())
+        self.scheduler.succeeded(source)
+        self.assertEqual(self.scheduler.delay(), 60)
+
+    def test_reload_edited(self):
+        self.source.poll_frequency = 60
+        self.source.save()
+        Command().reload(self.watcher, self.scheduler)
+        self.assertEqual(self.scheduler.sources[self.source.pk].poll_frequency, 60)
+        self.assertEqual(self.scheduler.delay(), 60)
+
+
+class SchedulerWorkersTest(TestCase):
+    """Workers sharing a source, with the clock of their schedulers and of leases driven by the test"""
+
+    def setUp(self):
+        self.clock = clock = Clock()
+        start = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+        class FakeDatetime(datetime):
+            @classmethod
+            def now(cls, tz=None):
+                return start + timedelta(seconds=clock.now)
+
+        for module in ('demo.models', 'demo.aggregator.scheduler'):
+            patcher = mock.patch(f'{module}.datetime', FakeDatetime)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.source = DataSource.objects.create(title="feed #1", url="http://127.0.0.1:18000/feed/1/")
+
+    def test_polled_once_per_interval(self):
+        workers = {
+            worker_id: Scheduler(default_interval=10, jitter=0.1, clock=self.clock, rng=random.Random(seed))
+            for seed, worker_id in enumerate(('worker-1', 'worker-2'))
+        }
+        for scheduler in workers.values():
+            scheduler.schedule(DataSource.objects.get(pk=self.source.pk))
+        polls = []
+        for tick in range(300):
+            self.clock.now = tick
+            for worker_id, scheduler in workers.items():
+                for source in Command().claim(scheduler, scheduler.pop_due(), worker_id, timedelta(minutes=5)):
+                    polls.append(tick)
+                    scheduler.succeeded(source)
+                    DataSource.objects.filter(pk=source.pk).release(worker_id, scheduler.due_at(source.pk))
+        self.assertEqual(polls[0], 0)
+        gaps = [polls[i + 1] - polls[i] for i in range(len(polls) - 1)]
+        self.assertTrue(all(10 <= gap <= 12 for gap in gaps), gaps)
+        self.assertGreaterEqual(len(polls), 300 // 12)
@@ -0,0 +1,13 @@
+"""
+Mapper benchmarks, run from the `lib-demo` directory, e.g.:
+
+    python -m benchmarks.bench_field_plan
+"""
+import os
+
+
+def setup_django():
+    """Configure Django with the test settings, so that the test models can be used"""
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'tests.settings')
+    import django
+    django.setup()
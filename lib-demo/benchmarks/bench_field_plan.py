@@ -0,0 +1,77 @@
+"""
+Per-entry CPU cost of `MapperBase.map_entry` on a wide model:
+the compiled field plan vs the former per-entry `getattr` dispatch.
+"""
+from argparse import ArgumentParser
+from timeit import timeit
+
+from benchmarks import setup_django
+
+setup_django()
+
+from django.db import models  # NOQA: E402
+
+from mapper.base import MapperBase  # NOQA: E402
+
+
+def make_wide_model(width: int):
+    attrs = {
+        '__module__': __name__,
+        'Meta': type('Meta', (), {'app_label': 'tests'}),
+    }
+    for i in range(width):
+        attrs[f'field_{i}'] = models.CharField(max_length=100, blank=(i % 2 == 0))
+    return type(f'WideModel{width}', (models.Model,), attrs)
+
+
+class WideMapper(MapperBase):
+    unique_fields = ['field_1']
+
+    def transform_field_0(self, data, field):
+        return data.get('field_0', '').upper()
+
+
+def legacy_map_entry(mapper: MapperBase, data: dict):
+    """The per-entry dispatch used before the field plan was introduced"""
+    instance_params = {}
+    unique_params = {}
+    m2m_params = {}
+    for field_name, field in mapper.model_fields.items():
+        try:
+            transform = getattr(mapper, f'transform_{field_name}')
+        except AttributeError:
+            value = mapper.get_value(data, field, field_name)
+        else:
+            value = transform(data, field)
+
+        if value is ...:
+            continue
+
+        if isinstance(field, models.ManyToManyField):
+            m2m_params[field_name] = value
+        elif field_name in mapper.unique_fields and value is not None:
+            unique_params[field_name] = value
+        else:
+            instance_params[field_name] = value
+    return instance_params, unique_params, m2m_params
+
+
+def run(width: int, number: int):
+    model = make_wide_model(width)
+    mapper = WideMapper(model)
+    entry = {f'field_{i}': f'value {i}' for i in range(width)}
+    assert legacy_map_entry(mapper, entry) == mapper.map_entry(entry)
+
+    legacy = timeit(lambda: legacy_map_entry(mapper, entry), number=number) / number
+    planned = timeit(lambda: mapper.map_entry(entry), number=number) / number
+    print(f"{width:>4} fields: getattr dispatch {legacy * 1e6:8.2f} us/entry, "
+          f"field plan {planned * 1e6:8.2f} us/entry, saving {(1 - planned / legacy) * 100:5.1f}%")
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument('-n', '--number', type=int, default=20000, help="Entries to map per measurement")
+    parser.add_argument('-w', '--width', type=int, action='append', help="Model width (repeatable)")
+    args = parser.parse_args()
+    for width in args.width or [10, 50, 200]:
+        run(width, args.number)
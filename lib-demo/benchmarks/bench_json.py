@@ -0,0 +1,53 @@
+"""
+Throughput and peak memory of streaming JSON records with `iter_json_records`, compared to `json.loads`.
+"""
+import json
+import tracemalloc
+from argparse import ArgumentParser
+from time import perf_counter
+
+from mapper.json import iter_json_records
+
+
+def make_document(count: int) -> bytes:
+    records = (
+        json.dumps({
+            "guid": f"guid-{i}",
+            "title": f"Record #{i}",
+            "description": "Lorem ipsum dolor sit amet, consectetur adipiscing elit " * 4,
+            "date_published": "2018-05-21T21:58:52+03:00",
+            "categories": ["Hitchhiking", "Solar System"],
+        })
+        for i in range(count)
+    )
+    return ('{"meta": {"count": %d}, "data": {"items": [' % count + ",".join(records) + ']}}').encode()
+
+
+def consume_loads(document: bytes) -> int:
+    return sum(1 for _ in json.loads(document)["data"]["items"])
+
+
+def consume_stream(document: bytes) -> int:
+    return sum(1 for _ in iter_json_records(document, "data.items"))
+
+
+def measure(consume, document: bytes):
+    tracemalloc.start()
+    started = perf_counter()
+    count = consume(document)
+    elapsed = perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return count / elapsed, peak
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument('-n', '--records', type=int, action='append', help="Document size (repeatable)")
+    args = parser.parse_args()
+    for count in args.records or [1000, 10000, 100000]:
+        document = make_document(count)
+        for name, consume in [("json.loads", consume_loads), ("stream", consume_stream)]:
+            rate, peak = measure(consume, document)
+            print(f"{count:>7} records ({len(document) / 2 ** 20:7.1f} MiB), {name:>10}: "
+                  f"{rate:9.0f} records/s, peak memory {peak / 2 ** 20:8.2f} MiB")
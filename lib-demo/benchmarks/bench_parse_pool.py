@@ -0,0 +1,44 @@
+"""
+Parse throughput of a batch of feeds with `mapper.parsers.parse_feed` run in a process pool,
+    by number of worker processes (0 parses in the main process), as done by `aggregator_worker --parse-workers`.
+"""
+import os
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor
+from time import perf_counter
+
+from benchmarks.feeds import make_feed
+from mapper.parsers import BACKENDS, parse_feed
+
+
+def measure(documents: list, backend: str, workers: int, repeat: int) -> float:
+    backends = [backend] * len(documents)
+    best = None
+    for _ in range(repeat):
+        started = perf_counter()
+        if workers:
+            with ProcessPoolExecutor(workers) as executor:
+                parsed = list(executor.map(parse_feed, documents, backends))
+        else:
+            parsed = list(map(parse_feed, documents, backends))
+        elapsed = perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return sum(len(feed.entries) for feed in parsed) / best
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument('-f', '--feeds', type=int, default=32, help="Number of feeds")
+    parser.add_argument('-n', '--entries', type=int, default=500, help="Entries per feed")
+    parser.add_argument('-r', '--repeat', type=int, default=3, help="Best of N runs")
+    parser.add_argument('-b', '--backend', default='feedparser', choices=sorted(BACKENDS))
+    parser.add_argument('-w', '--workers', type=int, action='append', help="Number of processes (repeatable)")
+    args = parser.parse_args()
+    documents = [make_feed(args.entries, seed=seed) for seed in range(args.feeds)]
+    counts = args.workers or sorted({0, 1, 2, 4, os.cpu_count() or 1})
+    baseline = None
+    for workers in counts:
+        rate = measure(documents, args.backend, workers, args.repeat)
+        baseline = baseline or rate
+        print(f"{args.feeds} feeds x {args.entries} entries, {args.backend}, {workers:>3} workers: "
+              f"{rate:10.0f} entries/s ({rate / baseline:4.1f}x)")
@@ -0,0 +1,32 @@
+"""
+Parse throughput of the feed parser backends, in entries per second.
+"""
+from argparse import ArgumentParser
+from time import perf_counter
+
+from benchmarks.feeds import make_feed
+from mapper.parsers import BACKENDS, get_backend
+
+
+def measure(name: str, document: bytes, repeat: int) -> float:
+    backend = get_backend(name)
+    best = None
+    for _ in range(repeat):
+        started = perf_counter()
+        count = sum(1 for _ in backend.parse(document).entries)
+        elapsed = perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return count / best
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument('-n', '--entries', type=int, action='append', help="Feed size (repeatable)")
+    parser.add_argument('-r', '--repeat', type=int, default=3, help="Best of N runs")
+    parser.add_argument('-b', '--backend', action='append', choices=sorted(BACKENDS), help="Backend (repeatable)")
+    args = parser.parse_args()
+    for count in args.entries or [100, 1000, 10000]:
+        document = make_feed(count)
+        for name in args.backend or sorted(BACKENDS):
+            print(f"{count:>6} entries ({len(document) / 1024:8.1f} KiB), {name:>10}: "
+                  f"{measure(name, document, args.repeat):10.0f} entries/s")
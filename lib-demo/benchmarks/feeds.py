@@ -0,0 +1,54 @@
+"""Synthetic RSS 2.0 feeds for benchmarks, in the format of the demo RSS generator"""
+import random
+from datetime import datetime, timedelta, timezone
+from xml.sax.saxutils import escape
+
+RSS_DATE_FORMAT = "%a, %d %b %Y %H:%M:%S %z"
+
+WORDS = (
+    "the book begins with council workmen arriving at Arthur Dent's house they wish to demolish "
+    "his house in order to build a bypass Ford Prefect arrives warning him of the end of the world"
+).split()
+
+
+def make_feed(count: int, categories: int = 3, category_pool: int = 50, seed: int = 0) -> bytes:
+    """Generate a feed of `count` items with up to `categories` categories each, out of `category_pool`"""
+    rnd = random.Random(seed)
+    now = datetime(2018, 5, 21, tzinfo=timezone(timedelta(hours=3)))
+    parts = [
+        '<?xml version="1.0" encoding="utf-8"?>\n<rss version="2.0">\n<channel>\n',
+        f'<title>Benchmark feed</title>\n<pubDate>{now.strftime(RSS_DATE_FORMAT)}</pubDate>\n',
+    ]
+    for i in range(count):
+        title = escape(" ".join(rnd.sample(WORDS, 4)).capitalize())
+        pub_date = (now - timedelta(seconds=i * 60)).strftime(RSS_DATE_FORMAT)
+        parts.append(
+            f'<item>\n<title>{title}</title>\n'
+            f'<description>{escape(" ".join(rnd.sample(WORDS, 20)))}</description>\n'
+            f'<pubDate>{pub_date}</pubDate>\n'
+            f'<guid>http://localhost:18000/feed/1/#item-{i}</guid>\n'
+            f'<author>Author #{rnd.randrange(20)}</author>\n'
+        )
+        for category in rnd.sample(range(category_pool), rnd.randint(0, categories)):
+            parts.append(f'<category>Category #{category}</category>\n')
+        parts.append('</item>\n')
+    parts.append('</channel>\n</rss>\n')
+    return "".join(parts).encode()
+
+
+def make_entries(count: int, categories: int = 3, category_pool: int = 50, seed: int = 0) -> list:
+    """Generate `count` entries (dicts) as `make_feed` does items, with author and category names"""
+    rnd = random.Random(seed)
+    now = datetime(2018, 5, 21, tzinfo=timezone(timedelta(hours=3)))
+    return [
+        {
+            'title': " ".join(rnd.sample(WORDS, 4)).capitalize(),
+            'description': " ".join(rnd.sample(WORDS, 20)),
+            'date_published': now - timedelta(seconds=i * 60),
+            'guid': f'http://localhost:18000/feed/1/#item-{i}',
+            'author': f'Author #{rnd.randrange(20)}',
+            'categories': [f'Category #{category}'
+                           for category in rnd.sample(range(category_pool), rnd.randint(0, categories))],
+        }
+        for i in range(count)
+    ]
@@ -0,0 +1,14 @@
+"""
+The test settings with the database selected by the `BENCHMARK_DB` environment variable:
+    `:memory:` (default) for an in-memory SQLite, or the path of an on-disk SQLite database.
+"""
+import os
+
+from tests.settings import *  # NOQA: F401,F403
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.environ.get('BENCHMARK_DB', ':memory:'),
+    }
+}
@@ -0,0 +1,275 @@
+"""
+Mapper benchmark suite with regression gates.
+
+Imports synthetic feeds with `MapperBase.process` ('base', pre-parsed entries) and `RSSMapper.process_string`
+('rss', including parsing), into an in-memory SQLite ('memory') and an on-disk SQLite in WAL mode ('wal').
+Every case runs in its own process, and reports for the first import (inserts) and a re-import of the same
+entries (fingerprint hits): entries per second (best of `--repeat` runs, a single run from 10000 entries),
+SQL queries per entry, and the peak RSS of the process.
+
+    python -m benchmarks.suite run -o baseline.json
+    python -m benchmarks.suite run -o current.json
+    python -m benchmarks.suite compare baseline.json current.json --threshold 0.1
+
+`compare` exits with status 1 if any case got slower or bigger than `--threshold` (a fraction),
+runs more queries per entry than `--query-threshold` allows (none by default), or is missing.
+"""
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+from argparse import ArgumentParser
+from datetime import datetime
+from itertools import product
+from time import perf_counter
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+WORKLOADS = 'base', 'rss'
+DATABASES = 'memory', 'wal'
+SIZES = 10, 1000, 100000
+FANOUTS = 0, 3, 10
+
+# metric -> whether higher is better
+METRICS = {
+    'entries_per_sec': True,
+    'reimport_entries_per_sec': True,
+    'queries_per_entry': False,
+    'reimport_queries_per_entry': False,
+    'peak_rss_mb': False,
+}
+QUERY_METRICS = 'queries_per_entry', 'reimport_queries_per_entry'
+
+
+def case_key(workload: str, db: str, size: int, fanout: int) -> str:
+    return f'{workload}/{db}/n={size}/fanout={fanout}'
+
+
+def peak_rss_mb() -> float:
+    if resource is None:
+        return float('nan')
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / 1024 / 1024 if sys.platform == 'darwin' else peak / 1024
+
+
+def run_case(workload: str, db: str, size: int, fanout: int, repeat: int) -> dict:
+    """Run a case in this process, with Django configured by `benchmarks.settings`"""
+    from django.core.management import call_command
+    from django.db import connection
+    from django.db.backends.signals import connection_created
+
+    from benchmarks.feeds import make_entries, make_feed
+    from mapper.base import MapperBase
+    from mapper.cache import RelatedObjectCache
+    from mapper.profiling import QueryCounter
+    from mapper.rss import RSSMapper
+    from tests.models import FakeRSSAuthor, FakeRSSCategory, FakeRSSItem
+
+    def set_wal(connection, **kwargs):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode=WAL')
+            cursor.execute('PRAGMA synchronous=NORMAL')
+
+    if db == 'wal':
+        connection_created.connect(set_wal)
+    call_command('migrate', run_syncdb=True, verbosity=0)
+
+    class ItemMapper(MapperBase):
+        unique_fields = ['guid']
+        batch_size = 100
+        fingerprint_field = 'fingerprint'
+
+        def __init__(self, model, authors: dict, categories: dict):
+            super().__init__(model)
+            self.authors = authors
+            self.categories = categories
+
+        def transform_author(self, data, field):
+            return self.authors[data['author']]
+
+        def transform_categories(self, data, field):
+            return [self.categories[title] for title in data['categories']]
+
+    class ItemRSSMapper(RSSMapper):
+        fingerprint_field = 'fingerprint'
+
+    def reset():
+        with connection.cursor() as cursor:
+            for model in (FakeRSSItem.categories.through, FakeRSSItem, FakeRSSAuthor, FakeRSSCategory):
+                cursor.execute(f'DELETE FROM {model._meta.db_table}')
+
+    if workload == 'base':
+        data = make_entries(size, categories=fanout)
+
+        def make_import():
+            authors = {author: FakeRSSAuthor.objects.create(name=author)
+                       for author in sorted({entry['author'] for entry in data})}
+            categories = {title: FakeRSSCategory.objects.create(title=title)
+                          for title in sorted({title for entry in data for title in entry['categories']})}
+            mapper = ItemMapper(FakeRSSItem, authors, categories)
+            return lambda: mapper.process(data)
+    else:
+        data = make_feed(size, categories=fanout)
+
+        def make_import():
+            mapper = ItemRSSMapper(FakeRSSItem, author_model=FakeRSSAuthor, category_model=FakeRSSCategory,
+                                   cache=RelatedObjectCache())
+            return lambda: mapper.process_string(data)
+
+    timings = {'entries_per_sec': [], 'reimport_entries_per_sec': []}
+    queries = {}
+    for _ in range(repeat if size < 10000 else 1):
+        reset()
+        run_import = make_import()
+        for name in timings:
+            with QueryCounter() as counter:
+                started = perf_counter()
+                count = len(run_import())
+                elapsed = perf_counter() - started
+            assert count == size, (count, size)
+            timings[name].append(size / elapsed)
+            queries[name.replace('entries_per_sec', 'queries_per_entry')] = counter.count / size
+    assert FakeRSSItem.objects.count() == size
+
+    return dict(
+        {name: max(values) for name, values in timings.items()},
+        peak_rss_mb=peak_rss_mb(),
+        **queries
+    )
+
+
+def run_suite(workloads, databases, sizes, fanouts, repeat: int) -> dict:
+    """Run every case in a subprocess, return the results of the ones which succeeded by case key"""
+    results = {}
+    print(f"{'case':<36}{'entries/s':>12}{'re-import/s':>12}{'queries/e':>11}{'re-q/e':>9}{'RSS, MB':>9}")
+    with tempfile.TemporaryDirectory() as directory:
+        for workload in workloads:
+            for db in databases:
+                for size in sizes:
+                    for fanout in fanouts:
+                        env = dict(os.environ, DJANGO_SETTINGS_MODULE='benchmarks.settings')
+                        if db == 'wal':
+                            path = os.path.join(directory, f'{workload}-{size}-{fanout}.sqlite3')
+                            env['BENCHMARK_DB'] = path
+                        else:
+                            env.pop('BENCHMARK_DB', None)
+                        process = subprocess.run(
+                            [sys.executable, '-m', 'benchmarks.suite', 'case', workload, db, str(size), str(fanout),
+                             '--repeat', str(repeat)],
+                            env=env, stdout=subprocess.PIPE,
+                        )
+                        key = case_key(workload, db, size, fanout)
+                        if process.returncode:
+                            # left out of the results, so that `compare` reports it as missing
+                            print(f"{key:<36}failed with status {process.returncode}")
+                            continue
+                        result = results[key] = json.loads(process.stdout)
+                        print(f"{key:<36}{result['entries_per_sec']:>12.0f}{result['reimport_entries_per_sec']:>12.0f}"
+                              f"{result['queries_per_entry']:>11.3f}{result['reimport_queries_per_entry']:>9.3f}"
+                              f"{result['peak_rss_mb']:>9.1f}")
+    return results
+
+
+def compare(baseline: dict, current: dict, threshold: float, query_threshold: float) -> list:
+    """Print the changes of every metric, and return the regressions as (case, metric, baseline, current)
+
+    A case of the baseline missing from the current results (e.g. it crashed) is a regression of every metric.
+    """
+    regressions = []
+    for key in sorted(baseline['results']):
+        if key not in current['results']:
+            print(f"{key:<36}missing from the current results  REGRESSION")
+            regressions.extend((key, metric, baseline['results'][key][metric], None) for metric in METRICS)
+            continue
+        for metric, higher_is_better in METRICS.items():
+            old = baseline['results'][key][metric]
+            new = current['results'][key][metric]
+            allowed = query_threshold if metric in QUERY_METRICS else threshold
+            if old:
+                change = (new - old) / old
+            else:
+                # any growth from zero (e.g. queries of a re-import) exceeds a relative threshold
+                change = float('inf') if new > 0 else 0.0
+            worse = -change if higher_is_better else change
+            regressed = worse > allowed
+            if regressed:
+                regressions.append((key, metric, old, new))
+            print(f"{key:<36}{metric:<28}{old:>12.3f}{new:>12.3f}{change * 100:>+9.1f}%"
+                  f"{'  REGRESSION' if regressed else ''}")
+    return regressions
+
+
+def main(argv=None):
+    parser = ArgumentParser(description=__doc__.split('\n\n')[0])
+    subparsers = parser.add_subparsers(dest='command')
+    subparsers.required = True
+
+    run = subparsers.add_parser('run', help="Run the suite")
+    run.add_argument('-w', '--workload', action='append', choices=WORKLOADS, help="Workload (repeatable)")
+    run.add_argument('-d', '--db', action='append', choices=DATABASES, help="Database (repeatable)")
+    run.add_argument('-n', '--size', type=int, action='append', help="Number of entries (repeatable)")
+    run.add_argument('-f', '--fanout', type=int, action='append', help="Max. categories per entry (repeatable)")
+    run.add_argument('-r', '--repeat', type=int, default=3, help="Best of N runs, below 10000 entries")
+    run.add_argument('-o', '--output', help="Save the results as JSON to this file")
+
+    case = subparsers.add_parser('case', help="Run a single case, in the current process")
+    case.add_argument('workload', choices=WORKLOADS)
+    case.add_argument('db', choices=DATABASES)
+    case.add_argument('size', type=int)
+    case.add_argument('fanout', type=int)
+    case.add_argument('-r', '--repeat', type=int, default=3)
+
+    diff = subparsers.add_parser('compare', help="Compare results to a baseline, fail on regressions")
+    diff.add_argument('baseline')
+    diff.add_argument('current')
+    diff.add_argument('-t', '--threshold', type=float, default=0.1,
+                      help="Max. relative loss of throughput or growth of RSS (default: 0.1)")
+    diff.add_argument('-q', '--query-threshold', type=float, default=0.0,
+                      help="Max. relative growth of queries per entry (default: 0)")
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'case':
+        from benchmarks import setup_django
+        setup_django()
+        print(json.dumps(run_case(args.workload, args.db, args.size, args.fanout, args.repeat)))
+
+    elif args.command == 'run':
+        cases = args.workload or WORKLOADS, args.db or DATABASES, args.size or SIZES, args.fanout or FANOUTS
+        results = run_suite(*cases, args.repeat)
+        if args.output:
+            import django
+            with open(args.output, 'w') as f:
+                json.dump({
+                    'meta': {
+                        'date': datetime.now().astimezone(None).isoformat(),
+                        'python': platform.python_version(),
+                        'django': django.get_version(),
+                        'platform': platform.platform(),
+                    },
+                    'results': results,
+                }, f, indent=2, sort_keys=True)
+        failed = len(list(product(*cases))) - len(results)
+        if failed:
+            print(f"{failed} cases failed")
+            sys.exit(1)
+
+    else:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        with open(args.current) as f:
+            current = json.load(f)
+        regressions = compare(baseline, current, args.threshold, args.query_threshold)
+        if regressions:
+            print(f"{len(regressions)} regressions")
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
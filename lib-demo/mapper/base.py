@@ -1,13 +1,37 @@
-from typing import Iterable, Type, List
+from typing import Any, Iterable, Type, List, Tuple
 
+import hashlib
 import logging
-from django.core.exceptions import ValidationError
-from django.db import models
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from itertools import islice
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db import DatabaseError, models, transaction
+
+from mapper.m2m import sync_m2m
 
 
 logger = logging.getLogger(__name__)
 
 
+def chunked(iterable: Iterable, size: int) -> Iterable[list]:
+    """Split an iterable into lists of `size` items, consuming it lazily"""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+# Destination buckets of the field plan, indexes in the tuple returned by `MapperBase.map_entry`
+BUCKET_INSTANCE = 0
+BUCKET_UNIQUE = 1
+BUCKET_M2M = 2
+
+
 class MapperBase:
     """
     A base mapper class.
@@ -23,6 +47,10 @@ class MapperBase:
     """
     exclude_fields = []  # type: list[str]
     unique_fields = []  # type: list[str]
+    batch_size = None  # type: int  # if set, `process` saves entries in batches of this size with bulk queries
+    fingerprint_field = None  # type: str  # if set, the field stores a hash of mapped values to skip unchanged rows
+    atomic_chunk_size = None  # type: int  # if set, `process` commits every N entries in one transaction
+    skip_errors = (ValidationError, DatabaseError)  # entry errors recorded and skipped in the transactional mode
 
     def __init__(self, model: Type[models.Model]):
         self.model = model
@@ -30,34 +58,66 @@ class MapperBase:
         self.model_fields = {
             f.name: f
             for f in model._meta.get_fields()
-            if not isinstance(f, models.AutoField) and f.name not in self.exclude_fields
+            if not isinstance(f, models.AutoField)
+            and not (f.auto_created and not f.concrete)  # reverse relations
+            and f.name not in self.exclude_fields and f.name != self.fingerprint_field
         }
         for field in self.unique_fields:
             if field not in self.model_fields:
                 raise TypeError(f"Unknown field '{field}' in the list of unique fields")
+        if self.fingerprint_field is not None:
+            try:
+                model._meta.get_field(self.fingerprint_field)
+            except FieldDoesNotExist:
+                raise TypeError(f"Unknown fingerprint field '{self.fingerprint_field}'")
+            if not self.batch_size:
+                # only `save_batch` computes and compares fingerprints
+                raise TypeError("The fingerprint field requires batch mode, please set `batch_size`")
+        self.stats = Counter()
+        self.errors = []  # (entry index, exception) skipped by the last `process` call
+        self.chunk_timings = []  # seconds spent on each transaction of the last `process` call, including commit
+        # cumulative seconds spent in batch mode mapping entries ('map'), saving rows ('write') and M2M ('m2m')
+        self.timings = Counter()
+        self.field_plan = self.compile_plan()
 
-    def process_entry(self, data: dict) -> models.Model:
-        instance_params = {}
-        unique_params = {}
-        m2m_params = {}  # We can not directly save M2M values to the field owner object, need a separate list
+    def compile_plan(self) -> tuple:
+        """Resolve the extractor and destination bucket of every field once, for use by `map_entry`
+
+        :return: tuple of (field name, field, extractor, bucket), the extractor is called as `extractor(data, field)`
+        """
+        plan = []
         for field_name, field in self.model_fields.items():
-            try:
-                transform = getattr(self, f'transform_{field_name}')
-            except AttributeError:
-                value = self.get_value(data, field, field_name)
+            extractor = getattr(self, f'transform_{field_name}', self.get_value)
+            if isinstance(field, models.ManyToManyField):
+                bucket = BUCKET_M2M
+            elif field_name in self.unique_fields:
+                bucket = BUCKET_UNIQUE
             else:
-                value = transform(data, field)
+                bucket = BUCKET_INSTANCE
+            plan.append((field_name, field, extractor, bucket))
+        return tuple(plan)
+
+    def map_entry(self, data: dict, plan: tuple = None) -> Tuple[dict, dict, dict]:
+        """Map an entry to model parameters
 
+        :param data:
+        :param plan: a field plan to use instead of `field_plan`, see `compile_plan`
+        :return: (instance_params, unique_params, m2m_params)
+        """
+        # We can not directly save M2M values to the field owner object, need a separate dict
+        params = instance_params, unique_params, m2m_params = {}, {}, {}
+        for field_name, field, extractor, bucket in plan or self.field_plan:
+            value = extractor(data, field)
             if value is ...:
                 # let Django use default value defined in the Model
                 continue
+            if bucket is BUCKET_UNIQUE and value is None:
+                bucket = BUCKET_INSTANCE
+            params[bucket][field_name] = value
+        return params
 
-            if isinstance(field, models.ManyToManyField):
-                m2m_params[field_name] = value
-            elif field_name in self.unique_fields and value is not None:
-                unique_params[field_name] = value
-            else:
-                instance_params[field_name] = value
+    def process_entry(self, data: dict) -> models.Model:
+        instance_params, unique_params, m2m_params = self.map_entry(data)
 
         if unique_params:
             instance, created = self.model.objects.get_or_create(defaults=instance_params, **unique_params)
@@ -72,15 +132,304 @@ class MapperBase:
 
         return instance
 
+    def prepare_batch(self, entries: list):
+        """Hook called by `process_batch` before mapping the entries, e.g. to pre-load related objects"""
+
+    def process_batch(self, entries: list, offset: int = None) -> List[models.Model]:
+        """Process a list of entries using bulk queries
+
+        :param entries:
+        :param offset: if given, map each entry in a savepoint and save the batch in a savepoint,
+            skipping the entries which fail with `skip_errors`, whose indexes start at `offset`;
+            if saving the batch fails, its entries are saved one by one, each in its own savepoint
+        :return: instances of the entries which were not skipped
+        """
+        started = time.perf_counter()
+        self.prepare_batch(entries)
+        if offset is None:
+            mapped = [self.map_entry(entry) for entry in entries]
+            self.timings['map'] += time.perf_counter() - started
+            return self.save_batch(mapped)
+
+        mapped = []
+        indexes = []
+        for i, entry in enumerate(entries, offset):
+            try:
+                with transaction.atomic():
+                    mapped.append(self.map_entry(entry))
+            except self.skip_errors as e:
+                self.rollback()
+                self.skip_entry(i, e)
+            else:
+                indexes.append(i)
+        self.timings['map'] += time.perf_counter() - started
+        try:
+            with transaction.atomic():
+                return self.save_batch(mapped)
+        except self.skip_errors as e:
+            self.rollback()
+            logger.debug(f"Saving batch starting at {offset} failed, saving its entries one by one: {e}")
+
+        result = []
+        for i, params in zip(indexes, mapped):
+            try:
+                with transaction.atomic():
+                    result.extend(self.save_batch([params]))
+            except self.skip_errors as e:
+                self.rollback()
+                self.skip_entry(i, e)
+        return result
+
+    def save_batch(self, mapped: list) -> List[models.Model]:
+        """Save a list of mapped entries (as returned by `map_entry`) using bulk queries
+
+        Existing rows are looked up with one query on `unique_fields`, new rows are inserted with `bulk_create`
+        and existing rows whose values differ are saved with `bulk_update`.
+        M2M relations of the whole batch are updated with `sync_m2m`, only the changed links are written.
+        If `fingerprint_field` is set, existing rows with the same fingerprint are neither updated nor
+            have their M2M relations synchronised; `stats` counts fingerprint hits and misses (new rows included).
+        Entries sharing the same unique values resolve to the same instance, the first of them wins.
+
+        :param mapped: list of (instance_params, unique_params, m2m_params)
+        :return: instances, one per entry
+        """
+        started = time.perf_counter()
+        instances = [None] * len(mapped)
+        positions = {}  # unique key -> indexes of entries in `mapped`
+        m2m_owners = []  # indexes of entries whose M2M relations must be synchronised
+        for i, (instance_params, unique_params, m2m_params) in enumerate(mapped):
+            if unique_params:
+                positions.setdefault(self._unique_key(unique_params), []).append(i)
+            else:
+                # there is no way to find a bulk-inserted row without unique values, insert it as usual
+                if self.fingerprint_field is not None:
+                    instance_params = dict(instance_params, **{self.fingerprint_field: self.fingerprint(mapped[i])})
+                    self.stats['fingerprint_misses'] += 1
+                instances[i] = self.model.objects.create(**instance_params)
+                m2m_owners.append(i)
+
+        existing = self._fetch_existing(positions)
+        to_create = {}
+        to_update = []
+        update_fields = set()
+        for key, indexes in positions.items():
+            instance_params, unique_params, _ = mapped[indexes[0]]
+            if self.fingerprint_field is not None:
+                fingerprint = self.fingerprint(mapped[indexes[0]])
+                instance_params = dict(instance_params, **{self.fingerprint_field: fingerprint})
+            try:
+                instance = existing[key]
+            except KeyError:
+                instance = to_create[key] = self.model(**instance_params, **unique_params)
+                m2m_owners.append(indexes[0])
+                if self.fingerprint_field is not None:
+                    self.stats['fingerprint_misses'] += 1
+            else:
+                if self.fingerprint_field is not None:
+                    if getattr(instance, self.fingerprint_field) == fingerprint:
+                        self.stats['fingerprint_hits'] += 1
+                        for i in indexes:
+                            instances[i] = instance
+                        continue
+                    self.stats['fingerprint_misses'] += 1
+                changed = self._update_instance(instance, instance_params)
+                if changed:
+                    to_update.append(instance)
+                    update_fields.update(changed)
+                m2m_owners.append(indexes[0])
+            for i in indexes:
+                instances[i] = instance
+
+        if to_create:
+            self.model.objects.bulk_create(to_create.values())
+            if any(instance.pk is None for instance in to_create.values()):
+                # the backend does not return primary keys from bulk inserts (e.g. SQLite), fetch the rows back
+                created = self._fetch_existing(to_create)
+                if len(created) < len(to_create):
+                    raise DatabaseError(f"{len(to_create) - len(created)} rows of {self.model.__name__} "
+                                        f"not found after inserting them")
+                for key, instance in created.items():
+                    for i in positions[key]:
+                        instances[i] = instance
+
+        if to_update:
+            update_fields = sorted(update_fields)
+            try:
+                bulk_update = self.model.objects.bulk_update
+            except AttributeError:  # Django < 2.2
+                for instance in to_update:
+                    instance.save(update_fields=update_fields)
+            else:
+                bulk_update(to_update, update_fields)
+
+        m2m_started = time.perf_counter()
+        self.timings['write'] += m2m_started - started
+        m2m_values = {}  # field name -> {instance: related objects}
+        for i in m2m_owners:
+            for field_name, values in mapped[i][2].items():
+                m2m_values.setdefault(field_name, {})[instances[i]] = values
+        for field_name, values in m2m_values.items():
+            sync_m2m(self.model_fields[field_name], values)
+        self.timings['m2m'] += time.perf_counter() - m2m_started
+
+        return instances
+
+    def fingerprint(self, params: tuple) -> str:
+        """Compute a stable hash of mapped values
+
+        :param params: (instance_params, unique_params, m2m_params), as returned by `map_entry`
+        :return: hex digest
+        """
+        values = sorted(
+            (field_name, self._fingerprint_value(value))
+            for bucket in params
+            for field_name, value in bucket.items()
+        )
+        return hashlib.sha1(repr(values).encode()).hexdigest()
+
+    @classmethod
+    def _fingerprint_value(cls, value: Any):
+        if isinstance(value, models.Model):
+            return value.pk
+        if isinstance(value, datetime) and value.tzinfo is not None:
+            return value.astimezone(timezone.utc).isoformat()
+        if isinstance(value, (list, tuple, set, frozenset)):
+            # M2M relations are not ordered
+            return sorted(repr(cls._fingerprint_value(item)) for item in value)
+        return value
+
+    def _unique_key(self, params: dict) -> tuple:
+        """Build a hashable key from unique field values, as they are stored in the database"""
+        key = []
+        for field_name, value in sorted(params.items()):
+            field = self.model_fields[field_name]
+            key.append((field.attname, self._db_value(field, value)))
+        return tuple(key)
+
+    @staticmethod
+    def _db_value(field: models.Field, value: Any) -> Any:
+        """Convert a mapped value to the Python value of the field, as read back from the database
+
+        So that e.g. an int mapped to a CharField compares equal to the string of an existing row.
+        """
+        if isinstance(value, models.Model):
+            value = value.pk
+        return field.to_python(value)
+
+    def _fetch_existing(self, keys: Iterable[tuple]) -> dict:
+        """Find existing rows by unique keys in one query
+
+        :return: dict of unique key -> instance
+        """
+        keys = list(keys)
+        if not keys:
+            return {}
+        key_fields = {tuple(attname for attname, _ in key) for key in keys}
+        if len(key_fields) == 1 and len(keys[0]) == 1:
+            attname = keys[0][0][0]
+            queryset = self.model.objects.filter(**{f'{attname}__in': [key[0][1] for key in keys]})
+        else:
+            condition = models.Q()
+            for key in keys:
+                condition |= models.Q(**dict(key))
+            queryset = self.model.objects.filter(condition)
+
+        keys = set(keys)
+        fields = {attname: self.model._meta.get_field(attname) for attnames in key_fields for attname in attnames}
+        existing = {}
+        for instance in queryset:
+            for attnames in key_fields:
+                key = tuple(
+                    (attname, self._db_value(fields[attname], getattr(instance, attname))) for attname in attnames
+                )
+                if key in keys:
+                    existing[key] = instance
+        return existing
+
+    def _update_instance(self, instance: models.Model, params: dict) -> List[str]:
+        """Set changed values on an existing instance
+
+        :return: names of changed fields
+        """
+        changed = []
+        for field_name, value in params.items():
+            field = self.model._meta.get_field(field_name)
+            if getattr(instance, field.attname) != self._db_value(field, value):
+                setattr(instance, field_name, value)
+                changed.append(field_name)
+        return changed
+
     def process(self, data: Iterable) -> List[models.Model]:
-        """Process an iterable of entries"""
+        """Process an iterable of entries
+
+        If `batch_size` is set, entries are saved in batches with `process_batch`, otherwise one by one.
+
+        If `atomic_chunk_size` is set, every chunk of that many entries is committed in one transaction,
+            and every entry is processed in a savepoint: entries failing with `skip_errors` are rolled back,
+            recorded in `errors` and skipped, while the rest of the chunk is committed.
+            Time spent on each chunk is recorded in `chunk_timings`.
+
+        If an error propagates, `rollback` is called, as the caller's transaction is expected to be rolled back.
+        """
+        self.errors = []
+        self.chunk_timings = []
+        try:
+            if not self.atomic_chunk_size:
+                return self._process_entries(data)
+            return self._process_chunks(data)
+        except Exception:
+            self.rollback()
+            raise
+
+    def _process_chunks(self, data: Iterable) -> List[models.Model]:
+        """Process entries committing every `atomic_chunk_size` of them in one transaction"""
+        result = []
+        offset = 0
+        for chunk in chunked(data, self.atomic_chunk_size):
+            started = time.perf_counter()
+            with transaction.atomic():
+                result.extend(self._process_entries(chunk, offset))
+            elapsed = time.perf_counter() - started
+            self.chunk_timings.append(elapsed)
+            logger.debug(f"Committed chunk of {len(chunk)} entries starting at {offset} in {elapsed:.4f}s")
+            offset += len(chunk)
+        return result
+
+    def _process_entries(self, data: Iterable, offset: int = None) -> List[models.Model]:
+        """Process entries in batches or one by one; with `offset`, skip failing entries as in `process_batch`"""
         result = []
-        for i, entry in enumerate(data):
+        if self.batch_size:
+            start = offset or 0
+            for batch in chunked(data, self.batch_size):
+                logger.debug(f"Processing batch of {len(batch)} entries starting at {start}")
+                result.extend(self.process_batch(batch, offset=None if offset is None else start))
+                start += len(batch)
+            return result
+
+        for i, entry in enumerate(data, offset or 0):
             logger.debug(f"Processing entry {i}")
-            instance = self.process_entry(entry)
+            if offset is None:
+                instance = self.process_entry(entry)
+            else:
+                try:
+                    with transaction.atomic():
+                        instance = self.process_entry(entry)
+                except self.skip_errors as e:
+                    self.rollback()
+                    self.skip_entry(i, e)
+                    continue
             result.append(instance)
         return result
 
+    def rollback(self):
+        """Hook called after a transaction or a savepoint of `process` was rolled back, e.g. to drop cached objects"""
+
+    def skip_entry(self, index: int, error: Exception):
+        """Record an entry skipped because of an error"""
+        logger.warning(f"Skipping entry {index}: {error}")
+        self.errors.append((index, error))
+        self.stats['skipped'] += 1
+
     def process_string(self, text) -> List[models.Model]:
         """Abstract method: process a data string
 
@@ -0,0 +1,99 @@
+import logging
+from collections import OrderedDict
+from functools import partial
+from typing import Any, Hashable, Iterable, Type
+
+from django.db import DEFAULT_DB_ALIAS, models, transaction
+
+logger = logging.getLogger(__name__)
+
+
+class RelatedObjectCache:
+    """
+    A bounded LRU cache of related objects, keyed by (model, natural key).
+
+    Mappers resolve related objects (like authors or categories) through `get_or_create`,
+        which only hits the database on a cache miss, and may pre-warm the cache with one query per batch
+        using `warm`. A single cache can be shared by mappers and across `process_string` calls.
+
+    A missed lookup falls back to the database and the cache never stores negative results,
+        so rows created by someone else are picked up on the next miss.
+        Use `invalidate` to drop entries whose rows were deleted or changed.
+
+    Objects cached inside a transaction are tracked until it commits: if it is rolled back, their rows may be gone,
+        and `rollback` drops them, so that the next lookup misses and goes to the database again.
+    """
+
+    def __init__(self, maxsize: int = 1024, using: str = DEFAULT_DB_ALIAS):
+        self.maxsize = maxsize
+        self.using = using
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._uncommitted = set()  # keys cached inside a transaction which is not committed yet
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, item):
+        return item in self._data
+
+    def get(self, model: Type[models.Model], key: Hashable, default: Any = None):
+        try:
+            obj = self._data[model, key]
+        except KeyError:
+            self.misses += 1
+            return default
+        self._data.move_to_end((model, key))
+        self.hits += 1
+        return obj
+
+    def set(self, model: Type[models.Model], key: Hashable, obj: models.Model):
+        self._data[model, key] = obj
+        self._data.move_to_end((model, key))
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+        if transaction.get_connection(self.using).in_atomic_block:
+            self._uncommitted.add((model, key))
+            transaction.on_commit(partial(self._uncommitted.discard, (model, key)), using=self.using)
+
+    def invalidate(self, model: Type[models.Model] = None, key: Hashable = None):
+        """Drop a single key, all keys of a model, or everything"""
+        if model is None:
+            self._data.clear()
+        elif key is None:
+            for cache_key in [cache_key for cache_key in self._data if cache_key[0] is model]:
+                del self._data[cache_key]
+        else:
+            self._data.pop((model, key), None)
+
+    def rollback(self):
+        """Drop the objects cached inside a transaction which was (or may have been) rolled back
+
+        Called by mappers when a transaction or a savepoint they entered fails.
+            Objects cached since the last commit are dropped, even if the rollback did not affect them.
+        """
+        for cache_key in self._uncommitted:
+            self._data.pop(cache_key, None)
+        self._uncommitted.clear()
+
+    def warm(self, model: Type[models.Model], field_name: str, keys: Iterable[Hashable]):
+        """Load objects for the keys which are not cached yet, in one query
+
+        Only the most recently used `maxsize` keys are kept.
+        """
+        missing = {key for key in keys if (model, key) not in self._data}
+        if not missing:
+            return
+        for obj in model.objects.filter(**{f'{field_name}__in': missing}):
+            self.set(model, getattr(obj, field_name), obj)
+
+    def get_or_create(self, model: Type[models.Model], field_name: str, key: Hashable) -> models.Model:
+        """Get an object from the cache, or from the database, creating it if necessary"""
+        obj = self.get(model, key)
+        if obj is None:
+            obj, created = model.objects.get_or_create(**{field_name: key})
+            if created:
+                logger.debug("Created %s '%s'", model._meta.verbose_name, key)
+            self.set(model, key, obj)
+        return obj
@@ -0,0 +1,108 @@
+"""
+Parsing of feed dates: RFC 822 (RSS) and RFC 3339 (Atom, JSON sources).
+
+Feeds repeat the same timestamps on every poll, so results are memoized.
+"""
+import re
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+
+MONTHS = {
+    month: number
+    for number, month in enumerate(['jan', 'feb', 'mar', 'apr', 'may', 'jun',
+                                    'jul', 'aug', 'sep', 'oct', 'nov', 'dec'], 1)
+}
+
+# Named zones allowed by RFC 822, in hours
+ZONES = {
+    'ut': 0, 'utc': 0, 'gmt': 0, 'z': 0,
+    'est': -5, 'edt': -4,
+    'cst': -6, 'cdt': -5,
+    'mst': -7, 'mdt': -6,
+    'pst': -8, 'pdt': -7,
+}
+
+RFC822_RE = re.compile(
+    r'\s*(?:[a-z]+,?\s*)?'  # day of week
+    r'(?P<day>\d{1,2})\s+(?P<month>[a-z]{3})[a-z]*\.?\s+(?P<year>\d{2}|\d{4})\s+'
+    r'(?P<hour>\d{1,2}):(?P<minute>\d{2})(?::(?P<second>\d{2}))?'
+    r'(?:\s*(?P<offset>[+-]\d{2}:?\d{2})|\s+(?P<zone>[a-z]+))?\s*$',
+    re.IGNORECASE,
+)
+
+RFC3339_RE = re.compile(
+    r'\s*(?P<year>\d{4})-(?P<month>\d{2})-(?P<day>\d{2})'
+    r'(?:[t ](?P<hour>\d{2}):(?P<minute>\d{2})(?::(?P<second>\d{2})(?:\.(?P<fraction>\d+))?)?'
+    r'(?:(?P<offset>[+-]\d{2}:?\d{2})|(?P<zone>z))?)?\s*$',
+    re.IGNORECASE,
+)
+
+DATE_CACHE_SIZE = 1024
+
+
+def _offset(offset: str) -> timezone:
+    sign = -1 if offset[0] == '-' else 1
+    offset = offset[1:].replace(':', '')
+    minutes = int(offset[:2]) * 60 + int(offset[2:])
+    return timezone.utc if minutes == 0 else timezone(timedelta(minutes=sign * minutes))
+
+
+def _zone(zone: str) -> timezone:
+    try:
+        hours = ZONES[zone.lower()]
+    except KeyError:
+        raise ValueError(f"Unknown time zone '{zone}'")
+    return timezone.utc if hours == 0 else timezone(timedelta(hours=hours))
+
+
+def _tzinfo(match) -> timezone:
+    if match.group('offset'):
+        return _offset(match.group('offset'))
+    if match.group('zone'):
+        return _zone(match.group('zone'))
+    # RFC 822 and RFC 3339 both treat a time without a zone as UTC, with no local offset known
+    return timezone.utc
+
+
+def parse_rfc822(value: str) -> datetime:
+    """Parse an RFC 822 date, like `Mon, 21 May 2018 21:58:52 +0300` or `21 May 18 18:58 GMT`"""
+    match = RFC822_RE.match(value)
+    if match is None:
+        raise ValueError(f"Not an RFC 822 date: '{value}'")
+    try:
+        month = MONTHS[match.group('month').lower()]
+    except KeyError:
+        raise ValueError(f"Unknown month in date '{value}'")
+    year = int(match.group('year'))
+    if len(match.group('year')) == 2:
+        year += 2000 if year < 50 else 1900
+    return datetime(
+        year, month, int(match.group('day')),
+        int(match.group('hour')), int(match.group('minute')), int(match.group('second') or 0),
+        tzinfo=_tzinfo(match),
+    )
+
+
+def parse_rfc3339(value: str) -> datetime:
+    """Parse an RFC 3339 date, like `2018-05-21T21:58:52.123+03:00` or `2018-05-21T18:58:52Z`"""
+    match = RFC3339_RE.match(value)
+    if match is None:
+        raise ValueError(f"Not an RFC 3339 date: '{value}'")
+    fraction = match.group('fraction') or '0'
+    return datetime(
+        int(match.group('year')), int(match.group('month')), int(match.group('day')),
+        int(match.group('hour') or 0), int(match.group('minute') or 0), int(match.group('second') or 0),
+        int(fraction[:6].ljust(6, '0')),
+        tzinfo=_tzinfo(match) if match.group('hour') else timezone.utc,
+    )
+
+
+@lru_cache(maxsize=DATE_CACHE_SIZE)
+def parse_date(value: str) -> datetime:
+    """Parse an RFC 822 or RFC 3339 date into an aware datetime
+
+    :raise ValueError: if the date is in neither format
+    """
+    if value[:4].isdigit():
+        return parse_rfc3339(value)
+    return parse_rfc822(value)
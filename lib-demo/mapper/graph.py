@@ -0,0 +1,176 @@
+import logging
+import time
+from typing import Any, Callable, Iterable, List
+
+from django.db import models, transaction
+
+from mapper.base import MapperBase, chunked
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 100
+
+
+class Relation:
+    """
+    A relation of a parent mapper's FK or M2M field to the mapper of the related model.
+
+    `extract(data)` returns the related record (a dict for the child mapper) of a parent's record for an FK,
+        or a list of related records for an M2M field; None means no related object, Ellipsis omits the field.
+    """
+
+    def __init__(self, parent: MapperBase, field_name: str, child: MapperBase,
+                 extract: Callable[[Any], Any] = None):
+        try:
+            field = parent.model_fields[field_name]
+        except KeyError:
+            raise TypeError(f"Unknown field '{field_name}' of {parent.model.__name__}")
+        if not (field.many_to_one or field.one_to_one or field.many_to_many) or field.related_model is not child.model:
+            raise TypeError(f"Field '{field_name}' of {parent.model.__name__} is not a relation "
+                            f"to {child.model.__name__}")
+        self.parent = parent
+        self.field_name = field_name
+        self.child = child
+        self.many = field.many_to_many
+        self.extract = extract or (lambda data: data.get(field_name))
+
+
+class Ref:
+    """A placeholder for a related instance: index of the record among the child mapper's records of a batch"""
+    __slots__ = 'index',
+
+    def __init__(self, index: int):
+        self.index = index
+
+
+class GraphImporter:
+    """
+    Import interdependent models (e.g. event - date - place) for a whole batch of entries at once.
+
+    Entries are mapped by the root mapper; related records are extracted by `Relation`s
+        and mapped by their mappers, recursively. Then models are saved in topological order, leaves first,
+        each with one `save_batch` call for the whole batch: related records are bulk-resolved by unique fields,
+        parents are bulk-upserted with the resolved instances, and M2M links are bulk-synchronised.
+        So the number of queries depends on the number of models, not on the number of entries.
+
+    Transforms of relation fields are not used, relations are resolved by the child mappers instead.
+    Time spent mapping and saving the records of each model is added to the `timings` of its mapper.
+    """
+
+    def __init__(self, root: MapperBase, relations: Iterable[Relation], batch_size: int = None):
+        self.root = root
+        self.batch_size = batch_size or root.batch_size or DEFAULT_BATCH_SIZE
+        self.relations = {}  # mapper -> {field name: relation}
+        for relation in relations:
+            self.relations.setdefault(relation.parent, {})[relation.field_name] = relation
+        self.order = self._sort()
+        self.plans = {mapper: self._compile_plan(mapper) for mapper in self.order}
+
+    def _sort(self) -> List[MapperBase]:
+        """Sort mappers topologically, parents first"""
+        children = {}
+        for mapper in self._mappers():
+            children[mapper] = {relation.child for relation in self.relations.get(mapper, {}).values()}
+        incoming = {mapper: 0 for mapper in children}
+        for mapper_children in children.values():
+            for child in mapper_children:
+                incoming[child] += 1
+        ready = [mapper for mapper, count in incoming.items() if count == 0]
+        if ready != [self.root]:
+            raise TypeError("All mappers must be reachable from the root mapper, which must not be related to")
+        order = []
+        while ready:
+            mapper = ready.pop()
+            order.append(mapper)
+            for child in children[mapper]:
+                incoming[child] -= 1
+                if incoming[child] == 0:
+                    ready.append(child)
+        if len(order) != len(children):
+            raise TypeError("Relations of the mappers form a cycle")
+        return order
+
+    def _mappers(self) -> List[MapperBase]:
+        mappers = [self.root]
+        for mapper_relations in self.relations.values():
+            for relation in mapper_relations.values():
+                for mapper in (relation.parent, relation.child):
+                    if mapper not in mappers:
+                        mappers.append(mapper)
+        return mappers
+
+    def _compile_plan(self, mapper: MapperBase) -> tuple:
+        """Replace the extractors of relation fields with the relations' `extract`"""
+        relations = self.relations.get(mapper, {})
+        return tuple(
+            (field_name, field,
+             self._extractor(relations[field_name]) if field_name in relations else extractor,
+             bucket)
+            for field_name, field, extractor, bucket in mapper.field_plan
+        )
+
+    @staticmethod
+    def _extractor(relation: Relation) -> Callable:
+        extract = relation.extract
+        return lambda data, field: extract(data)
+
+    def process(self, data: Iterable) -> List[models.Model]:
+        """Process an iterable of entries, in batches of `batch_size`, each batch in a transaction"""
+        result = []
+        for batch in chunked(data, self.batch_size):
+            with transaction.atomic():
+                result.extend(self.process_batch(batch))
+        return result
+
+    def process_batch(self, entries: list) -> List[models.Model]:
+        records = {mapper: [] for mapper in self.order}  # mapper -> records to map
+        records[self.root] = entries
+        mapped = {}  # mapper -> mapped records
+
+        # map parents first, collecting the records of related models
+        for mapper in self.order:
+            started = time.perf_counter()
+            mapper.prepare_batch(records[mapper])
+            plan = self.plans[mapper]
+            mapped[mapper] = [mapper.map_entry(record, plan) for record in records[mapper]]
+            mapper.timings['map'] += time.perf_counter() - started
+            for field_name, relation in self.relations.get(mapper, {}).items():
+                child_records = records[relation.child]
+                for params in mapped[mapper]:
+                    for bucket in params:
+                        if field_name in bucket:
+                            bucket[field_name] = self._register(bucket[field_name], relation, child_records)
+
+        # save leaves first, replacing placeholders with the saved related instances
+        instances = {}
+        for mapper in reversed(self.order):
+            for field_name, relation in self.relations.get(mapper, {}).items():
+                child_instances = instances[relation.child]
+                for params in mapped[mapper]:
+                    for bucket in params:
+                        if field_name in bucket:
+                            bucket[field_name] = self._resolve(bucket[field_name], child_instances)
+            instances[mapper] = mapper.save_batch(mapped[mapper])
+            logger.debug(f"Saved {len(instances[mapper])} records of {mapper.model.__name__}")
+        return instances[self.root]
+
+    @staticmethod
+    def _register(value, relation: Relation, child_records: list):
+        if relation.many:
+            refs = []
+            for record in value or ():
+                refs.append(Ref(len(child_records)))
+                child_records.append(record)
+            return refs
+        if value is None:
+            return None
+        child_records.append(value)
+        return Ref(len(child_records) - 1)
+
+    @staticmethod
+    def _resolve(value, child_instances: list):
+        if isinstance(value, Ref):
+            return child_instances[value.index]
+        if isinstance(value, list):
+            return [child_instances[ref.index] for ref in value]
+        return value
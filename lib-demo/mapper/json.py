@@ -0,0 +1,206 @@
+import asyncio
+import codecs
+import json
+import logging
+import re
+from concurrent.futures import Executor
+from typing import AsyncIterable, Iterable, Iterator, List, Union
+
+from django.db import models
+
+from mapper.base import MapperBase
+from mapper.parsers import iter_chunks
+
+logger = logging.getLogger(__name__)
+
+WHITESPACE = re.compile(r'[ \t\n\r]*')
+# characters which may follow a complete number or literal
+DELIMITERS = frozenset(',]} \t\n\r')
+
+# States of `JSONArrayStream`
+EXPECT_VALUE = 'value'
+EXPECT_KEY = 'key'
+EXPECT_COLON = 'colon'
+SKIP_VALUE = 'skip'
+IN_ARRAY = 'array'
+DONE = 'done'
+
+
+class JSONArrayStream:
+    """
+    An incremental parser of the records of an array inside a JSON document.
+
+    Push chunks of the document with `push` and get the records which are complete, e.g. for the path
+        `data.items` and the document `{"meta": {...}, "data": {"items": [{...}, {...}]}}`,
+        the two objects in `items`. Values outside of the path are decoded and dropped one by one,
+        only the current record is kept in memory.
+    """
+
+    def __init__(self, path: str = ''):
+        """
+        :param path: dot-separated keys leading to the array, empty for a top-level array
+        """
+        self.path = [key for key in path.split('.') if key]
+        self._decoder = json.JSONDecoder()
+        self._text_decoder = codecs.getincrementaldecoder('utf-8')()
+        self._buffer = ''
+        self._state = EXPECT_VALUE
+        self._depth = 0  # number of keys of the path found so far
+        self._key = None
+
+    def push(self, data: Union[bytes, str]) -> List:
+        if isinstance(data, bytes):
+            data = self._text_decoder.decode(data)
+        self._buffer += data
+        return self._parse(eof=False)
+
+    def close(self) -> List:
+        self._buffer += self._text_decoder.decode(b'', final=True)
+        records = self._parse(eof=True)
+        if self._state != DONE:
+            raise ValueError(f"Unexpected end of document, array at '{'.'.join(self.path)}' not complete")
+        return records
+
+    def _decode(self, pos: int, eof: bool):
+        """Decode a value starting at `pos`, return (value, end), or None if more data is needed"""
+        try:
+            value, end = self._decoder.raw_decode(self._buffer, pos)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            return None
+        if not eof and not isinstance(value, (dict, list, str)) and (
+                end == len(self._buffer) or self._buffer[end] not in DELIMITERS):
+            # a number or a literal may continue in the next chunk, e.g. `1` of `1.5e10`
+            return None
+        return value, end
+
+    def _parse(self, eof: bool) -> List:
+        records = []
+        buffer = self._buffer
+        pos = 0
+        while True:
+            pos = WHITESPACE.match(buffer, pos).end()
+            if pos >= len(buffer) or self._state == DONE:
+                break
+            char = buffer[pos]
+            if self._state == EXPECT_VALUE:
+                if self._depth == len(self.path):
+                    if char != '[':
+                        raise ValueError(f"Expected an array at '{'.'.join(self.path)}'")
+                    self._state = IN_ARRAY
+                else:
+                    if char != '{':
+                        raise ValueError(f"Expected an object at '{'.'.join(self.path[:self._depth])}'")
+                    self._state = EXPECT_KEY
+                pos += 1
+            elif self._state == EXPECT_KEY:
+                if char == ',':
+                    pos += 1
+                    continue
+                if char == '}':
+                    raise ValueError(f"Key '{'.'.join(self.path[:self._depth + 1])}' not found")
+                decoded = self._decode(pos, eof)
+                if decoded is None:
+                    break
+                self._key, pos = decoded
+                self._state = EXPECT_COLON
+            elif self._state == EXPECT_COLON:
+                if char != ':':
+                    raise ValueError(f"Expected ':' after key '{self._key}'")
+                pos += 1
+                if self._key == self.path[self._depth]:
+                    self._depth += 1
+                    self._state = EXPECT_VALUE
+                else:
+                    self._state = SKIP_VALUE
+            elif self._state == SKIP_VALUE:
+                decoded = self._decode(pos, eof)
+                if decoded is None:
+                    break
+                _, pos = decoded
+                self._state = EXPECT_KEY
+            elif self._state == IN_ARRAY:
+                if char == ',':
+                    pos += 1
+                    continue
+                if char == ']':
+                    pos += 1
+                    self._state = DONE
+                    continue
+                decoded = self._decode(pos, eof)
+                if decoded is None:
+                    break
+                record, pos = decoded
+                records.append(record)
+        # the rest of the document after the array is ignored
+        self._buffer = '' if self._state == DONE else buffer[pos:]
+        return records
+
+
+def iter_json_records(source: Union[str, bytes, Iterable[bytes]], path: str = '') -> Iterator:
+    """Iterate over the records of an array at `path` in a JSON document, see `JSONArrayStream`
+
+    :param source: see `mapper.parsers.iter_chunks`
+    :param path:
+    """
+    stream = JSONArrayStream(path)
+    for chunk in iter_chunks(source):
+        yield from stream.push(chunk)
+    yield from stream.close()
+
+
+class JSONMapper(MapperBase):
+    """
+    A mapper of JSON records.
+
+    Records are read from the array at `records_path` incrementally and are processed
+        as soon as they are parsed, so the whole document is never loaded into memory.
+        Fields are mapped from the records' keys with `get_value` and `transform_FIELD` methods, as usual.
+    """
+    records_path = ''  # type: str  # dot-separated keys leading to the array of records, empty for a top-level array
+
+    def iter_records(self, source: Union[str, bytes, Iterable[bytes]]) -> Iterator:
+        return iter_json_records(source, self.records_path)
+
+    def process_string(self, text) -> List[models.Model]:
+        """Process a JSON document
+
+        :param text: a string, bytes, a binary file-like object or an iterable of bytes chunks
+        :return: entries processed
+        """
+        return self.process(self.iter_records(text))
+
+    async def process_stream(self, chunks: AsyncIterable[bytes], executor: Executor = None) -> List[models.Model]:
+        """Process a JSON document from an async iterable of bytes chunks, e.g. `response.content.iter_chunked()`
+
+        The records are processed by a single `process` call in a thread of `executor` (the default executor
+            of the loop if None), which reads them from the event loop as it needs them. So batches, transaction
+            chunks, entry indexes and `errors` span the whole document, as with `process_string`,
+            and the event loop is not blocked by database queries.
+            The thread uses its own database connection, which is left open.
+
+        :return: entries processed
+        """
+        loop = asyncio.get_event_loop()
+        stream = JSONArrayStream(self.records_path)
+        iterator = chunks.__aiter__()
+
+        async def read_records() -> tuple:
+            """Read chunks until some records are complete, return (records, whether the document is over)"""
+            while True:
+                try:
+                    chunk = await iterator.__anext__()
+                except StopAsyncIteration:
+                    return stream.close(), True
+                records = stream.push(chunk)
+                if records:
+                    return records, False
+
+        def iter_records() -> Iterator:
+            done = False
+            while not done:
+                records, done = asyncio.run_coroutine_threadsafe(read_records(), loop).result()
+                yield from records
+
+        return await loop.run_in_executor(executor, self.process, iter_records())
@@ -0,0 +1,270 @@
+import logging
+from collections import namedtuple
+from typing import Iterable, Iterator, List, Type, Union
+from xml.etree import ElementTree
+from xml.etree.ElementTree import Element, XMLPullParser
+
+import feedparser
+
+try:
+    from lxml import etree as lxml_etree
+except ImportError:
+    lxml_etree = None
+
+logger = logging.getLogger(__name__)
+
+ParsedFeed = namedtuple('ParsedFeed', 'feed entries')
+
+CHUNK_SIZE = 65536
+
+DC_NAMESPACE = '{http://purl.org/dc/elements/1.1/}'
+
+# RSS 2.0 element -> entry keys, including the aliases provided by feedparser
+ITEM_ELEMENTS = {
+    'title': ('title',),
+    'description': ('description', 'summary'),
+    'link': ('link',),
+    'guid': ('guid', 'id'),
+    'pubDate': ('published',),
+    'author': ('author',),
+    DC_NAMESPACE + 'creator': ('author',),
+    'comments': ('comments',),
+}
+# Keys of entries produced by every backend, kept by `compact_entry`
+ENTRY_KEYS = {key for keys in ITEM_ELEMENTS.values() for key in keys} | {'guidislink', 'tags'}
+
+CHANNEL_ELEMENTS = {
+    'title': ('title',),
+    'description': ('description', 'subtitle'),
+    'link': ('link',),
+    'pubDate': ('published',),
+    'lastBuildDate': ('updated',),
+}
+CHANNEL_KEYS = {key for keys in CHANNEL_ELEMENTS.values() for key in keys}
+
+
+class Entry(dict):
+    """A parsed feed entry (or channel), with attribute access to keys like feedparser's `FeedParserDict`"""
+
+    def __getattr__(self, name):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name)
+
+
+def item_entry(element: Element) -> Entry:
+    """Convert an `<item>` element to an entry in the shape produced by feedparser"""
+    entry = Entry()
+    tags = []
+    guid_is_link = False
+    for child in element:
+        if child.tag == 'category':
+            tags.append({'term': (child.text or '').strip(), 'scheme': child.get('domain'), 'label': None})
+            continue
+        if child.tag == 'guid':
+            # like feedparser, a permalink GUID is the link, unless a link precedes it
+            guid_is_link = child.get('isPermaLink', 'true').lower() == 'true' and 'link' not in entry
+        try:
+            keys = ITEM_ELEMENTS[child.tag]
+        except KeyError:
+            continue
+        text = (child.text or '').strip()
+        for key in keys:
+            entry[key] = text
+    if tags:
+        entry['tags'] = tags
+    if 'guid' in entry:
+        entry['guidislink'] = guid_is_link
+        if guid_is_link and 'link' not in entry:
+            entry['link'] = entry['guid']
+    return entry
+
+
+def channel_feed(element: Element) -> Entry:
+    """Collect the elements of a `<channel>` element, except items"""
+    feed = Entry()
+    for child in element:
+        for key in CHANNEL_ELEMENTS.get(child.tag, ()):
+            feed[key] = (child.text or '').strip()
+    return feed
+
+
+def iter_chunks(source: Union[str, bytes, Iterable[bytes]], chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    """Iterate over a document as chunks of bytes
+
+    :param source: a string, bytes, a binary file-like object or an iterable of bytes
+    """
+    if isinstance(source, str):
+        source = source.encode()
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        for start in range(0, len(source), chunk_size):
+            yield source[start:start + chunk_size]
+    elif hasattr(source, 'read'):
+        for chunk in iter(lambda: source.read(chunk_size), b''):
+            yield chunk
+    else:
+        yield from source
+
+
+class StreamingRSSParser:
+    """
+    An incremental RSS 2.0 parser.
+
+    Push chunks of a document with `push` and get the entries whose `<item>` elements are complete.
+        Elements of the channel are collected into `feed`. Items are dropped from the document tree
+        as soon as they are converted, so memory usage does not depend on the number of items.
+    """
+
+    def __init__(self):
+        self.feed = Entry()
+        self._parser = XMLPullParser(events=('start', 'end'))
+        self._stack = []  # open elements
+
+    def push(self, data: bytes) -> List[Entry]:
+        self._parser.feed(data)
+        return self._read_events()
+
+    def close(self) -> List[Entry]:
+        self._parser.close()
+        return self._read_events()
+
+    def _read_events(self) -> List[Entry]:
+        entries = []
+        stack = self._stack
+        for event, element in self._parser.read_events():
+            if event == 'start':
+                stack.append(element)
+                continue
+            stack.pop()
+            depth = len(stack)
+            if element.tag == 'item' and depth == 2:
+                entries.append(item_entry(element))
+                stack[-1].remove(element)
+            elif depth == 2 and stack[-1].tag == 'channel':
+                for key in CHANNEL_ELEMENTS.get(element.tag, ()):
+                    self.feed[key] = (element.text or '').strip()
+                stack[-1].remove(element)
+        return entries
+
+
+def stream_feed(source: Union[str, bytes, Iterable[bytes]]) -> ParsedFeed:
+    """Parse a feed incrementally
+
+    The document is read up to the first item, so that the channel elements preceding the items
+        are available in `feed`; entries are parsed lazily while iterating over `entries`.
+
+    :param source: see `iter_chunks`
+    :return: (feed, entries)
+    """
+    parser = StreamingRSSParser()
+    chunks = iter_chunks(source)
+    pending = []
+    for chunk in chunks:
+        pending = parser.push(chunk)
+        if pending:
+            break
+    else:
+        pending = parser.close()
+        chunks = None
+
+    def entries():
+        yield from pending
+        if chunks is not None:
+            for chunk in chunks:
+                yield from parser.push(chunk)
+            yield from parser.close()
+
+    return ParsedFeed(parser.feed, entries())
+
+
+class ParserBackend:
+    """
+    A feed parser backend.
+
+    `parse` returns an object with `feed` (channel elements) and `entries` (iterable of entries) attributes,
+        entries are mappings in the shape produced by feedparser, with attribute access to keys.
+    """
+    name = None  # type: str
+
+    def parse(self, source: Union[str, bytes, Iterable[bytes]]):
+        raise NotImplementedError("Please define the implementation in the subclass!")
+
+
+BACKENDS = {}
+
+
+def register_backend(backend_class: Type[ParserBackend]) -> Type[ParserBackend]:
+    """Register a parser backend under its `name`, can be used as a class decorator"""
+    BACKENDS[backend_class.name] = backend_class
+    return backend_class
+
+
+def get_backend(name: str) -> ParserBackend:
+    try:
+        backend_class = BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"Unknown parser backend '{name}'")
+    return backend_class()
+
+
+@register_backend
+class FeedParserBackend(ParserBackend):
+    """The universal feedparser: any RSS/Atom flavour, HTML sanitising, charset detection"""
+    name = 'feedparser'
+
+    def parse(self, source):
+        if not isinstance(source, (str, bytes)):
+            source = b''.join(iter_chunks(source))
+        if isinstance(source, str):
+            source = source.encode()
+        return feedparser.parse(source)
+
+
+@register_backend
+class StreamingBackend(ParserBackend):
+    """Incremental RSS 2.0 parsing with `stream_feed`, for very large feeds"""
+    name = 'stream'
+
+    def parse(self, source):
+        return stream_feed(source)
+
+
+@register_backend
+class FastBackend(ParserBackend):
+    """
+    A lean RSS 2.0 parser on top of lxml, or of the C ElementTree (expat) if lxml is not installed.
+
+    It only extracts the elements listed in `ITEM_ELEMENTS` and `CHANNEL_ELEMENTS`, as plain text:
+        unlike feedparser, it neither sanitises HTML nor guesses the charset of a document without declaration.
+    """
+    name = 'fast'
+
+    def parse(self, source):
+        if not isinstance(source, (str, bytes)):
+            source = b''.join(iter_chunks(source))
+        if isinstance(source, str):
+            source = source.encode()
+        if lxml_etree is not None:
+            parser = lxml_etree.XMLParser(resolve_entities=False, no_network=True, huge_tree=True)
+            root = lxml_etree.fromstring(source, parser)
+        else:
+            root = ElementTree.fromstring(source)
+        channel = root.find('channel')
+        if channel is None:
+            return ParsedFeed(Entry(), [])
+        return ParsedFeed(channel_feed(channel), [item_entry(item) for item in channel.iterfind('item')])
+
+
+def compact_entry(entry) -> Entry:
+    """Copy the keys listed in `ENTRY_KEYS` (or `CHANNEL_KEYS`) of an entry (channel) of any backend to an `Entry`"""
+    return Entry((key, entry[key]) for key in ENTRY_KEYS | CHANNEL_KEYS if key in entry)
+
+
+def parse_feed(source: Union[str, bytes, Iterable[bytes]], backend: str = 'feedparser') -> ParsedFeed:
+    """Parse a whole feed into compact, picklable entries, e.g. in a worker process
+
+    :return: (feed, list of entries)
+    """
+    parsed = get_backend(backend).parse(source)
+    return ParsedFeed(compact_entry(parsed.feed), [compact_entry(entry) for entry in parsed.entries])
@@ -0,0 +1,145 @@
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from types import CodeType, FrameType
+from typing import Hashable, Iterator, List
+
+from django.db import DEFAULT_DB_ALIAS, connections
+
+MAPPER_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+class QueryCounter:
+    """
+    Counts the SQL queries run through a database connection, by statement, while used as a context manager.
+
+    Statements are grouped by their SQL with placeholders, so an N+1 pattern shows up as one statement
+        run about as many times as there are entries. Queries must run in the thread that entered the context,
+        as Django connections are per-thread.
+
+        >>> with QueryCounter() as queries:
+        ...     mapper.process_string(text)
+        >>> queries.count, queries.most_common(3)
+    """
+
+    def __init__(self, using: str = DEFAULT_DB_ALIAS):
+        self.using = using
+        self.count = 0
+        self.duration = 0.0
+        self.statements = Counter()  # sql -> number of queries
+        self.durations = Counter()  # sql -> seconds
+        self._wrapper = None
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.count += 1
+            self.duration += elapsed
+            self.statements[sql] += 1
+            self.durations[sql] += elapsed
+
+    def __enter__(self):
+        self._wrapper = connections[self.using].execute_wrapper(self)
+        self._wrapper.__enter__()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._wrapper.__exit__(*exc_info)
+
+    def most_common(self, n: int = None) -> List[tuple]:
+        """[(sql, number of queries, seconds)], most frequent first"""
+        return [(sql, count, self.durations[sql]) for sql, count in self.statements.most_common(n)]
+
+
+def code_name(code: CodeType) -> str:
+    return f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})'
+
+
+class StackSampler:
+    """
+    A sampling profiler of a single thread, attributing samples to a `label` (e.g. the source being processed).
+
+    A daemon thread takes the stack of the target thread every `interval` seconds. Samples are counted
+        by collapsed stack (`label;outermost;...;innermost`, readable by flamegraph tools and speedscope)
+        and by the innermost frame within the mapper package (`process_entry`, `map_entry`, `transform_*`,
+        `get_value`...), which tells what mapper code the time goes to, including the queries it runs.
+        The overhead is one stack walk per interval while a `label` is set.
+    """
+
+    def __init__(self, thread_id: int = None, interval: float = 0.005):
+        self.thread_id = thread_id if thread_id is not None else threading.get_ident()
+        self.interval = interval
+        self.label = None  # type: Hashable
+        self.stacks = Counter()  # collapsed stack -> samples
+        self.hot_paths = Counter()  # (label, function) -> samples
+        self._codes = {}  # code -> (name, whether it belongs to the mapper package)
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            label = self.label
+            if label is None:
+                continue
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.sample(label, frame)
+
+    def sample(self, label: Hashable, frame: FrameType):
+        names = []
+        hot_path = None
+        while frame is not None:
+            code = frame.f_code
+            try:
+                name, in_mapper = self._codes[code]
+            except KeyError:
+                path = os.path.abspath(code.co_filename)
+                # the query counter of this module is not a mapper hot path
+                in_mapper = os.path.dirname(path) == MAPPER_DIR and path != os.path.abspath(__file__)
+                name, in_mapper = self._codes[code] = code_name(code), in_mapper
+            names.append(name)
+            if hot_path is None and in_mapper:
+                hot_path = code.co_name
+            frame = frame.f_back
+        names.append(str(label))
+        with self._lock:
+            self.stacks[';'.join(reversed(names))] += 1
+            if hot_path is not None:
+                self.hot_paths[label, hot_path] += 1
+
+    def flush(self) -> tuple:
+        """Return and reset (stacks, hot paths)"""
+        with self._lock:
+            stacks, self.stacks = self.stacks, Counter()
+            hot_paths, self.hot_paths = self.hot_paths, Counter()
+        return stacks, hot_paths
+
+    @staticmethod
+    def collapsed(stacks: Counter) -> Iterator[str]:
+        """Lines of the collapsed stack format: `frame;frame;frame samples`"""
+        for stack, count in sorted(stacks.items()):
+            yield f'{stack} {count}'
@@ -1,13 +1,15 @@
 import logging
 from datetime import datetime
-from typing import Type, List
+from typing import Iterable, Iterator, Type, List
 
-import feedparser
-from django.core.exceptions import ValidationError
-from django.db import models
+from django.db import models, transaction
 from django.conf import settings
 
 from mapper.base import MapperBase
+from mapper.cache import RelatedObjectCache
+from mapper.dates import parse_date
+from mapper.graph import GraphImporter, Relation
+from mapper.parsers import get_backend
 
 logger = logging.getLogger(__name__)
 
@@ -16,70 +18,179 @@ try:
 except AttributeError:
     RSS_DATE_FORMAT = "%a, %d %b %Y %H:%M:%S %z"
 
+PARSER_FEEDPARSER = 'feedparser'
+PARSER_STREAM = 'stream'
+PARSER_FAST = 'fast'
+
+
+class AuthorMapper(MapperBase):
+    unique_fields = ['name']
+
+
+class CategoryMapper(MapperBase):
+    unique_fields = ['title']
+
 
 class RSSMapper(MapperBase):
     author_model = None
     category_model = None
 
     unique_fields = ['guid']
+    batch_size = 100
+    parser = PARSER_FEEDPARSER  # type: str  # name of a backend registered in `mapper.parsers`, see `parse`
+    graph_import = False  # type: bool  # if set, batches are imported with authors and categories by `GraphImporter`
 
-    def __init__(self, model: Type[models.Model], author_model: Type[models.Model], category_model: Type[models.Model]):
+    def __init__(self, model: Type[models.Model], author_model: Type[models.Model], category_model: Type[models.Model],
+                 cache: RelatedObjectCache = None):
         super().__init__(model)
         self.author_model = author_model
         self.category_model = category_model
+        self.cache = RelatedObjectCache() if cache is None else cache
+        self._graph = None
+
+    @property
+    def graph(self) -> GraphImporter:
+        """Importer of items with their authors and categories, used if `graph_import` is set"""
+        if self._graph is None:
+            self._graph = GraphImporter(self, [
+                Relation(self, 'author', AuthorMapper(self.author_model),
+                         lambda data: {'name': data['author']} if data.get('author') else None),
+                Relation(self, 'categories', CategoryMapper(self.category_model),
+                         lambda data: [{'title': tag['term']} for tag in data.get('tags', ())]),
+            ])
+        return self._graph
+
+    def process_batch(self, entries: list, offset: int = None) -> List[models.Model]:
+        """Process a batch of entries, with `graph` if `graph_import` is set
+
+        A graph batch is imported in a transaction, or a savepoint in the transactional mode (see `process`):
+            if it fails with `skip_errors`, its entries are imported one by one, each in its own savepoint,
+            and the failing ones are skipped.
+        """
+        if not self.graph_import:
+            return super().process_batch(entries, offset)
+        try:
+            with transaction.atomic():
+                return self.graph.process_batch(entries)
+        except self.skip_errors as e:
+            if offset is None:
+                raise
+            self.rollback()
+            logger.debug(f"Importing batch starting at {offset} failed, importing its entries one by one: {e}")
+
+        result = []
+        for i, entry in enumerate(entries, offset):
+            try:
+                with transaction.atomic():
+                    result.extend(self.graph.process_batch([entry]))
+            except self.skip_errors as e:
+                self.rollback()
+                self.skip_entry(i, e)
+        return result
+
+    def prepare_batch(self, entries: list):
+        """Warm the related object cache with authors and categories of the batch, one query per model"""
+        if self.graph_import:
+            return
+        self.cache.warm(self.author_model, 'name', {entry['author'] for entry in entries if entry.get('author')})
+        self.cache.warm(self.category_model, 'title', {
+            tag['term'] for entry in entries for tag in entry.get('tags', ())
+        })
+
+    def rollback(self):
+        """Drop the authors and categories cached since the last commit, their rows may have been rolled back"""
+        self.cache.rollback()
+
+    def parse_date(self, value: str) -> datetime:
+        """Parse an RFC 822 or RFC 3339 date, falling back to `RSS_DATE_FORMAT` for other formats"""
+        try:
+            return parse_date(value)
+        except ValueError:
+            return datetime.strptime(value, RSS_DATE_FORMAT).astimezone(None)
 
     def transform_date_published(self, data, field):
-        date = data.published
+        date = data.get('published')
         if not date:
             return None
-        try:
-            return datetime.strptime(date, settings.DATE_FORMAT)
-        except:
-            return datetime.strptime(date, "%a, %d %b %Y %H:%M:%S %Z").astimezone(None)
+        return self.parse_date(date)
 
     def transform_author(self, data, field):
         value = self.get_value(data, field)
-        author_obj, _ = self.author_model.objects.get_or_create(name=value)
-        return author_obj
+        if value is ... or value is None:
+            return value
+        return self.cache.get_or_create(self.author_model, 'name', value)
 
     def transform_categories(self, data, field):
-        try:
-            value = self.get_value(data, field, 'tags')
-        except ValidationError:
+        # `get_value` omits M2M fields, read the tags directly
+        value = data.get('tags')
+        if not value:
             return []
-
-        categories = []
-        for category_dict in value:
-            category_title = category_dict['term']
-            # TODO: optimize, using filter()
-            # Mysql, Postgresql 9.5+ can insert all objects in one query and make use of ON CONFLICT
-            # Postgresql can take advantage of INSERT RETURNING
-            category_obj, _ = self.category_model.objects.get_or_create(title=category_title)
-            categories.append(category_obj)
-        return categories
+        return [
+            self.cache.get_or_create(self.category_model, 'title', category_dict['term'])
+            for category_dict in value
+        ]
 
     def process_entry(self, data: dict):
         instance = super(RSSMapper, self).process_entry(data)
         logger.debug(f"Instance: title '{instance.title}', ID {instance.id}")
         return instance
 
-    def process_string(self, text, if_modified_since: datetime = None) -> List[models.Model]:
+    def parse(self, text):
+        """Parse a feed with the selected `parser` backend
+
+        `PARSER_FEEDPARSER` handles any feed flavour, `PARSER_FAST` is a lean RSS 2.0 parser,
+            `PARSER_STREAM` yields entries one at a time, with memory usage independent of the number of items.
+        Besides a string, backends accept a binary file-like object or an iterable of bytes chunks.
+
+        :param text:
+        :return: an object with `feed` (channel elements) and `entries` (iterable of entries) attributes
+        """
+        return get_backend(self.parser).parse(text)
+
+    def filter_entries(self, entries: Iterable, since: datetime) -> Iterator:
+        """Drop entries published before `since`, keeping the ones without a valid date"""
+        for entry in entries:
+            published = entry.get('published')
+            if published:
+                try:
+                    date = self.parse_date(published)
+                except ValueError:
+                    pass
+                else:
+                    if date < since:
+                        self.stats['entries_too_old'] += 1
+                        continue
+            yield entry
+
+    def process_string(self, text, if_modified_since: datetime = None,
+                       entries_since: datetime = None) -> List[models.Model]:
         """
 
         :param text:
         :param if_modified_since: skip processing if source not modified after this time
+        :param entries_since: skip entries published before this time, before mapping them
         :return: list of entries processed
         """
-        try:
-            text = text.encode()
-        except AttributeError:
-            pass
-        feed = feedparser.parse(text)
-        if if_modified_since is not None and feed.feed.published:
-            pub_date = datetime.strptime(feed.feed.published, RSS_DATE_FORMAT).astimezone(None)
+        return self.process_feed(self.parse(text), if_modified_since=if_modified_since, entries_since=entries_since)
+
+    def process_feed(self, feed, if_modified_since: datetime = None,
+                     entries_since: datetime = None) -> List[models.Model]:
+        """Process an already parsed feed, e.g. the result of `mapper.parsers.parse_feed` run in a worker process
+
+        :param feed: an object with `feed` and `entries` attributes, as returned by `parse`
+        :param if_modified_since: skip processing if source not modified after this time
+        :param entries_since: skip entries published before this time, before mapping them
+        :return: list of entries processed
+        """
+        title = feed.feed.get('title')
+        published = feed.feed.get('published')
+        if if_modified_since is not None and published:
+            pub_date = self.parse_date(published)
             if pub_date < if_modified_since:
-                logger.debug("Skipping feed as not modified: %s", feed['feed']['title'])
+                logger.debug("Skipping feed as not modified: %s", title)
                 return []
-        logger.debug("Saving feed: %s", feed['feed']['title'])
-        return self.process(feed.entries)
-
+        logger.debug("Saving feed: %s", title)
+        entries = feed.entries
+        if entries_since is not None:
+            entries = self.filter_entries(entries, entries_since)
+        return self.process(entries)
@@ -0,0 +1,246 @@
+"""
+Declarative mapping of arbitrary XML documents.
+
+A spec maps named targets to the path of their record elements and record fields to paths relative
+    to the record element, optionally with a converter:
+
+    {
+        'namespaces': {'dc': 'http://purl.org/dc/elements/1.1/'},
+        'targets': {
+            'items': {
+                'path': 'rss/channel/item',
+                'fields': {
+                    'title': 'title',
+                    'author': 'dc:creator',
+                    'date_published': {'path': 'pubDate', 'converter': 'date'},
+                    'image': 'enclosure/@url',
+                    'tags': {'path': 'category', 'many': True},
+                },
+            },
+        },
+    }
+
+Paths are `/`-separated element names, relative to the record element (`.` is the record element itself),
+    optionally ending with `@attribute`; names may use prefixes declared in `namespaces`.
+    A field is missing from the record if its element (attribute) is missing. Intermediate path steps
+    follow the first matching element, `many` collects all matches of the last step.
+
+The spec is compiled once, then `XMLImporter` fills all targets in a single streaming pass over a document,
+    handing records to each target's mapper in batches.
+"""
+import logging
+from typing import Any, Callable, Dict, Iterable, Union
+from xml.etree.ElementTree import Element, XMLPullParser
+
+from mapper.base import MapperBase
+from mapper.dates import parse_date
+from mapper.parsers import iter_chunks
+
+logger = logging.getLogger(__name__)
+
+MISSING = object()
+
+
+def _text(value: str) -> str:
+    return value.strip()
+
+
+def _bool(value: str) -> bool:
+    return value.strip().lower() in ('1', 'true', 'yes')
+
+
+CONVERTERS = {
+    'str': _text,
+    'int': lambda value: int(value.strip()),
+    'float': lambda value: float(value.strip()),
+    'bool': _bool,
+    'date': lambda value: parse_date(value.strip()),
+}
+
+
+def _qualify(name: str, namespaces: Dict[str, str]) -> str:
+    """Convert `prefix:name` to ElementTree's `{uri}name`"""
+    prefix, colon, local = name.rpartition(':')
+    if not colon:
+        return name
+    try:
+        return f'{{{namespaces[prefix]}}}{local}'
+    except KeyError:
+        raise ValueError(f"Unknown namespace prefix '{prefix}'")
+
+
+def compile_path(path: str, namespaces: Dict[str, str] = None) -> tuple:
+    """Compile a path to a tuple of qualified element names"""
+    namespaces = namespaces or {}
+    return tuple(_qualify(name, namespaces) for name in path.strip('/').split('/') if name and name != '.')
+
+
+def compile_accessor(path: str, converter: Union[str, Callable] = 'str', many: bool = False,
+                     namespaces: Dict[str, str] = None) -> Callable[[Element], Any]:
+    """Compile a field path into a function returning the converted value from a record element
+
+    :return: accessor returning the value, a list of values if `many`, or `MISSING`
+    """
+    if isinstance(converter, str):
+        try:
+            converter = CONVERTERS[converter]
+        except KeyError:
+            raise ValueError(f"Unknown converter '{converter}'")
+    path, at, attribute = path.partition('@')
+    steps = compile_path(path, namespaces)
+    if attribute:
+        attribute = _qualify(attribute, namespaces or {})
+    parents, last = (steps[:-1], steps[-1]) if steps else ((), None)
+
+    def extract(element: Element):
+        if attribute:
+            value = element.get(attribute)
+            return MISSING if value is None else converter(value)
+        return converter(element.text or '')
+
+    def walk(element: Element):
+        for step in parents:
+            element = element.find(step)
+            if element is None:
+                return None
+        return element
+
+    if many:
+        def accessor(element: Element):
+            element = walk(element)
+            if element is None:
+                return []
+            matches = element.findall(last) if last is not None else [element]
+            values = [extract(match) for match in matches]
+            return [item for item in values if item is not MISSING]
+    else:
+        def accessor(element: Element):
+            element = walk(element)
+            if element is not None and last is not None:
+                element = element.find(last)
+            if element is None:
+                return MISSING
+            return extract(element)
+    return accessor
+
+
+class CompiledTarget:
+    def __init__(self, name: str, spec: dict, namespaces: Dict[str, str]):
+        self.name = name
+        try:
+            self.path = compile_path(spec['path'], namespaces)
+            fields = spec['fields']
+        except KeyError as e:
+            raise ValueError(f"Target '{name}' must define {e}")
+        self.accessors = []
+        for field_name, field_spec in fields.items():
+            if isinstance(field_spec, str):
+                field_spec = {'path': field_spec}
+            self.accessors.append((field_name, compile_accessor(
+                field_spec['path'], field_spec.get('converter', 'str'), field_spec.get('many', False), namespaces,
+            )))
+        self.accessors = tuple(self.accessors)
+
+    def record(self, element: Element) -> dict:
+        record = {}
+        for field_name, accessor in self.accessors:
+            value = accessor(element)
+            if value is not MISSING:
+                record[field_name] = value
+        return record
+
+
+class XMLSpec:
+    """A compiled mapping spec, see the module documentation for the format"""
+
+    def __init__(self, spec: dict):
+        namespaces = spec.get('namespaces', {})
+        self.targets = [CompiledTarget(name, target, namespaces) for name, target in spec['targets'].items()]
+        self.paths = {}  # record element path -> targets
+        for target in self.targets:
+            self.paths.setdefault(target.path, []).append(target)
+
+    @classmethod
+    def from_yaml(cls, text: str) -> 'XMLSpec':
+        """Load a spec from YAML, requires PyYAML"""
+        try:
+            import yaml
+        except ImportError:
+            raise ImportError("PyYAML is required to load mapping specs from YAML")
+        return cls(yaml.safe_load(text))
+
+    def iter_records(self, source: Union[str, bytes, Iterable[bytes]]) -> Iterable[tuple]:
+        """Parse a document in one streaming pass
+
+        Elements are dropped as soon as they end, unless they are inside a record element.
+
+        :param source: see `mapper.parsers.iter_chunks`
+        :return: iterable of (target name, record), in document order of the record elements' ends
+        """
+        parser = XMLPullParser(events=('start', 'end'))
+        elements = []  # open elements
+        paths = [()]  # paths of open elements, with the root path first
+        open_records = 0
+
+        def read_events():
+            nonlocal open_records
+            for event, element in parser.read_events():
+                if event == 'start':
+                    path = paths[-1] + (element.tag,)
+                    elements.append(element)
+                    paths.append(path)
+                    if path in self.paths:
+                        open_records += 1
+                    continue
+                path = paths.pop()
+                elements.pop()
+                targets = self.paths.get(path)
+                if targets:
+                    open_records -= 1
+                    for target in targets:
+                        yield target.name, target.record(element)
+                if not open_records and elements:
+                    # not a part of any record, drop it
+                    elements[-1].remove(element)
+
+        for chunk in iter_chunks(source):
+            parser.feed(chunk)
+            yield from read_events()
+        parser.close()
+        yield from read_events()
+
+
+class XMLImporter:
+    """
+    Import a document into several targets at once, as described by an `XMLSpec`.
+
+    Every target is processed by its own mapper: records are dicts of field names to values,
+        so the mappers can use `get_value` and `transform_FIELD` methods as usual.
+    """
+
+    def __init__(self, spec: Union[XMLSpec, dict], mappers: Dict[str, MapperBase], batch_size: int = 100):
+        self.spec = spec if isinstance(spec, XMLSpec) else XMLSpec(spec)
+        missing = {target.name for target in self.spec.targets} - set(mappers)
+        if missing:
+            raise TypeError(f"No mappers for targets: {', '.join(sorted(missing))}")
+        self.mappers = mappers
+        self.batch_size = batch_size
+
+    def process_string(self, text) -> Dict[str, list]:
+        """Process a document
+
+        :param text: a string, bytes, a binary file-like object or an iterable of bytes chunks
+        :return: target name -> instances processed
+        """
+        result = {name: [] for name in self.mappers}
+        pending = {name: [] for name in self.mappers}
+        for name, record in self.spec.iter_records(text):
+            records = pending[name]
+            records.append(record)
+            if len(records) >= self.batch_size:
+                result[name].extend(self.mappers[name].process(records))
+                pending[name] = []
+        for name, records in pending.items():
+            if records:
+                result[name].extend(self.mappers[name].process(records))
+        return result
@@ -14,14 +14,36 @@ class FakeModelWithM2M(models.Model):
 
 
 class FakeRSSAuthor(models.Model):
-    name = models.CharField(max_length=100)
+    name = models.CharField(max_length=100, unique=True)
 
 
 class FakeRSSCategory(models.Model):
-    title = models.CharField(max_length=100)
+    title = models.CharField(max_length=100, unique=True)
 
 
 class FakeRSSItem(models.Model):
     title = models.CharField(max_length=100)
     guid = models.CharField(max_length=100, unique=True)
     date_published = models.DateTimeField(blank=True)
+    description = models.TextField(blank=True)
+    link = models.URLField(blank=True)
+    author = models.ForeignKey(FakeRSSAuthor, null=True, blank=True, on_delete=models.SET_NULL)
+    categories = models.ManyToManyField(FakeRSSCategory)
+    fingerprint = models.CharField(max_length=40, blank=True)
+
+
+class FakePlace(models.Model):
+    name = models.CharField(max_length=100, unique=True)
+
+
+class FakeEventDate(models.Model):
+    date = models.DateTimeField()
+    place = models.ForeignKey(FakePlace, on_delete=models.CASCADE)
+
+    class Meta:
+        unique_together = 'date', 'place'
+
+
+class FakeEvent(models.Model):
+    title = models.CharField(max_length=100, unique=True)
+    dates = models.ManyToManyField(FakeEventDate)
@@ -1,9 +1,11 @@
+from datetime import datetime, timezone
+
 import pytest
 from django.core.exceptions import ValidationError
 from django.db import models
 
-from mapper.base import MapperBase
-from tests.models import FakeModel, FakeModelWithM2M
+from mapper.base import MapperBase, BUCKET_INSTANCE, BUCKET_UNIQUE, BUCKET_M2M
+from tests.models import FakeModel, FakeModelWithM2M, FakeRSSCategory, FakeRSSItem
 from unittest.mock import patch, Mock
 
 SAMPLE_DATA = [
@@ -30,6 +32,11 @@ def test_mapper_init_exclude():
     assert list(mapper_base.model_fields.keys()) == ['blank_field', 'null_field', 'default_field']
 
 
+def test_mapper_init_reverse_relations():
+    mapper_base = MapperBase(FakeRSSCategory)
+    assert list(mapper_base.model_fields.keys()) == ['title']
+
+
 def test_mapper_get_value():
     mapper_base = MapperBase(FakeModel)
     sample_data = SAMPLE_DATA[0]
@@ -68,6 +75,31 @@ def test_mapper_get_value_missing_null():
     assert value is None
 
 
+def test_mapper_compile_plan():
+    class MapperPlan(MapperBase):
+        unique_fields = ['required_field']
+
+        def transform_blank_field(self, data, field):
+            return "transformed"
+
+    mapper_base = MapperPlan(FakeModel)
+    plan = {field_name: (extractor, bucket) for field_name, _, extractor, bucket in mapper_base.field_plan}
+    assert plan['required_field'] == (mapper_base.get_value, BUCKET_UNIQUE)
+    assert plan['blank_field'] == (mapper_base.transform_blank_field, BUCKET_INSTANCE)
+    assert MapperBase(FakeModelWithM2M).field_plan[1][3] == BUCKET_M2M
+
+
+def test_mapper_map_entry():
+    class MapperUnique(MapperBase):
+        unique_fields = ['required_field', 'null_field']
+
+    mapper_base = MapperUnique(FakeModel)
+    instance_params, unique_params, m2m_params = mapper_base.map_entry(SAMPLE_DATA[0])
+    assert unique_params == {'required_field': "test value #1"}
+    assert instance_params == {'null_field': None}
+    assert m2m_params == {}
+
+
 def test_mapper_process_string():
     mapper_base = MapperBase(FakeModel)
     with pytest.raises(NotImplementedError):
@@ -94,8 +126,10 @@ def test_mapper_process_entry():
 
 
 def test_mapper_process_entry_with_unique():
-    mapper_base = MapperBase(FakeModel)
-    mapper_base.unique_fields = ['required_field']
+    class MapperUnique(MapperBase):
+        unique_fields = ['required_field']
+
+    mapper_base = MapperUnique(FakeModel)
 
     with patch.object(FakeModel.objects, "get_or_create") as objects_get_or_create:
         objects_get_or_create.return_value = ..., True
@@ -113,8 +147,11 @@ def test_mapper_process_entry_with_unique_incorrect():
 
 
 def test_mapper_process_entry_with_transform():
-    mapper_base = MapperBase(FakeModel)
-    mapper_base.transform_required_field = lambda data, field: "transformed value #1"
+    class MapperTransform(MapperBase):
+        def transform_required_field(self, data, field):
+            return "transformed value #1"
+
+    mapper_base = MapperTransform(FakeModel)
 
     with patch.object(FakeModel.objects, "create") as objects_create:
         objects_create.return_value = ...
@@ -133,8 +170,10 @@ def test_mapper_process_entry_with_m2m():
 
 
 def test_mapper_process_entry_with_m2m_transform():
-    mapper_base = MapperBase(FakeModelWithM2M)
-    mapper_base.transform_m2m_field = Mock(return_value=[...])
+    class MapperM2M(MapperBase):
+        transform_m2m_field = Mock(return_value=[...])
+
+    mapper_base = MapperM2M(FakeModelWithM2M)
 
     with patch.object(FakeModelWithM2M, "m2m_field") as m2m_field, \
             patch.object(FakeModelWithM2M.objects, "create") as objects_create:
@@ -142,3 +181,188 @@ def test_mapper_process_entry_with_m2m_transform():
         assert mapper_base.transform_m2m_field.called
         assert result.m2m_field.clear.called
         assert result.m2m_field.add.called_once_with(...)
+
+
+class MapperBatch(MapperBase):
+    unique_fields = ['guid']
+    batch_size = 2
+
+
+BATCH_DATA = [
+    {"title": "title #1", "guid": "guid-1", "date_published": datetime(2018, 5, 21, tzinfo=timezone.utc)},
+    {"title": "title #2", "guid": "guid-2", "date_published": datetime(2018, 5, 22, tzinfo=timezone.utc)},
+    {"title": "title #3", "guid": "guid-3", "date_published": datetime(2018, 5, 23, tzinfo=timezone.utc)},
+]
+
+
+@pytest.mark.django_db
+def test_mapper_process_batch():
+    mapper_base = MapperBatch(FakeRSSItem)
+    result = mapper_base.process(BATCH_DATA)
+    assert [item.guid for item in result] == ["guid-1", "guid-2", "guid-3"]
+    assert all(item.pk for item in result)
+    assert FakeRSSItem.objects.count() == 3
+
+
+@pytest.mark.django_db
+def test_mapper_process_batch_same_as_process_entry():
+    mapper_base = MapperBatch(FakeRSSItem)
+    expected = [mapper_base.process_entry(entry) for entry in BATCH_DATA]
+    result = mapper_base.process(BATCH_DATA)
+    assert [item.pk for item in result] == [item.pk for item in expected]
+    assert FakeRSSItem.objects.count() == 3
+
+
+@pytest.mark.django_db
+def test_mapper_process_batch_update():
+    mapper_base = MapperBatch(FakeRSSItem)
+    mapper_base.process(BATCH_DATA)
+    changed = [dict(entry) for entry in BATCH_DATA]
+    changed[1]["title"] = "changed title"
+    result = mapper_base.process(changed)
+    assert result[1].title == "changed title"
+    assert FakeRSSItem.objects.get(guid="guid-2").title == "changed title"
+    assert FakeRSSItem.objects.count() == 3
+
+
+@pytest.mark.django_db
+def test_mapper_process_batch_duplicates():
+    mapper_base = MapperBatch(FakeRSSItem)
+    result = mapper_base.process_batch([BATCH_DATA[0], BATCH_DATA[0]])
+    assert result[0] is result[1]
+    assert FakeRSSItem.objects.count() == 1
+
+
+@pytest.mark.django_db
+def test_mapper_process_batch_timings():
+    mapper_base = MapperBatch(FakeRSSItem)
+    mapper_base.process(BATCH_DATA)
+    assert set(mapper_base.timings) == {'map', 'write', 'm2m'}
+    assert all(value > 0 for value in mapper_base.timings.values())
+    total = sum(mapper_base.timings.values())
+    mapper_base.process(BATCH_DATA)
+    assert sum(mapper_base.timings.values()) > total
+
+
+@pytest.mark.django_db
+def test_mapper_process_batch_queries(django_assert_max_num_queries):
+    mapper_base = MapperBatch(FakeRSSItem)
+    with django_assert_max_num_queries(3):
+        mapper_base.process_batch(BATCH_DATA)
+
+
+class MapperFingerprint(MapperBatch):
+    fingerprint_field = 'fingerprint'
+
+
+def test_mapper_init_fingerprint():
+    mapper_base = MapperFingerprint(FakeRSSItem)
+    assert 'fingerprint' not in mapper_base.model_fields
+
+    class MapperFingerprintIncorrect(MapperBase):
+        fingerprint_field = 'wrong_field'
+
+    with pytest.raises(TypeError):
+        MapperFingerprintIncorrect(FakeRSSItem)
+
+    class MapperFingerprintNotBatch(MapperBase):
+        fingerprint_field = 'fingerprint'
+
+    with pytest.raises(TypeError):
+        MapperFingerprintNotBatch(FakeRSSItem)
+
+
+def test_mapper_fingerprint():
+    mapper_base = MapperFingerprint(FakeRSSItem)
+    params = mapper_base.map_entry(BATCH_DATA[0])
+    assert mapper_base.fingerprint(params) == mapper_base.fingerprint(mapper_base.map_entry(dict(BATCH_DATA[0])))
+    assert mapper_base.fingerprint(params) != mapper_base.fingerprint(mapper_base.map_entry(BATCH_DATA[1]))
+    moved = dict(BATCH_DATA[0], date_published=BATCH_DATA[0]["date_published"].astimezone(None))
+    assert mapper_base.fingerprint(params) == mapper_base.fingerprint(mapper_base.map_entry(moved))
+
+
+@pytest.mark.django_db
+def test_mapper_process_batch_fingerprint(django_assert_num_queries):
+    mapper_base = MapperFingerprint(FakeRSSItem)
+    mapper_base.process(BATCH_DATA)
+    assert all(FakeRSSItem.objects.values_list('fingerprint', flat=True))
+    assert mapper_base.stats['fingerprint_misses'] == 3
+
+    with django_assert_num_queries(1):
+        result = mapper_base.process_batch(BATCH_DATA)
+    assert [item.guid for item in result] == ["guid-1", "guid-2", "guid-3"]
+    assert mapper_base.stats['fingerprint_hits'] == 3
+
+    changed = [dict(entry) for entry in BATCH_DATA]
+    changed[1]["title"] = "changed title"
+    mapper_base.process_batch(changed)
+    assert mapper_base.stats['fingerprint_misses'] == 4
+    assert FakeRSSItem.objects.get(guid="guid-2").title == "changed title"
+    with django_assert_num_queries(1):
+        mapper_base.process_batch(changed)
+
+
+class MapperAtomic(MapperBase):
+    unique_fields = ['guid']
+    atomic_chunk_size = 2
+
+
+class MapperAtomicBatch(MapperAtomic):
+    batch_size = 2
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("mapper_class", [MapperAtomic, MapperAtomicBatch])
+def test_mapper_process_atomic(mapper_class):
+    mapper_base = mapper_class(FakeRSSItem)
+    data = [dict(entry) for entry in BATCH_DATA]
+    del data[1]["title"]
+    result = mapper_base.process(data)
+    assert [item.guid for item in result] == ["guid-1", "guid-3"]
+    assert sorted(FakeRSSItem.objects.values_list('guid', flat=True)) == ["guid-1", "guid-3"]
+    assert [i for i, _ in mapper_base.errors] == [1]
+    assert isinstance(mapper_base.errors[0][1], ValidationError)
+    assert len(mapper_base.chunk_timings) == 2
+    assert mapper_base.stats['skipped'] == 1
+
+
+@pytest.mark.django_db
+def test_mapper_process_not_atomic_raises():
+    mapper_base = MapperBatch(FakeRSSItem)
+    data = [dict(entry) for entry in BATCH_DATA]
+    del data[1]["title"]
+    with pytest.raises(ValidationError):
+        mapper_base.process(data)
+
+
+class MapperAtomicLargeBatch(MapperAtomic):
+    batch_size = 100
+    atomic_chunk_size = 500
+
+
+@pytest.mark.django_db
+def test_mapper_process_atomic_batch_save_error():
+    mapper_base = MapperAtomicLargeBatch(FakeRSSItem)
+    data = [
+        {"title": f"title #{i}", "guid": f"guid-{i}", "date_published": datetime(2018, 5, 21, tzinfo=timezone.utc)}
+        for i in range(50)
+    ]
+    data[10]["date_published"] = None
+    result = mapper_base.process(data)
+    assert len(result) == 49
+    assert FakeRSSItem.objects.count() == 49
+    assert not FakeRSSItem.objects.filter(guid="guid-10").exists()
+    assert [i for i, _ in mapper_base.errors] == [10]
+
+
+@pytest.mark.django_db
+def test_mapper_process_batch_reimport_mixed_types():
+    mapper_base = MapperBatch(FakeRSSItem)
+    data = [dict(entry, guid=i) for i, entry in enumerate(BATCH_DATA)]
+    first = mapper_base.process(data)
+    assert [item.guid for item in FakeRSSItem.objects.order_by('pk')] == ["0", "1", "2"]
+    mixed = [dict(entry, guid=str(i) if i % 2 else i) for i, entry in enumerate(BATCH_DATA)]
+    result = mapper_base.process(mixed)
+    assert [item.pk for item in result] == [item.pk for item in first]
+    assert FakeRSSItem.objects.count() == 3
+    assert mapper_base._update_instance(result[0], {"guid": 0}) == []
@@ -0,0 +1,81 @@
+import pytest
+from django.db import transaction
+
+from mapper.cache import RelatedObjectCache
+from tests.models import FakeRSSAuthor, FakeRSSCategory
+
+
+def test_cache_get_set():
+    cache = RelatedObjectCache()
+    cache.set(FakeRSSAuthor, "Marvin", "author")
+    assert cache.get(FakeRSSAuthor, "Marvin") == "author"
+    assert cache.get(FakeRSSCategory, "Marvin") is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_cache_lru_eviction():
+    cache = RelatedObjectCache(maxsize=2)
+    cache.set(FakeRSSAuthor, "a", 1)
+    cache.set(FakeRSSAuthor, "b", 2)
+    cache.get(FakeRSSAuthor, "a")
+    cache.set(FakeRSSAuthor, "c", 3)
+    assert len(cache) == 2
+    assert (FakeRSSAuthor, "a") in cache
+    assert (FakeRSSAuthor, "b") not in cache
+
+
+def test_cache_invalidate():
+    cache = RelatedObjectCache()
+    cache.set(FakeRSSAuthor, "a", 1)
+    cache.set(FakeRSSAuthor, "b", 2)
+    cache.set(FakeRSSCategory, "a", 3)
+    cache.invalidate(FakeRSSAuthor, "a")
+    assert (FakeRSSAuthor, "a") not in cache
+    cache.invalidate(FakeRSSAuthor)
+    assert len(cache) == 1
+    cache.invalidate()
+    assert len(cache) == 0
+
+
+@pytest.mark.django_db
+def test_cache_warm(django_assert_num_queries):
+    FakeRSSAuthor.objects.create(name="Marvin")
+    FakeRSSAuthor.objects.create(name="Ford Prefect")
+    cache = RelatedObjectCache()
+    with django_assert_num_queries(1):
+        cache.warm(FakeRSSAuthor, 'name', ["Marvin", "Ford Prefect", "Arthur Dent"])
+    assert cache.get(FakeRSSAuthor, "Marvin").name == "Marvin"
+    assert (FakeRSSAuthor, "Arthur Dent") not in cache
+    with django_assert_num_queries(0):
+        cache.warm(FakeRSSAuthor, 'name', ["Marvin"])
+
+
+@pytest.mark.django_db
+def test_cache_get_or_create(django_assert_num_queries):
+    cache = RelatedObjectCache()
+    author = cache.get_or_create(FakeRSSAuthor, 'name', "Marvin")
+    assert author.pk
+    with django_assert_num_queries(0):
+        assert cache.get_or_create(FakeRSSAuthor, 'name', "Marvin") is author
+    cache.invalidate(FakeRSSAuthor, "Marvin")
+    assert cache.get_or_create(FakeRSSAuthor, 'name', "Marvin").pk == author.pk
+    assert FakeRSSAuthor.objects.count() == 1
+
+
+@pytest.mark.django_db
+def test_cache_rollback():
+    cache = RelatedObjectCache()
+    cache.set(FakeRSSAuthor, "Marvin", "author")
+    with transaction.atomic():
+        cache.set(FakeRSSAuthor, "Ford Prefect", "author")
+    cache.rollback()
+    assert len(cache) == 0
+
+
+@pytest.mark.django_db(transaction=True)
+def test_cache_rollback_after_commit():
+    cache = RelatedObjectCache()
+    with transaction.atomic():
+        cache.set(FakeRSSAuthor, "Marvin", "author")
+    cache.rollback()
+    assert (FakeRSSAuthor, "Marvin") in cache
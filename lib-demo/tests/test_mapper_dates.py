@@ -0,0 +1,48 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from mapper.dates import parse_date, parse_rfc822, parse_rfc3339
+
+MSK = timezone(timedelta(hours=3))
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("Mon, 21 May 2018 21:58:52 +0300", datetime(2018, 5, 21, 21, 58, 52, tzinfo=MSK)),
+    ("Mon, 21 May 2018 18:58:52 GMT", datetime(2018, 5, 21, 18, 58, 52, tzinfo=timezone.utc)),
+    ("21 May 2018 18:58:52 UT", datetime(2018, 5, 21, 18, 58, 52, tzinfo=timezone.utc)),
+    ("Mon,21 May 2018 13:58:52 EST", datetime(2018, 5, 21, 18, 58, 52, tzinfo=timezone.utc)),
+    ("Monday, 21 May 2018 11:58 PDT", datetime(2018, 5, 21, 18, 58, tzinfo=timezone.utc)),
+    ("21 May 18 21:58:52 +03:00", datetime(2018, 5, 21, 21, 58, 52, tzinfo=MSK)),
+    ("Mon, 21 May 2018 18:58:52", datetime(2018, 5, 21, 18, 58, 52, tzinfo=timezone.utc)),
+])
+def test_parse_rfc822(value, expected):
+    assert parse_rfc822(value) == expected
+    assert parse_date(value) == expected
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("2018-05-21T21:58:52+03:00", datetime(2018, 5, 21, 21, 58, 52, tzinfo=MSK)),
+    ("2018-05-21T18:58:52Z", datetime(2018, 5, 21, 18, 58, 52, tzinfo=timezone.utc)),
+    ("2018-05-21 18:58:52.5z", datetime(2018, 5, 21, 18, 58, 52, 500000, tzinfo=timezone.utc)),
+    ("2018-05-21T21:58+0300", datetime(2018, 5, 21, 21, 58, tzinfo=MSK)),
+    ("2018-05-21", datetime(2018, 5, 21, tzinfo=timezone.utc)),
+])
+def test_parse_rfc3339(value, expected):
+    assert parse_rfc3339(value) == expected
+    assert parse_date(value) == expected
+
+
+@pytest.mark.parametrize("value", [
+    "", "yesterday", "Mon, 21 Foo 2018 18:58:52 GMT", "Mon, 21 May 2018 18:58:52 XYZ", "2018/05/21",
+])
+def test_parse_date_invalid(value):
+    with pytest.raises(ValueError):
+        parse_date(value)
+
+
+def test_parse_date_memoized():
+    parse_date.cache_clear()
+    first = parse_date("Mon, 21 May 2018 21:58:52 +0300")
+    assert parse_date("Mon, 21 May 2018 21:58:52 +0300") is first
+    assert parse_date.cache_info().hits == 1
@@ -0,0 +1,137 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from mapper.base import MapperBase
+from mapper.dates import parse_date
+from mapper.graph import GraphImporter, Relation
+from mapper.rss import RSSMapper
+from tests.models import FakeEvent, FakeEventDate, FakePlace, FakeRSSAuthor, FakeRSSCategory, FakeRSSItem
+
+
+class EventMapper(MapperBase):
+    unique_fields = ['title']
+
+
+class EventDateMapper(MapperBase):
+    unique_fields = ['date', 'place']
+
+    def transform_date(self, data, field):
+        return parse_date(data['date'])
+
+
+class PlaceMapper(MapperBase):
+    unique_fields = ['name']
+
+
+def make_importer():
+    event_mapper = EventMapper(FakeEvent)
+    date_mapper = EventDateMapper(FakeEventDate)
+    return GraphImporter(event_mapper, [
+        Relation(event_mapper, 'dates', date_mapper),
+        Relation(date_mapper, 'place', PlaceMapper(FakePlace), lambda data: {'name': data['place']}),
+    ])
+
+
+def make_events(count):
+    return [
+        {
+            "title": f"Event #{i}",
+            "dates": [
+                {"date": f"2018-05-{day:02}T20:00:00Z", "place": f"Place #{(i + day) % 3}"}
+                for day in range(1, i % 3 + 2)
+            ],
+        }
+        for i in range(count)
+    ]
+
+
+def test_graph_order():
+    importer = make_importer()
+    assert [mapper.model for mapper in importer.order] == [FakeEvent, FakeEventDate, FakePlace]
+
+
+def test_graph_invalid_relation():
+    event_mapper = EventMapper(FakeEvent)
+    with pytest.raises(TypeError):
+        Relation(event_mapper, 'title', PlaceMapper(FakePlace))
+    with pytest.raises(TypeError):
+        Relation(event_mapper, 'dates', PlaceMapper(FakePlace))
+
+
+def test_graph_cycle():
+    date_mapper = EventDateMapper(FakeEventDate)
+    event_mapper = EventMapper(FakeEvent)
+    with pytest.raises(TypeError):
+        GraphImporter(date_mapper, [Relation(event_mapper, 'dates', date_mapper)])
+
+
+@pytest.mark.django_db
+def test_graph_process():
+    result = make_importer().process(make_events(4))
+    assert [event.title for event in result] == ["Event #0", "Event #1", "Event #2", "Event #3"]
+    dates = result[2].dates.order_by('date')
+    assert [(date.date, date.place.name) for date in dates] == [
+        (datetime(2018, 5, 1, 20, tzinfo=timezone.utc), "Place #0"),
+        (datetime(2018, 5, 2, 20, tzinfo=timezone.utc), "Place #1"),
+        (datetime(2018, 5, 3, 20, tzinfo=timezone.utc), "Place #2"),
+    ]
+    assert FakePlace.objects.count() == 3
+    assert FakeEventDate.objects.count() == 6  # event #3 shares its date with event #0
+
+
+@pytest.mark.django_db
+def test_graph_queries_independent_of_rows(django_assert_max_num_queries):
+    importer = make_importer()
+    with django_assert_max_num_queries(12):
+        importer.process_batch(make_events(5))
+    with django_assert_max_num_queries(12):
+        importer.process_batch(make_events(50))
+    with django_assert_max_num_queries(4):
+        importer.process_batch(make_events(50))
+
+
+class GraphRSSMapper(RSSMapper):
+    graph_import = True
+
+
+def make_rss_entries():
+    return [
+        {
+            "title": f"title #{i}",
+            "guid": f"guid-{i}",
+            "published": "Mon, 21 May 2018 18:58:52 GMT",
+            "author": "Ford Prefect" if i % 2 else "Marvin",
+            "tags": [{"term": "Solar System"}, {"term": f"Category #{i % 2}"}],
+        }
+        for i in range(4)
+    ] + [{"title": "no author", "guid": "guid-4", "published": "Mon, 21 May 2018 18:58:52 GMT"}]
+
+
+@pytest.mark.django_db
+def test_graph_rss_mapper():
+    mapper = GraphRSSMapper(FakeRSSItem, author_model=FakeRSSAuthor, category_model=FakeRSSCategory)
+    result = mapper.process(make_rss_entries())
+    assert [item.author.name if item.author else None for item in result] == \
+        ["Marvin", "Ford Prefect", "Marvin", "Ford Prefect", None]
+    assert sorted(result[1].categories.values_list('title', flat=True)) == ["Category #1", "Solar System"]
+    assert FakeRSSAuthor.objects.count() == 2
+    assert FakeRSSCategory.objects.count() == 3
+    assert len(mapper.cache) == 0
+    assert mapper.timings['map'] > 0
+
+
+class GraphRSSMapperAtomic(GraphRSSMapper):
+    atomic_chunk_size = 10
+
+
+@pytest.mark.django_db
+def test_graph_rss_mapper_atomic_skips_errors():
+    mapper = GraphRSSMapperAtomic(FakeRSSItem, author_model=FakeRSSAuthor, category_model=FakeRSSCategory)
+    entries = make_rss_entries()
+    del entries[2]["title"]
+    result = mapper.process(entries)
+    assert [item.guid for item in result] == ["guid-0", "guid-1", "guid-3", "guid-4"]
+    assert [i for i, _ in mapper.errors] == [2]
+    assert len(mapper.chunk_timings) == 1
+    assert FakeRSSItem.objects.count() == 4
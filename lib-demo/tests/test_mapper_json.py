@@ -0,0 +1,148 @@
+import asyncio
+import json
+import random
+from datetime import datetime, timezone
+
+import pytest
+
+from mapper.dates import parse_date
+from mapper.json import JSONArrayStream, JSONMapper, iter_json_records
+from mapper.parsers import iter_chunks
+from tests.models import FakeRSSItem
+
+RECORDS = [
+    {"title": "title #1", "guid": "guid-1", "date_published": "2018-05-21T21:58:52+03:00"},
+    {"title": "title \"#2\" [ok] {}", "guid": "guid-2", "date_published": "2018-05-22T18:58:52Z"},
+    {"title": "title #3", "guid": "guid-3", "date_published": "2018-05-23T18:58:52Z", "extra": [1, 2.5, None]},
+]
+
+SAMPLE_JSON = json.dumps({
+    "meta": {"count": 3, "items": "not these", "nested": [{"items": []}]},
+    "data": {"total": 3, "items": RECORDS},
+    "after": "ignored",
+}).encode()
+
+
+def parse(document, path, chunk_size):
+    stream = JSONArrayStream(path)
+    records = []
+    for chunk in iter_chunks(document, chunk_size=chunk_size):
+        records.extend(stream.push(chunk))
+    records.extend(stream.close())
+    return records
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 65536])
+def test_json_stream(chunk_size):
+    assert parse(SAMPLE_JSON, "data.items", chunk_size) == RECORDS
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 65536])
+def test_json_stream_top_level(chunk_size):
+    document = json.dumps([1, 22, 333, "four", True, None, {"five": 5}]).encode()
+    assert parse(document, "", chunk_size) == [1, 22, 333, "four", True, None, {"five": 5}]
+
+
+SCALARS = [1.5e10, -12, -0.25, 3e-7, 1E+2, 0, 10, True, False, None, "1.5", -1.5e-10]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 5])
+def test_json_stream_scalars_split(chunk_size):
+    document = b'[1.5e10, -12,-0.25 ,3e-7,1E+2, 0,10,true, false,null,"1.5",-1.5E-10]'
+    assert parse(document, "", chunk_size) == SCALARS
+    assert parse(b'{"skipped": -1.5e10, "items": [true]}', "items", chunk_size) == [True]
+
+
+def test_json_stream_random_chunks():
+    rnd = random.Random(0)
+    document = json.dumps({"items": [
+        {"a": SCALARS, "b": {"c": [1.25, -3, None]}}, *SCALARS, [[], {}], "x" * 10,
+    ]}).encode()
+    expected = json.loads(document)["items"]
+    for _ in range(200):
+        stream = JSONArrayStream("items")
+        records = []
+        pos = 0
+        while pos < len(document):
+            size = rnd.randint(1, 8)
+            records.extend(stream.push(document[pos:pos + size]))
+            pos += size
+        records.extend(stream.close())
+        assert records == expected
+
+
+def test_json_stream_unicode():
+    document = json.dumps([{"title": "Автостопом по галактике"}], ensure_ascii=False).encode()
+    assert parse(document, "", 1) == [{"title": "Автостопом по галактике"}]
+
+
+def test_json_stream_incremental():
+    stream = JSONArrayStream("items")
+    assert stream.push(b'{"items": [{"a": 1}, {"b"') == [{"a": 1}]
+    assert stream.push(b': 2}]}') == [{"b": 2}]
+    assert stream.close() == []
+
+
+@pytest.mark.parametrize("document, path", [
+    (b'{"data": {}}', "data.items"),
+    (b'{"items": {}}', "items"),
+    (b'[1, 2]', "items"),
+    (b'{"items": [1, 2', "items"),
+])
+def test_json_stream_invalid(document, path):
+    with pytest.raises(ValueError):
+        list(iter_json_records(document, path))
+
+
+class MapperJSON(JSONMapper):
+    records_path = "data.items"
+    unique_fields = ['guid']
+    batch_size = 2
+
+    def transform_date_published(self, data, field):
+        return parse_date(data['date_published'])
+
+
+@pytest.mark.django_db
+def test_json_mapper_process_string():
+    mapper = MapperJSON(FakeRSSItem)
+    result = mapper.process_string(SAMPLE_JSON)
+    assert [item.guid for item in result] == ["guid-1", "guid-2", "guid-3"]
+    assert result[0].date_published == datetime(2018, 5, 21, 18, 58, 52, tzinfo=timezone.utc)
+    assert FakeRSSItem.objects.count() == 3
+
+
+def process_stream(mapper, document, chunk_size):
+    async def chunks():
+        for chunk in iter_chunks(document, chunk_size=chunk_size):
+            yield chunk
+
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(mapper.process_stream(chunks()))
+    finally:
+        loop.close()
+
+
+# the records are saved in a thread of the loop's executor, with its own connection
+@pytest.mark.django_db(transaction=True)
+def test_json_mapper_process_stream():
+    mapper = MapperJSON(FakeRSSItem)
+    result = process_stream(mapper, SAMPLE_JSON, chunk_size=50)
+    assert [item.guid for item in result] == ["guid-1", "guid-2", "guid-3"]
+
+
+class MapperJSONAtomic(MapperJSON):
+    atomic_chunk_size = 2
+
+
+@pytest.mark.django_db(transaction=True)
+def test_json_mapper_process_stream_atomic():
+    records = [dict(RECORDS[0], guid=f"guid-{i}") for i in range(5)]
+    del records[3]["title"]
+    mapper = MapperJSONAtomic(FakeRSSItem)
+    result = process_stream(mapper, json.dumps({"data": {"items": records}}).encode(), chunk_size=20)
+    assert [item.guid for item in result] == ["guid-0", "guid-1", "guid-2", "guid-4"]
+    assert [i for i, _ in mapper.errors] == [3]
+    assert len(mapper.chunk_timings) == 3
+    assert FakeRSSItem.objects.count() == 4
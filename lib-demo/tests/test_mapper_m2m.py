@@ -0,0 +1,55 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from mapper.m2m import sync_m2m
+from tests.models import FakeRSSCategory, FakeRSSItem
+
+
+@pytest.fixture
+def items():
+    return [
+        FakeRSSItem.objects.create(title=f"title #{i}", guid=f"guid-{i}", date_published=datetime.now(timezone.utc))
+        for i in range(3)
+    ]
+
+
+@pytest.fixture
+def categories():
+    return [FakeRSSCategory.objects.create(title=f"category #{i}") for i in range(3)]
+
+
+def linked(item):
+    return sorted(item.categories.values_list('title', flat=True))
+
+
+@pytest.mark.django_db
+def test_sync_m2m_create(items, categories, django_assert_num_queries):
+    field = FakeRSSItem._meta.get_field('categories')
+    with django_assert_num_queries(2):
+        result = sync_m2m(field, {items[0]: categories[:2], items[1]: [categories[2].pk], items[2]: []})
+    assert result == (3, 0)
+    assert linked(items[0]) == ["category #0", "category #1"]
+    assert linked(items[1]) == ["category #2"]
+    assert linked(items[2]) == []
+
+
+@pytest.mark.django_db
+def test_sync_m2m_diff(items, categories, django_assert_num_queries):
+    field = FakeRSSItem._meta.get_field('categories')
+    sync_m2m(field, {items[0]: categories[:2], items[1]: categories[1:]})
+    through_ids = set(FakeRSSItem.categories.through.objects.values_list('pk', flat=True))
+
+    with django_assert_num_queries(1):
+        assert sync_m2m(field, {items[0]: categories[:2], items[1]: categories[1:]}) == (0, 0)
+    assert set(FakeRSSItem.categories.through.objects.values_list('pk', flat=True)) == through_ids
+
+    with django_assert_num_queries(3):
+        assert sync_m2m(field, {items[0]: categories[1:], items[1]: categories[1:]}) == (1, 1)
+    assert linked(items[0]) == ["category #1", "category #2"]
+    assert linked(items[1]) == ["category #1", "category #2"]
+
+
+@pytest.mark.django_db
+def test_sync_m2m_empty():
+    assert sync_m2m(FakeRSSItem._meta.get_field('categories'), {}) == (0, 0)
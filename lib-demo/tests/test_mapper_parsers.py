@@ -0,0 +1,147 @@
+import io
+import pickle
+from datetime import datetime
+from xml.dom import minidom
+
+import pytest
+
+from mapper.parsers import (
+    BACKENDS, Entry, FastBackend, StreamingRSSParser, get_backend, iter_chunks, parse_feed, stream_feed,
+)
+from tests.test_mapper_rss import SAMPLE_RSS
+
+ITEM = """\
+        <item>
+            <title>Item #{0}</title>
+            <guid>guid-{0}</guid>
+            <category>Hitchhiking</category>
+        </item>
+"""
+
+
+def make_feed(count):
+    items = "".join(ITEM.format(i) for i in range(count))
+    return f"""<?xml version="1.0"?><rss version="2.0"><channel><title>Large</title>{items}</channel></rss>""".encode()
+
+
+def test_entry_attributes():
+    entry = Entry(title="test")
+    assert entry.title == "test"
+    assert not hasattr(entry, "missing")
+
+
+def test_iter_chunks():
+    assert list(iter_chunks(b"abcde", chunk_size=2)) == [b"ab", b"cd", b"e"]
+    assert list(iter_chunks("abc", chunk_size=2)) == [b"ab", b"c"]
+    assert list(iter_chunks(io.BytesIO(b"abc"), chunk_size=2)) == [b"ab", b"c"]
+    assert list(iter_chunks([b"ab", b"c"])) == [b"ab", b"c"]
+
+
+def test_stream_feed():
+    feed, entries = stream_feed(iter_chunks(SAMPLE_RSS, chunk_size=7))
+    assert feed.title == "Feed #11211"
+    assert feed.published == "Mon, 21 May 2018 21:58:52 +0300"
+    entry, = list(entries)
+    assert entry.title == "An Ship, Demolished,"
+    assert entry['description'] == entry['summary']
+    assert entry.guid == entry.id == "http://localhost:18000/feed/11211/#an%20ship%2C%20demolished%2C"
+    assert entry.published == "Mon, 21 May 2018 21:58:52 +0300"
+    assert entry.author == "Ford Prefect"
+    assert [tag['term'] for tag in entry.tags] == ["Solar System", "Hitchhiking", "Betelgeuse"]
+
+
+def test_stream_feed_lazy():
+    consumed = []
+
+    def chunks():
+        for chunk in iter_chunks(make_feed(100), chunk_size=256):
+            consumed.append(chunk)
+            yield chunk
+
+    feed, entries = stream_feed(chunks())
+    total = len(list(iter_chunks(make_feed(100), chunk_size=256)))
+    assert next(entries).guid == "guid-0"
+    assert len(consumed) < total
+    assert [entry.guid for entry in entries] == [f"guid-{i}" for i in range(1, 100)]
+    assert len(consumed) == total
+
+
+def test_streaming_parser_drops_items():
+    parser = StreamingRSSParser()
+    entries = []
+    for chunk in iter_chunks(make_feed(1000), chunk_size=1024):
+        entries.extend(parser.push(chunk))
+        if len(parser._stack) > 1:
+            assert len(parser._stack[1]) <= 1  # only the item being parsed is kept in the channel
+    entries.extend(parser.close())
+    assert len(entries) == 1000
+    assert parser.feed.title == "Large"
+
+
+ENTRY_KEYS = ['title', 'summary', 'link', 'id', 'guidislink', 'published', 'author']
+
+
+def assert_equivalent(text):
+    """Check that every backend produces the same feed and entries as feedparser"""
+    expected = get_backend('feedparser').parse(text)
+    expected_entries = list(expected.entries)
+    assert expected_entries
+    for name in BACKENDS:
+        parsed = get_backend(name).parse(text)
+        entries = list(parsed.entries)
+        assert len(entries) == len(expected_entries), name
+        for key in ['title', 'published']:
+            assert parsed.feed.get(key) == expected.feed.get(key), (name, key)
+        for entry, expected_entry in zip(entries, expected_entries):
+            for key in ENTRY_KEYS:
+                assert entry.get(key) == expected_entry.get(key), (name, key)
+            assert entry.get('description') == expected_entry.get('description'), name
+            assert entry.get('guid') == expected_entry.get('guid'), name
+            assert [tag['term'] for tag in entry.get('tags', [])] == \
+                [tag['term'] for tag in expected_entry.get('tags', [])], name
+
+
+def test_get_backend():
+    assert isinstance(get_backend('fast'), FastBackend)
+    with pytest.raises(ValueError):
+        get_backend('missing')
+
+
+def test_backends_equivalent_sample():
+    assert_equivalent(SAMPLE_RSS)
+
+
+def test_backends_equivalent_guid():
+    assert_equivalent(b"""<?xml version="1.0"?><rss version="2.0"><channel>
+        <item><guid isPermaLink="false">guid-1</guid><title>No link</title></item>
+        <item><guid>http://example.com/2</guid><link>http://example.com/link</link></item>
+        <item><title>Escaped &amp; "quoted"</title><description>Plain text &amp; more</description></item>
+        </channel></rss>""")
+
+
+def test_backends_equivalent_rssgen():
+    rssgen = pytest.importorskip("demo.rssgenerator.rssgen")
+    now = datetime.now().astimezone(None)
+    xml = minidom.parseString(rssgen.BASE_TEMPLATE.format(number=1, date=now.strftime(rssgen.RSS_DATE_FORMAT)))
+    channel_node = xml.getElementsByTagName('channel')[0]
+    for _ in range(20):
+        channel_node.appendChild(rssgen.generate_rss_item(xml, now, "http://localhost:18000/feed/1/"))
+    assert_equivalent(xml.toprettyxml(encoding="utf-8"))
+
+
+@pytest.mark.parametrize('backend', sorted(BACKENDS))
+def test_parse_feed_picklable(backend):
+    feed = pickle.loads(pickle.dumps(parse_feed(SAMPLE_RSS, backend)))
+    assert type(feed.feed) is Entry
+    assert feed.feed.title == "Feed #11211"
+    entry, = feed.entries
+    assert type(entry) is Entry
+    assert entry.guid == entry.id == "http://localhost:18000/feed/11211/#an%20ship%2C%20demolished%2C"
+    assert entry.author == "Ford Prefect"
+    assert [tag['term'] for tag in entry.tags] == ["Solar System", "Hitchhiking", "Betelgeuse"]
+
+
+@pytest.mark.parametrize('backend', sorted(BACKENDS))
+def test_parse_feed_chunks(backend):
+    feed = parse_feed(list(iter_chunks(SAMPLE_RSS, chunk_size=100)), backend)
+    assert feed == parse_feed(SAMPLE_RSS, backend)
@@ -0,0 +1,50 @@
+import threading
+import time
+
+import pytest
+
+from mapper.profiling import QueryCounter, StackSampler
+from mapper.rss import RSSMapper
+from tests.models import FakeRSSAuthor, FakeRSSCategory, FakeRSSItem
+from tests.test_mapper_rss import SAMPLE_RSS
+
+
+@pytest.mark.django_db
+def test_query_counter():
+    mapper = RSSMapper(FakeRSSItem, author_model=FakeRSSAuthor, category_model=FakeRSSCategory)
+    with QueryCounter() as queries:
+        mapper.process_string(SAMPLE_RSS)
+    assert queries.count == sum(queries.statements.values())
+    assert queries.count > 0
+    sql, count, duration = queries.most_common(1)[0]
+    assert count == max(queries.statements.values())
+    with QueryCounter() as other:
+        FakeRSSItem.objects.count()
+    assert other.count == 1
+
+
+def busy_mapper_frame(stopped):
+    # Code in the mapper package, as seen by the sampler
+    mapper = RSSMapper(FakeRSSItem, author_model=FakeRSSAuthor, category_model=FakeRSSCategory)
+    while not stopped.is_set():
+        mapper.parse_date("Mon, 21 May 2018 21:58:52 +0300")
+
+
+def test_stack_sampler():
+    stopped = threading.Event()
+    thread = threading.Thread(target=busy_mapper_frame, args=(stopped,))
+    thread.start()
+    try:
+        with StackSampler(thread.ident, interval=0.001) as sampler:
+            sampler.label = 'source-1'
+            time.sleep(0.1)
+    finally:
+        stopped.set()
+        thread.join()
+    stacks, hot_paths = sampler.flush()
+    assert stacks
+    assert all(stack.startswith('source-1;') for stack in stacks)
+    assert ('source-1', 'parse_date') in hot_paths
+    line = next(StackSampler.collapsed(stacks))
+    assert line.rsplit(' ', 1)[1].isdigit()
+    assert sampler.flush() == ({}, {})
@@ -1,10 +1,13 @@
-from datetime import datetime
+from datetime import datetime, timezone
 
+import feedparser
 import pytest
 from django.core.exceptions import ValidationError
 from django.db import models
 
-from mapper.rss import RSSMapper
+from mapper.cache import RelatedObjectCache
+from mapper.parsers import parse_feed
+from mapper.rss import RSSMapper, PARSER_STREAM
 from tests.models import FakeRSSAuthor, FakeRSSCategory, FakeRSSItem
 from unittest.mock import patch
 
@@ -47,3 +50,126 @@ def test_mapper_process_string_not_modified():
     with patch.object(mapper, "process") as process:
         result = mapper.process_string(SAMPLE_RSS, if_modified_since=datetime(2018, 5, 22).astimezone(None))
         assert not process.called
+
+
+class StreamingRSSMapper(RSSMapper):
+    parser = PARSER_STREAM
+
+
+def test_mapper_process_string_stream():
+    mapper = StreamingRSSMapper(FakeRSSItem, author_model=FakeRSSAuthor, category_model=FakeRSSCategory)
+    with patch.object(mapper, "process") as process:
+        mapper.process_string(SAMPLE_RSS)
+        entry, = process.call_args[0][0]
+        assert entry.title == "An Ship, Demolished,"
+        assert entry.published == "Mon, 21 May 2018 21:58:52 +0300"
+
+
+def test_mapper_process_string_stream_not_modified():
+    mapper = StreamingRSSMapper(FakeRSSItem, author_model=FakeRSSAuthor, category_model=FakeRSSCategory)
+    with patch.object(mapper, "process") as process:
+        mapper.process_string(SAMPLE_RSS, if_modified_since=datetime(2018, 5, 22).astimezone(None))
+        assert not process.called
+
+
+SAMPLE_ENTRY = {
+    "title": "An Ship, Demolished,",
+    "guid": "http://localhost:18000/feed/11211/#an%20ship%2C%20demolished%2C",
+    "published": "Mon, 21 May 2018 18:58:52 GMT",
+    "author": "Ford Prefect",
+    "tags": [{"term": "Solar System"}, {"term": "Hitchhiking"}],
+}
+
+
+@pytest.mark.django_db
+def test_mapper_process_warm_cache(django_assert_num_queries):
+    mapper = RSSMapper(FakeRSSItem, author_model=FakeRSSAuthor, category_model=FakeRSSCategory)
+    FakeRSSAuthor.objects.create(name="Ford Prefect")
+    FakeRSSCategory.objects.create(title="Solar System")
+    FakeRSSCategory.objects.create(title="Hitchhiking")
+    entry = feedparser.FeedParserDict(SAMPLE_ENTRY)
+    with django_assert_num_queries(2):
+        mapper.prepare_batch([entry])
+    with django_assert_num_queries(0):
+        params = mapper.map_entry(entry)
+    instance_params, unique_params, m2m_params = params
+    assert instance_params['author'].name == "Ford Prefect"
+    assert [category.title for category in m2m_params['categories']] == ["Solar System", "Hitchhiking"]
+
+
+@pytest.mark.django_db
+def test_mapper_process_shared_cache():
+    cache = RelatedObjectCache()
+    mapper = RSSMapper(FakeRSSItem, author_model=FakeRSSAuthor, category_model=FakeRSSCategory, cache=cache)
+    item, = mapper.process([feedparser.FeedParserDict(SAMPLE_ENTRY)])
+    assert item.author.name == "Ford Prefect"
+    assert sorted(category.title for category in item.categories.all()) == ["Hitchhiking", "Solar System"]
+    assert cache.get(FakeRSSAuthor, "Ford Prefect") == item.author
+
+
+def test_mapper_transform_date_published():
+    mapper = RSSMapper(FakeRSSItem, author_model=FakeRSSAuthor, category_model=FakeRSSCategory)
+    field = mapper.model_fields['date_published']
+    expected = datetime(2018, 5, 21, 18, 58, 52, tzinfo=timezone.utc)
+    assert mapper.transform_date_published(feedparser.FeedParserDict(SAMPLE_ENTRY), field) == expected
+    assert mapper.transform_date_published({"published": "Mon, 21 May 2018 21:58:52 +0300"}, field) == expected
+    assert mapper.transform_date_published({}, field) is None
+
+
+@pytest.mark.django_db
+def test_mapper_process_string_saves():
+    mapper = RSSMapper(FakeRSSItem, author_model=FakeRSSAuthor, category_model=FakeRSSCategory)
+    item, = mapper.process_string(SAMPLE_RSS)
+    assert item.date_published == datetime(2018, 5, 21, 18, 58, 52, tzinfo=timezone.utc)
+    assert item.author.name == "Ford Prefect"
+    assert item.categories.count() == 3
+
+
+def test_mapper_filter_entries():
+    mapper = RSSMapper(FakeRSSItem, author_model=FakeRSSAuthor, category_model=FakeRSSCategory)
+    entries = [
+        {"guid": "old", "published": "Mon, 21 May 2018 18:58:52 GMT"},
+        {"guid": "new", "published": "Tue, 22 May 2018 18:58:52 GMT"},
+        {"guid": "no date"},
+        {"guid": "bad date", "published": "yesterday"},
+    ]
+    result = mapper.filter_entries(entries, since=datetime(2018, 5, 22, tzinfo=timezone.utc))
+    assert [entry["guid"] for entry in result] == ["new", "no date", "bad date"]
+    assert mapper.stats['entries_too_old'] == 1
+
+
+def test_mapper_process_string_entries_since():
+    mapper = RSSMapper(FakeRSSItem, author_model=FakeRSSAuthor, category_model=FakeRSSCategory)
+    with patch.object(mapper, "process") as process:
+        mapper.process_string(SAMPLE_RSS, entries_since=datetime(2018, 5, 22).astimezone(None))
+        assert list(process.call_args[0][0]) == []
+        mapper.process_string(SAMPLE_RSS, entries_since=datetime(2018, 5, 20).astimezone(None))
+        assert len(list(process.call_args[0][0])) == 1
+
+
+@pytest.mark.django_db
+def test_mapper_process_feed():
+    mapper = RSSMapper(FakeRSSItem, author_model=FakeRSSAuthor, category_model=FakeRSSCategory)
+    assert mapper.process_feed(parse_feed(SAMPLE_RSS), if_modified_since=datetime(2018, 5, 22).astimezone(None)) == []
+    item, = mapper.process_feed(parse_feed(SAMPLE_RSS))
+    assert item.author.name == "Ford Prefect"
+    assert item.categories.count() == 3
+
+
+class AtomicRSSMapper(RSSMapper):
+    atomic_chunk_size = 10
+
+
+@pytest.mark.django_db
+def test_mapper_process_rollback_drops_cached():
+    cache = RelatedObjectCache()
+    mapper = AtomicRSSMapper(FakeRSSItem, author_model=FakeRSSAuthor, category_model=FakeRSSCategory, cache=cache)
+    bad_entry = feedparser.FeedParserDict(SAMPLE_ENTRY, guid="bad", published="yesterday")
+    with pytest.raises(ValueError):
+        mapper.process([feedparser.FeedParserDict(SAMPLE_ENTRY), bad_entry])
+    assert FakeRSSAuthor.objects.count() == 0
+    assert len(cache) == 0
+
+    item, = mapper.process([feedparser.FeedParserDict(SAMPLE_ENTRY)])
+    assert FakeRSSAuthor.objects.filter(pk=item.author_id).exists()
+    assert FakeRSSCategory.objects.filter(pk__in=item.categories.values('pk')).count() == 2
@@ -0,0 +1,129 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from mapper.base import MapperBase
+from mapper.xmlspec import MISSING, XMLImporter, XMLSpec, compile_accessor
+from tests.models import FakeRSSCategory, FakeRSSItem
+from xml.etree.ElementTree import fromstring
+
+SAMPLE_XML = b"""\
+<?xml version="1.0" encoding="utf-8"?>
+<rss version="2.0" xmlns:dc="http://purl.org/dc/elements/1.1/">
+    <channel>
+        <title>Feed #11211</title>
+        <item>
+            <title> An Ship, Demolished, </title>
+            <pubDate>Mon, 21 May 2018 21:58:52 +0300</pubDate>
+            <guid>guid-1</guid>
+            <dc:creator>Ford Prefect</dc:creator>
+            <enclosure url="http://localhost/1.jpg" length="42"/>
+            <category>Solar System</category>
+            <category>Hitchhiking</category>
+        </item>
+        <item>
+            <title>Marvin</title>
+            <pubDate>Tue, 22 May 2018 18:58:52 GMT</pubDate>
+            <guid>guid-2</guid>
+            <category>Hitchhiking</category>
+        </item>
+    </channel>
+</rss>
+"""
+
+SPEC = {
+    'namespaces': {'dc': 'http://purl.org/dc/elements/1.1/'},
+    'targets': {
+        'items': {
+            'path': 'rss/channel/item',
+            'fields': {
+                'title': 'title',
+                'guid': 'guid',
+                'date_published': {'path': 'pubDate', 'converter': 'date'},
+                'author': 'dc:creator',
+                'image': 'enclosure/@url',
+                'size': {'path': 'enclosure/@length', 'converter': 'int'},
+                'tags': {'path': 'category', 'many': True},
+            },
+        },
+        'categories': {
+            'path': 'rss/channel/item/category',
+            'fields': {'title': '.'},
+        },
+        'channels': {
+            'path': 'rss/channel',
+            'fields': {'title': 'title', 'items': {'path': 'item/guid', 'many': True}},
+        },
+    },
+}
+
+
+def test_compile_accessor():
+    element = fromstring('<item a="1"><b><c> text </c><c>2</c></b></item>')
+    assert compile_accessor('b/c')(element) == "text"
+    assert compile_accessor('b/c', many=True)(element) == ["text", "2"]
+    assert compile_accessor('@a', converter='int')(element) == 1
+    assert compile_accessor('b/missing')(element) is MISSING
+    assert compile_accessor('missing/c', many=True)(element) == []
+    assert compile_accessor('.', converter=len)(element) == 0
+    with pytest.raises(ValueError):
+        compile_accessor('b', converter='missing')
+    with pytest.raises(ValueError):
+        compile_accessor('x:b')
+
+
+def test_spec_records_single_pass():
+    records = list(XMLSpec(SPEC).iter_records(SAMPLE_XML))
+    assert [name for name, _ in records] == ['categories', 'categories', 'items', 'categories', 'items', 'channels']
+    item = records[2][1]
+    assert item == {
+        'title': "An Ship, Demolished,",
+        'guid': "guid-1",
+        'date_published': datetime(2018, 5, 21, 21, 58, 52, tzinfo=timezone(timedelta(hours=3))),
+        'author': "Ford Prefect",
+        'image': "http://localhost/1.jpg",
+        'size': 42,
+        'tags': ["Solar System", "Hitchhiking"],
+    }
+    assert 'author' not in records[4][1]
+    # elements inside an enclosing record are kept until it ends; `many` applies to the last step only
+    assert records[5][1] == {'title': "Feed #11211", 'items': ["guid-1"]}
+
+
+def test_spec_invalid():
+    with pytest.raises(ValueError):
+        XMLSpec({'targets': {'items': {'fields': {}}}})
+
+
+def test_spec_from_yaml():
+    pytest.importorskip("yaml")
+    spec = XMLSpec.from_yaml("targets:\n  items:\n    path: rss/channel/item\n    fields:\n      guid: guid\n")
+    assert [record for _, record in spec.iter_records(SAMPLE_XML)] == [{'guid': "guid-1"}, {'guid': "guid-2"}]
+
+
+class ItemMapper(MapperBase):
+    unique_fields = ['guid']
+    exclude_fields = ['author', 'categories']
+
+
+class CategoryMapper(MapperBase):
+    unique_fields = ['title']
+    batch_size = 10
+
+
+@pytest.mark.django_db
+def test_importer():
+    spec = dict(SPEC, targets={name: SPEC['targets'][name] for name in ['items', 'categories']})
+    importer = XMLImporter(spec, {
+        'items': ItemMapper(FakeRSSItem),
+        'categories': CategoryMapper(FakeRSSCategory),
+    }, batch_size=2)
+    result = importer.process_string(SAMPLE_XML)
+    assert [item.guid for item in result['items']] == ["guid-1", "guid-2"]
+    assert [category.title for category in result['categories']] == ["Solar System", "Hitchhiking", "Hitchhiking"]
+    assert FakeRSSCategory.objects.count() == 2
+
+
+def test_importer_missing_mapper():
+    with pytest.raises(TypeError):
+        XMLImporter(SPEC, {'items': ItemMapper(FakeRSSItem)})